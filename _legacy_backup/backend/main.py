@@ -1,16 +1,39 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Float
-from sqlalchemy.orm import declarative_base, sessionmaker, Session, relationship
+from sqlalchemy import create_engine, event, update, func, Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import declarative_base, object_session, sessionmaker, Session, relationship
 from datetime import datetime, timedelta
-from jose import jwt
+from jose import jwt, JWTError
 from passlib.context import CryptContext
 from pydantic import BaseModel
 import os
+import re
+import sys
 import shutil
 import uuid
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# Scoring helpers shared with the Next.js app live in the repo's lib/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+from gt_compile import compile_ground_truth
+from metrics import get_metric
+from result_cache import new_hasher
+from scoring import calculate_score, score_each
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
 
 # ---------------- CONFIG ----------------
 
@@ -19,10 +42,57 @@ SECRET_KEY = "dev-secret"
 ALGORITHM = "HS256"
 TOKEN_EXPIRE_MIN = 60 * 24 * 7 # 7 days
 
+# Uploads are copied in fixed-size chunks and rejected as soon as they cross a limit.
+# Starlette spools multipart files to temporary files before a handler runs, so
+# the per-file limits apply to the copy out of the spool; REQUEST_LIMITS are
+# enforced while the body arrives and bound what can be spooled at all.
+UPLOAD_CHUNK = 1024 * 1024
+UPLOAD_CONCURRENCY = 4 # files written at once across all requests
+MAX_SUBMISSION_BYTES = 512 * 1024 * 1024
+MAX_DOC_BYTES = 16 * 1024 * 1024 # description / data description
+MAX_DATA_FILE_BYTES = 20 * 1024 * 1024 * 1024 # each dataset or ground-truth file
+MAX_REQUEST_BYTES = MAX_DATA_FILE_BYTES + 4 * MAX_DOC_BYTES # one full data file plus the documents
+MAX_FORM_BYTES = 1024 * 1024 # any other body: logins, registrations, form fields
+MULTIPART_OVERHEAD = 64 * 1024 # boundaries and part headers around an uploaded file
+
+# Body limits by method and path, first match wins; only competition data
+# uploads may send MAX_REQUEST_BYTES
+REQUEST_LIMITS = (
+    ("POST", re.compile(r"/competitions/\d+/submit"), MAX_SUBMISSION_BYTES + MULTIPART_OVERHEAD),
+    ("POST", re.compile(r"/competitions"), MAX_REQUEST_BYTES),
+    ("PUT", re.compile(r"/competitions/\d+"), MAX_REQUEST_BYTES),
+)
+
+# Authenticated users are served from memory for up to AUTH_CACHE_TTL seconds
+AUTH_CACHE_TTL = 60
+AUTH_CACHE_SIZE = 10_000
+AUTH_WORKERS = 4 # threads reserved for bcrypt
+
+# Bulk rescoring writes this many submissions per transaction (one checkpoint each)
+RESCORE_BATCH = 500
+RESCORE_WORKERS = int(os.environ.get("RESCORE_WORKERS", 0)) or None # default: one per CPU
+
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "timeout": 30},
+    # Handlers and the upload/scoring thread pool share a bounded set of connections
+    pool_size=10,
+    max_overflow=20,
+    pool_timeout=30,
+    pool_pre_ping=True,
 )
+
+@event.listens_for(engine, "connect")
+def sqlite_pragmas(conn, _):
+    # WAL lets readers (leaderboards) run alongside the submission writer
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.execute("PRAGMA busy_timeout=30000")
+    cur.execute("PRAGMA cache_size=-65536") # 64 MiB
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
@@ -75,7 +145,106 @@ class Submission(Base):
     
     user = relationship("User")
 
+class LeaderboardEntry(Base):
+    # Best graded submission per user per competition, upserted in the same
+    # transaction as the submission. sort_key is the score signed so that
+    # ascending order is always best-first, letting one index serve every metric.
+    __tablename__ = "leaderboard"
+    competition_id = Column(Integer, ForeignKey("competitions.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id"))
+    score = Column(Float)
+    sort_key = Column(Float)
+    created_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_leaderboard_rank", "competition_id", "sort_key", "created_at"),
+    )
+
+class RescoreJob(Base):
+    # Rescoring of a competition's submissions after its metric or ground truth
+    # changed. Scores are written in batches, each in the same transaction as
+    # last_submission_id, so a restarted job picks up after its last batch.
+    # Submissions newer than max_submission_id were already scored with the
+    # new settings. status: running, done, failed, superseded
+    __tablename__ = "rescore_jobs"
+    id = Column(Integer, primary_key=True)
+    competition_id = Column(Integer, ForeignKey("competitions.id"), index=True)
+    metric = Column(String)
+    ground_truth_path = Column(String)
+    status = Column(String, default="running")
+    max_submission_id = Column(Integer)
+    last_submission_id = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    done = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+@dataclass(frozen=True)
+class AuthUser:
+    # What handlers need to know about the caller; detached from any session
+    # and without the password hash, so it is safe to cache and to return
+    id: int
+    email: str
+    name: str
+    avatar: str | None
+
+class UserCache:
+    # Bounded LRU of user id -> (expires_at, AuthUser)
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid):
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[uid]
+                return None
+            self._entries.move_to_end(uid)
+            return entry[1]
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._entries.pop(uid, None)
+
+user_cache = UserCache(AUTH_CACHE_TTL, AUTH_CACHE_SIZE)
+
+# ORM writes drop the cached copy once they are committed: the ids are
+# collected at flush and invalidated after the commit, so a request between
+# the two cannot cache the old row again, and a rollback drops nothing. Bulk
+# query().update() bypasses this and is only picked up when the entry expires.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def user_changed(mapper, conn, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(target.id)
+
+@event.listens_for(SessionLocal, "after_commit")
+def invalidate_changed_users(session):
+    for uid in session.info.pop("changed_users", ()):
+        user_cache.invalidate(uid)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def forget_changed_users(session):
+    session.info.pop("changed_users", None)
+
 Base.metadata.create_all(bind=engine)
+migrate(engine)
 
 # ---------------- HELPERS ----------------
 
@@ -86,9 +255,27 @@ def db():
     finally:
         s.close()
 
+# Async handlers keep the event loop free for uploads; their queries and
+# commits are synchronous and go through run_in_threadpool, as below
+
+def find_user(s: Session, email: str):
+    return s.query(User).filter_by(email=email).first()
+
+def add_and_commit(s: Session, obj):
+    # Reloaded after the commit so serializing it reads nothing on the loop
+    s.add(obj); s.commit(); s.refresh(obj)
+    return obj
+
+# bcrypt is deliberately slow; it runs on its own pool so logins neither block
+# the event loop nor starve the request thread pool
+auth_pool = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="bcrypt")
+
 def hash_pw(p): return pwd.hash(p)
 def verify_pw(p, h): return pwd.verify(p, h)
 
+async def in_auth_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(auth_pool, fn, *args)
+
 def make_token(uid: int):
     return jwt.encode(
         {"sub": str(uid), "exp": datetime.utcnow() + timedelta(minutes=TOKEN_EXPIRE_MIN)},
@@ -96,39 +283,264 @@ def make_token(uid: int):
         algorithm=ALGORITHM
     )
 
-def current_user(token: str = Depends(oauth2), s: Session = Depends(db)):
+def current_user(token: str = Depends(oauth2)) -> AuthUser:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         uid = int(payload.get("sub"))
-        user = s.get(User, uid)
-        if not user: raise
-        return user
-    except:
+    except (JWTError, TypeError, ValueError):
         raise HTTPException(401, "Invalid token")
 
-def save_file(file: UploadFile, folders: str) -> str:
+    # Only a cache miss opens a session
+    user = user_cache.get(uid)
+    if user is None:
+        with SessionLocal() as s:
+            u = s.get(User, uid)
+            if not u: raise HTTPException(401, "Invalid token")
+            user = AuthUser(id=u.id, email=u.email, name=u.name, avatar=u.avatar)
+        user_cache.put(user)
+    return user
+
+_upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+def upload_name(file: UploadFile) -> str:
+    # Client-supplied names must not escape the target directory
+    return os.path.basename(file.filename.replace("\\", "/"))
+
+def _fsync_close(f):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+async def stream_upload(file: UploadFile, dest: str, max_bytes: int, digest=None) -> int:
+    # Copy to a temporary name chunk by chunk, fsync, then rename into place:
+    # readers never see a partial file and an aborted upload leaves nothing behind.
+    # Disk writes go to the thread pool so the event loop keeps serving requests.
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.part-{uuid.uuid4().hex[:8]}"
+    size = 0
+    async with _upload_slots:
+        f = await run_in_threadpool(open, tmp, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(413, f"{file.filename} is larger than {max_bytes // (1024 * 1024)} MB")
+                if digest is not None:
+                    digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+            await run_in_threadpool(_fsync_close, f)
+            await run_in_threadpool(os.replace, tmp, dest)
+        except BaseException:
+            f.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+            raise
+    return size
+
+async def gather_uploads(*uploads):
+    # Run uploads concurrently; on the first failure cancel the rest and re-raise it
+    tasks = [asyncio.ensure_future(u) for u in uploads]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def publish_staged(staging: str, dest: str):
+    # Move every file uploaded under staging to the same relative path under dest
+    for root, _, files in os.walk(staging):
+        target = os.path.normpath(os.path.join(dest, os.path.relpath(root, staging)))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(target, name))
+
+async def save_file(file: UploadFile, folders: str) -> tuple[str, str]:
+    # Returns (path, sha256); the hash is taken from the chunks as they are
+    # written, so the result cache never has to read the file back
     path = f"media/{folders}"
-    os.makedirs(path, exist_ok=True)
     ext = file.filename.split('.')[-1]
     filename = f"{uuid.uuid4()}.{ext}"
     full_path = f"{path}/{filename}"
     
-    with open(full_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    return full_path
+    digest = new_hasher()
+    await stream_upload(file, full_path, MAX_SUBMISSION_BYTES, digest)
+    return full_path, digest.hexdigest()
+
+def compile_gt(path: str):
+    # Pre-build the memory-mapped ground truth so the first submission doesn't
+    # pay for parsing it; scorers recompile lazily if this fails or the file changes
+    try:
+        compile_ground_truth(path)
+    except Exception as e:
+        logger.warning("Ground truth compile failed for %s: %s", path, e)
+
+def higher_is_better(metric: str) -> bool:
+    try:
+        return get_metric(metric).higher_is_better
+    except ValueError:
+        return True # unknown metrics keep the old highest-first order
+
+def record_best(s: Session, sub: Submission, metric: str):
+    # Upsert without committing; an equal score keeps the earlier submission
+    key = -sub.score if higher_is_better(metric) else sub.score
+    stmt = sqlite_insert(LeaderboardEntry).values(
+        competition_id=sub.competition_id,
+        user_id=sub.user_id,
+        submission_id=sub.id,
+        score=sub.score,
+        sort_key=key,
+        created_at=sub.created_at,
+    )
+    s.execute(stmt.on_conflict_do_update(
+        index_elements=["competition_id", "user_id"],
+        set_={col: stmt.excluded[col] for col in ("submission_id", "score", "sort_key", "created_at")},
+        where=stmt.excluded.sort_key < LeaderboardEntry.sort_key,
+    ))
+
+def rebuild_leaderboard(s: Session, c: Competition):
+    # Full recompute, for backfills and when the metric (and so the direction) changes
+    s.query(LeaderboardEntry).filter_by(competition_id=c.id).delete()
+    subs = (
+        s.query(Submission)
+        .filter(Submission.competition_id == c.id, Submission.status == "graded", Submission.score.isnot(None))
+        .order_by(Submission.created_at, Submission.id)
+    )
+    for sub in subs:
+        record_best(s, sub, c.metric)
+
+# ---------------- RESCORING ----------------
 
-def save_files(files: list[UploadFile], directory: str):
+def start_rescore(s: Session, c: Competition) -> RescoreJob:
+    # Replaces any job still running for the competition; that job notices at
+    # its next batch and stops without writing it
+    s.query(RescoreJob).filter_by(competition_id=c.id, status="running").update(
+        {"status": "superseded", "updated_at": datetime.utcnow()}
+    )
+    max_id, total = (
+        s.query(func.max(Submission.id), func.count(Submission.id))
+        .filter(Submission.competition_id == c.id)
+        .one()
+    )
+    job = RescoreJob(
+        competition_id=c.id,
+        metric=c.metric,
+        ground_truth_path=c.ground_truth_path,
+        max_submission_id=max_id or 0,
+        total=total,
+    )
+    s.add(job); s.commit()
+    launch_rescore(job.id)
+    return job
+
+def launch_rescore(job_id: int):
+    threading.Thread(target=run_rescore, args=(job_id,), name=f"rescore-{job_id}", daemon=True).start()
+
+def resume_rescores():
+    # Jobs interrupted by a restart continue from their checkpoint
+    with SessionLocal() as s:
+        ids = [j for (j,) in s.query(RescoreJob.id).filter_by(status="running")]
+    for job_id in ids:
+        launch_rescore(job_id)
+
+def _write_rescore_batch(job_id: int, batch: list, finish=False) -> bool:
+    # One transaction: the job row is claimed first, so a superseded job
+    # writes nothing; False tells the caller to stop
+    now = datetime.utcnow()
+    failed = sum(1 for _, score in batch if score is None)
+    with SessionLocal() as s:
+        values = {"updated_at": now, "done": RescoreJob.done + len(batch), "failed": RescoreJob.failed + failed}
+        if batch:
+            values["last_submission_id"] = batch[-1][0]
+        if finish:
+            values["status"] = "done"
+        claimed = s.execute(
+            update(RescoreJob)
+            .where(RescoreJob.id == job_id, RescoreJob.status == "running")
+            .values(**values)
+        ).rowcount
+        if not claimed:
+            return False
+        if batch:
+            s.execute(update(Submission), [
+                {"id": sid, "score": score, "status": "failed" if score is None else "graded"}
+                for sid, score in batch
+            ])
+        if finish:
+            job = s.get(RescoreJob, job_id)
+            rebuild_leaderboard(s, s.get(Competition, job.competition_id))
+        s.commit()
+    return True
+
+def run_rescore(job_id: int):
+    with SessionLocal() as s:
+        job = s.get(RescoreJob, job_id)
+        if job is None or job.status != "running":
+            return
+        metric, gt_path = job.metric, job.ground_truth_path
+        pending = (
+            s.query(Submission.id, Submission.file_path)
+            .filter(
+                Submission.competition_id == job.competition_id,
+                Submission.id > job.last_submission_id,
+                Submission.id <= job.max_submission_id,
+            )
+            .order_by(Submission.id)
+            .all()
+        )
+
+    scores = score_each(pending, gt_path, metric, workers=RESCORE_WORKERS)
+    try:
+        batch = []
+        for sid, score, _ in scores:
+            batch.append((sid, score))
+            if len(batch) >= RESCORE_BATCH:
+                if not _write_rescore_batch(job_id, batch):
+                    return
+                batch = []
+        if _write_rescore_batch(job_id, batch, finish=True):
+            logger.info("Rescore job %s finished: %d submission(s) scored", job_id, len(pending))
+    except Exception as e:
+        logger.exception("Rescore job %s failed", job_id)
+        with SessionLocal() as s:
+            s.execute(
+                update(RescoreJob)
+                .where(RescoreJob.id == job_id, RescoreJob.status == "running")
+                .values(status="failed", error=str(e), updated_at=datetime.utcnow())
+            )
+            s.commit()
+    finally:
+        scores.close()
+
+def rescore_progress(job: RescoreJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "metric": job.metric,
+        "total": job.total,
+        "done": job.done,
+        "failed": job.failed,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+async def save_files(files: list[UploadFile], directory: str):
     os.makedirs(directory, exist_ok=True)
-    for file in files:
-        if not file.filename: continue
-        path = f"{directory}/{file.filename}"
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    await gather_uploads(*(
+        stream_upload(file, f"{directory}/{upload_name(file)}", MAX_DATA_FILE_BYTES)
+        for file in files if file.filename
+    ))
 
 # ---------------- APP ----------------
 
-app = FastAPI(title="AI Judge API")
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    resume_rescores()
+    yield
+
+app = FastAPI(title="AI Judge API", lifespan=lifespan)
 
 # Serve media files
 app.mount("/media", StaticFiles(directory="media"), name="media")
@@ -141,6 +553,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class RequestSizeLimit:
+    # Refuses bodies over the route's limit (the first of `limits` whose method
+    # and path match, else `default`): up front from Content-Length, and for
+    # chunked bodies by counting bytes as the multipart parser reads them, so
+    # an oversized upload stops spooling at the limit
+    def __init__(self, app, limits, default: int):
+        self.app = app
+        self.limits = limits
+        self.default = default
+
+    def limit_for(self, method: str, path: str) -> int:
+        for m, pattern, max_bytes in self.limits:
+            if m == method and pattern.fullmatch(path):
+                return max_bytes
+        return self.default
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        max_bytes = self.limit_for(scope["method"], scope["path"].rstrip("/") or "/")
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > max_bytes:
+            return await JSONResponse({"detail": "Request body too large"}, status_code=413)(scope, receive, send)
+
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise HTTPException(413, "Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(RequestSizeLimit, limits=REQUEST_LIMITS, default=MAX_FORM_BYTES)
+
 # ---------------- AUTH ----------------
 
 class RegisterRequest(BaseModel):
@@ -149,22 +599,22 @@ class RegisterRequest(BaseModel):
     password: str
 
 @app.post("/auth/register")
-def register(req: RegisterRequest, s: Session = Depends(db)):
-    if s.query(User).filter_by(email=req.email).first():
+async def register(req: RegisterRequest, s: Session = Depends(db)):
+    if await run_in_threadpool(find_user, s, req.email):
         raise HTTPException(400, "Email exists")
-    u = User(email=req.email, name=req.name, hashed_password=hash_pw(req.password))
-    s.add(u); s.commit()
+    u = User(email=req.email, name=req.name, hashed_password=await in_auth_pool(hash_pw, req.password))
+    await run_in_threadpool(add_and_commit, s, u)
     return {"ok": True}
 
 @app.post("/auth/login")
-def login(form: OAuth2PasswordRequestForm = Depends(), s: Session = Depends(db)):
-    u = s.query(User).filter_by(email=form.username).first()
-    if not u or not verify_pw(form.password, u.hashed_password):
+async def login(form: OAuth2PasswordRequestForm = Depends(), s: Session = Depends(db)):
+    u = await run_in_threadpool(find_user, s, form.username)
+    if not u or not await in_auth_pool(verify_pw, form.password, u.hashed_password):
         raise HTTPException(401, "Invalid credentials")
     return {"access_token": make_token(u.id), "token_type": "bearer"}
 
 @app.get("/auth/me")
-def me(user: User = Depends(current_user)):
+def me(user: AuthUser = Depends(current_user)):
     return user
 
 # ---------------- COMPETITIONS ----------------
@@ -174,11 +624,11 @@ def list_comps(s: Session = Depends(db)):
     return s.query(Competition).order_by(Competition.created_at.desc()).all()
 
 @app.get("/competitions/my")
-def my_managed_comps(user: User = Depends(current_user), s: Session = Depends(db)):
+def my_managed_comps(user: AuthUser = Depends(current_user), s: Session = Depends(db)):
     return s.query(Competition).filter_by(host_id=user.id).order_by(Competition.created_at.desc()).all()
 
 @app.post("/competitions")
-def create_comp(
+async def create_comp(
     title: str = Form(...),
     subtitle: str = Form(...),
     metric: str = Form("rmse"),
@@ -189,37 +639,42 @@ def create_comp(
     description_file: UploadFile = File(None),
     data_files: list[UploadFile] = File(None),
     data_desc_file: UploadFile = File(None),
-    user: User = Depends(current_user),
+    ground_truth_file: UploadFile = File(None),
+    user: AuthUser = Depends(current_user),
     s: Session = Depends(db)
 ):
     # Unique ID for storage
     cid_str = str(uuid.uuid4())
     base_path = f"media/competitions/{cid_str}"
     
+    # All files are streamed to disk concurrently
+    uploads = []
     desc_path = None
     if description_file and description_file.filename:
-        desc_path = f"{base_path}/description/{description_file.filename}"
-        os.makedirs(os.path.dirname(desc_path), exist_ok=True)
-        with open(desc_path, "wb") as f:
-            shutil.copyfileobj(description_file.file, f)
+        desc_path = f"{base_path}/description/{upload_name(description_file)}"
+        uploads.append(stream_upload(description_file, desc_path, MAX_DOC_BYTES))
             
     data_dir = f"{base_path}/data"
     if data_files:
-        save_files(data_files, data_dir)
+        uploads.append(save_files(data_files, data_dir))
         
     data_desc_path = None
     if data_desc_file and data_desc_file.filename:
-        data_desc_path = f"{base_path}/data_desc/{data_desc_file.filename}"
-        os.makedirs(os.path.dirname(data_desc_path), exist_ok=True)
-        with open(data_desc_path, "wb") as f:
-            shutil.copyfileobj(data_desc_file.file, f)
+        data_desc_path = f"{base_path}/data_desc/{upload_name(data_desc_file)}"
+        uploads.append(stream_upload(data_desc_file, data_desc_path, MAX_DOC_BYTES))
 
     gt_path = None
     if ground_truth_file and ground_truth_file.filename:
-        gt_path = f"{base_path}/hidden/{ground_truth_file.filename}"
-        os.makedirs(os.path.dirname(gt_path), exist_ok=True)
-        with open(gt_path, "wb") as f:
-            shutil.copyfileobj(ground_truth_file.file, f)
+        gt_path = f"{base_path}/hidden/{upload_name(ground_truth_file)}"
+        uploads.append(stream_upload(ground_truth_file, gt_path, MAX_DATA_FILE_BYTES))
+
+    try:
+        await gather_uploads(*uploads)
+    except BaseException:
+        await run_in_threadpool(shutil.rmtree, base_path, True)
+        raise
+    if gt_path:
+        await run_in_threadpool(compile_gt, gt_path)
 
     c = Competition(
         title=title,
@@ -236,11 +691,10 @@ def create_comp(
         ground_truth_path=gt_path,
         host_id=user.id
     )
-    s.add(c); s.commit()
-    return c
+    return await run_in_threadpool(add_and_commit, s, c)
 
 @app.put("/competitions/{cid}")
-def update_comp(
+async def update_comp(
     cid: int,
     title: str = Form(None),
     subtitle: str = Form(None),
@@ -252,16 +706,19 @@ def update_comp(
     description_file: UploadFile = File(None),
     data_files: list[UploadFile] = File(None),
     data_desc_file: UploadFile = File(None),
-    user: User = Depends(current_user),
+    ground_truth_file: UploadFile = File(None),
+    user: AuthUser = Depends(current_user),
     s: Session = Depends(db)
 ):
-    c = s.get(Competition, cid)
+    c = await run_in_threadpool(s.get, Competition, cid)
     if not c: raise HTTPException(404)
     if c.host_id != user.id: raise HTTPException(403, "Not host")
     
     if title: c.title = title
     if subtitle: c.subtitle = subtitle
-    if metric: c.metric = metric
+    metric_changed = bool(metric) and metric != c.metric
+    if metric_changed:
+        c.metric = metric
     if submission_limit: c.submission_limit = submission_limit
     if timeline: c.timeline = timeline
     if start_date: c.start_date = datetime.fromisoformat(start_date)
@@ -276,39 +733,62 @@ def update_comp(
     if c.data_dir:
         base_path = os.path.dirname(c.data_dir)
         
+    # Stream every new file concurrently into a staging directory; nothing
+    # replaces an existing file, and no path is recorded, until all uploads
+    # have landed, so a rejected upload leaves the competition unchanged
+    staging = f"{base_path}/.staging-{uuid.uuid4().hex[:8]}"
+    uploads, updates = [], {}
     if description_file and description_file.filename:
-        path = f"{base_path}/description/{description_file.filename}"
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wb") as f: shutil.copyfileobj(description_file.file, f)
-        c.description_path = path
+        path = f"description/{upload_name(description_file)}"
+        uploads.append(stream_upload(description_file, f"{staging}/{path}", MAX_DOC_BYTES))
+        updates["description_path"] = f"{base_path}/{path}"
 
     if data_files:
-        path = f"{base_path}/data"
-        save_files(data_files, path)
-        c.data_dir = path
+        uploads.append(save_files(data_files, f"{staging}/data"))
+        updates["data_dir"] = f"{base_path}/data"
 
     if data_desc_file and data_desc_file.filename:
-        path = f"{base_path}/data_desc/{data_desc_file.filename}"
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wb") as f: shutil.copyfileobj(data_desc_file.file, f)
-        c.data_description_path = path
+        path = f"data_desc/{upload_name(data_desc_file)}"
+        uploads.append(stream_upload(data_desc_file, f"{staging}/{path}", MAX_DOC_BYTES))
+        updates["data_description_path"] = f"{base_path}/{path}"
 
     if ground_truth_file and ground_truth_file.filename:
-        path = f"{base_path}/hidden/{ground_truth_file.filename}"
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wb") as f: shutil.copyfileobj(ground_truth_file.file, f)
-        c.ground_truth_path = path
-        
+        path = f"hidden/{upload_name(ground_truth_file)}"
+        uploads.append(stream_upload(ground_truth_file, f"{staging}/{path}", MAX_DATA_FILE_BYTES))
+        updates["ground_truth_path"] = f"{base_path}/{path}"
+
+    try:
+        await gather_uploads(*uploads)
+        await run_in_threadpool(publish_staged, staging, base_path)
+    finally:
+        await run_in_threadpool(shutil.rmtree, staging, True)
+    if "ground_truth_path" in updates:
+        await run_in_threadpool(compile_gt, updates["ground_truth_path"])
+    for field, path in updates.items():
+        setattr(c, field, path)
+
+    return await run_in_threadpool(commit_comp_update, s, c, metric_changed, "ground_truth_path" in updates)
+
+def commit_comp_update(s: Session, c: Competition, metric_changed: bool, gt_changed: bool) -> Competition:
+    # The leaderboard is rebuilt in the same transaction as the new metric
+    if metric_changed:
+        rebuild_leaderboard(s, c)
     s.commit()
+    # Existing scores were computed with the old metric or ground truth
+    if (metric_changed or gt_changed) and c.ground_truth_path:
+        start_rescore(s, c)
+    s.refresh(c)
     return c
 
 @app.delete("/competitions/{cid}")
-def delete_comp(cid: int, user: User = Depends(current_user), s: Session = Depends(db)):
+def delete_comp(cid: int, user: AuthUser = Depends(current_user), s: Session = Depends(db)):
     c = s.get(Competition, cid)
     if not c: raise HTTPException(404)
     if c.host_id != user.id: raise HTTPException(403, "Not host")
 
     # Delete submissions
+    s.query(RescoreJob).filter_by(competition_id=cid).delete()
+    s.query(LeaderboardEntry).filter_by(competition_id=cid).delete()
     s.query(Submission).filter_by(competition_id=cid).delete()
 
     # Delete files if they exist (rough clean up)
@@ -329,6 +809,23 @@ def get_comp(cid: int, s: Session = Depends(db)):
     host = s.get(User, c.host_id)
     return {"competition": c, "host": host.name if host else "Unknown", "is_host": False} # is_host calculated on front
 
+@app.post("/competitions/{cid}/rescore")
+def rescore_comp(cid: int, user: AuthUser = Depends(current_user), s: Session = Depends(db)):
+    c = s.get(Competition, cid)
+    if not c: raise HTTPException(404)
+    if c.host_id != user.id: raise HTTPException(403, "Not host")
+    if not c.ground_truth_path: raise HTTPException(400, "Competition has no ground truth")
+    return rescore_progress(start_rescore(s, c))
+
+@app.get("/competitions/{cid}/rescore")
+def rescore_status(cid: int, user: AuthUser = Depends(current_user), s: Session = Depends(db)):
+    # Progress of the latest rescoring job, or null if there never was one
+    c = s.get(Competition, cid)
+    if not c: raise HTTPException(404)
+    if c.host_id != user.id: raise HTTPException(403, "Not host")
+    job = s.query(RescoreJob).filter_by(competition_id=cid).order_by(RescoreJob.id.desc()).first()
+    return rescore_progress(job) if job else None
+
 @app.get("/competitions/{cid}/files")
 def get_comp_files(cid: int, s: Session = Depends(db)):
     c = s.get(Competition, cid)
@@ -344,44 +841,71 @@ def get_comp_files(cid: int, s: Session = Depends(db)):
 # ---------------- SUBMISSIONS ----------------
 
 @app.post("/competitions/{cid}/submit")
-def submit(
+async def submit(
     cid: int,
     file: UploadFile = File(...),
-    user: User = Depends(current_user),
+    user: AuthUser = Depends(current_user),
     s: Session = Depends(db)
 ):
     # Check limit? (Skip for now)
+    c = await run_in_threadpool(s.get, Competition, cid)
+    if not c: raise HTTPException(404)
+
+    path, sub_hash = await save_file(file, "submissions")
     
-    path = save_file(file, "submissions")
-    
-    # Mock scoring
-    import random
-    score = round(random.uniform(0.5, 1.0), 4)
+    if c.ground_truth_path:
+        # Identical resubmissions are answered from the result cache; ones that
+        # change a few rows of the user's last file are rescored from those rows
+        result = await run_in_threadpool(
+            calculate_score, path, c.ground_truth_path, c.metric, sub_hash=sub_hash, lineage=f"{cid}:{user.id}"
+        )
+        score = result.get("score")
+        status = "graded" if score is not None else "failed"
+    else:
+        # Mock scoring
+        import random
+        result = {}
+        score = round(random.uniform(0.5, 1.0), 4)
+        status = "graded"
 
     sub = Submission(
         competition_id=cid,
         user_id=user.id,
         file_path=path,
         score=score,
-        status="graded"
+        status=status,
+        created_at=datetime.utcnow()
     )
-    s.add(sub); s.commit()
+    await run_in_threadpool(record_submission, s, sub, c.metric)
+    if status == "failed":
+        return {"ok": False, "error": result.get("error")}
     return {"ok": True, "score": score}
 
+def record_submission(s: Session, sub: Submission, metric: str):
+    # The submission and its leaderboard entry are committed together
+    s.add(sub); s.flush()
+    if sub.status == "graded":
+        record_best(s, sub, metric)
+    s.commit()
+
 @app.get("/competitions/{cid}/leaderboard")
-def leaderboard(cid: int, s: Session = Depends(db)):
-    subs = s.query(Submission).filter_by(competition_id=cid).order_by(Submission.score.desc()).all()
-    # Join with user to get names
-    res = []
-    for sub in subs:
-        res.append({
-            "id": sub.id,
-            "user": sub.user.name,
-            "score": sub.score,
-            "created_at": sub.created_at
-        })
-    return res
+def leaderboard(cid: int, limit: int = 100, offset: int = 0, s: Session = Depends(db)):
+    # One page of the materialized table, read in index order with names joined in
+    offset, limit = max(offset, 0), min(max(limit, 1), 1000)
+    rows = (
+        s.query(LeaderboardEntry.submission_id, User.name, LeaderboardEntry.score, LeaderboardEntry.created_at)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .filter(LeaderboardEntry.competition_id == cid)
+        .order_by(LeaderboardEntry.sort_key, LeaderboardEntry.created_at)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {"id": sid, "rank": offset + i + 1, "user": name, "score": score, "created_at": created_at}
+        for i, (sid, name, score, created_at) in enumerate(rows)
+    ]
 
 @app.get("/competitions/{cid}/my_submissions")
-def my_submissions(cid: int, user: User = Depends(current_user), s: Session = Depends(db)):
+def my_submissions(cid: int, user: AuthUser = Depends(current_user), s: Session = Depends(db)):
     return s.query(Submission).filter_by(competition_id=cid, user_id=user.id).order_by(Submission.created_at.desc()).all()
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import sys
+from datetime import datetime
+
+# Versioned schema migrations for the backend database.
+#
+# Each migration runs once, in order, inside its own transaction; applied
+# versions are recorded in schema_migrations. A fresh database is first built
+# by Base.metadata.create_all, so every step must be safe to run against a
+# schema that already has its change (hence add_column's check and
+# CREATE ... IF NOT EXISTS).
+#
+#   python migrations.py           # apply pending migrations to dev.db
+#   python migrations.py status    # list applied / pending versions
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+
+def add_column(conn, table, column, ddl):
+    columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+def competition_dates(conn):
+    add_column(conn, "competitions", "start_date", "TIMESTAMP")
+    add_column(conn, "competitions", "end_date", "TIMESTAMP")
+
+def ground_truth_path(conn):
+    add_column(conn, "competitions", "ground_truth_path", "TEXT")
+
+def query_indexes(conn):
+    for ddl in (
+        # Ranking and per-competition scans
+        "CREATE INDEX IF NOT EXISTS ix_submissions_competition_score ON submissions (competition_id, score)",
+        # my_submissions: one user's entries in a competition, newest first
+        "CREATE INDEX IF NOT EXISTS ix_submissions_competition_user_created ON submissions (competition_id, user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_submissions_user ON submissions (user_id)",
+        # my_managed_comps and the home page listing
+        "CREATE INDEX IF NOT EXISTS ix_competitions_host_created ON competitions (host_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_competitions_created ON competitions (created_at)",
+    ):
+        conn.exec_driver_sql(ddl)
+
+def leaderboard(conn):
+    # Materialized best-per-user table (see LeaderboardEntry), backfilled from
+    # graded submissions; sort_key is the score signed so ascending is best-first
+    from metrics import get_metric
+
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS leaderboard ("
+        " competition_id INTEGER NOT NULL REFERENCES competitions (id),"
+        " user_id INTEGER NOT NULL REFERENCES users (id),"
+        " submission_id INTEGER REFERENCES submissions (id),"
+        " score FLOAT, sort_key FLOAT, created_at DATETIME,"
+        " PRIMARY KEY (competition_id, user_id))"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_leaderboard_rank ON leaderboard (competition_id, sort_key, created_at)"
+    )
+    for cid, metric in conn.exec_driver_sql("SELECT id, metric FROM competitions").fetchall():
+        try:
+            sign = -1 if get_metric(metric).higher_is_better else 1
+        except ValueError:
+            sign = -1
+        conn.exec_driver_sql("DELETE FROM leaderboard WHERE competition_id = ?", (cid,))
+        conn.exec_driver_sql(
+            "INSERT INTO leaderboard (competition_id, user_id, submission_id, score, sort_key, created_at)"
+            " SELECT competition_id, user_id, id, score, sort_key, created_at FROM ("
+            "  SELECT *, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY sort_key, created_at, id) AS pick"
+            "  FROM (SELECT *, ? * score AS sort_key FROM submissions"
+            "        WHERE competition_id = ? AND status = 'graded' AND score IS NOT NULL))"
+            " WHERE pick = 1",
+            (sign, cid),
+        )
+
+def rescore_jobs(conn):
+    # Checkpointed bulk rescoring (see RescoreJob)
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS rescore_jobs ("
+        " id INTEGER PRIMARY KEY,"
+        " competition_id INTEGER REFERENCES competitions (id),"
+        " metric VARCHAR, ground_truth_path VARCHAR, status VARCHAR,"
+        " max_submission_id INTEGER, last_submission_id INTEGER,"
+        " total INTEGER, done INTEGER, failed INTEGER, error TEXT,"
+        " created_at DATETIME, updated_at DATETIME)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_rescore_jobs_competition_id ON rescore_jobs (competition_id)"
+    )
+
+MIGRATIONS = [
+    (1, "competition_dates", competition_dates),
+    (2, "ground_truth_path", ground_truth_path),
+    (3, "query_indexes", query_indexes),
+    (4, "leaderboard", leaderboard),
+    (5, "rescore_jobs", rescore_jobs),
+]
+
+def _ensure_table(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY, name VARCHAR, applied_at DATETIME)"
+        )
+
+def applied_versions(engine):
+    _ensure_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_migrations")}
+
+def migrate(engine, verbose=False):
+    """Apply pending migrations in order; returns the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        if verbose:
+            print(f"Applying {version}: {name}...")
+        with engine.begin() as conn:
+            step(conn)
+            conn.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.utcnow().isoformat(sep=" ")),
+            )
+        applied.append(version)
+    return applied
+
+if __name__ == "__main__":
+    # Importing main builds the engine (with its pragmas) and runs migrate()
+    from main import engine
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "status":
+        done = applied_versions(engine)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>3} {name:<20} {'applied' if version in done else 'pending'}")
+    else:
+        applied = migrate(engine, verbose=True)
+        print(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
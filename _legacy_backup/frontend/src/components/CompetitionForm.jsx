@@ -107,7 +107,7 @@ export default function CompetitionForm({ initialData = null, existingDataFiles
                 <FileUpload
                     label="Ground Truth File (Hidden)"
                     name="ground_truth_file"
-                    accept=".csv,.json"
+                    accept=".csv,.json,.gz,.bz2,.xz,.zip"
                     existingFiles={getFileName(data.ground_truth_path) ? [{ name: getFileName(data.ground_truth_path) }] : []}
                 />
 
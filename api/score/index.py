@@ -1,67 +1,204 @@
-from flask import Flask, request, jsonify
+import os
+import sys
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-from sklearn.metrics import (
-    accuracy_score, f1_score, roc_auc_score, log_loss,
-    mean_absolute_error, mean_squared_error
-)
+
+# Shared scoring helpers live in lib/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+import gt_cache
+import remote
+from metrics import get_metric
+from scoring import _score, score_batch
+from bootstrap import resample_count
+from jobs import JobQueue, QueueFull
+from precheck import precheck
+from remote import fetch_cached, fetch_inputs
+from telemetry import Gauge, Histogram, StageTimer, render_metrics, size_bucket, stage
 
 app = Flask(__name__)
 CORS(app)
 
-def calculate_score(sub_url, gt_url, metric):
-    try:
-        # pandas can read directly from URLs
-        sub_df = pd.read_csv(sub_url)
-        gt_df = pd.read_csv(gt_url)
-
-        # Align on the first column (ID) and extract the target column(s)
-        gt_df = gt_df.set_index(gt_df.columns[0])
-        sub_df = sub_df.set_index(sub_df.columns[0])
-        
-        y_true = gt_df[gt_df.columns[0]].values
-        y_pred = sub_df[gt_df.columns[0]].values
-
-        score = 0.0
-        m = metric.lower()
-
-        if m == 'accuracy':
-            score = accuracy_score(y_true, y_pred)
-        elif m == 'f1':
-            score = f1_score(y_true, y_pred, average='weighted')
-        elif m == 'roc_auc':
-            score = roc_auc_score(y_true, y_pred)
-        elif m == 'cross_entropy':
-            score = log_loss(y_true, y_pred)
-        elif m == 'mae':
-            score = mean_absolute_error(y_true, y_pred)
-        elif m == 'mse':
-            score = mean_squared_error(y_true, y_pred)
-        elif m == 'rmse':
-            score = np.sqrt(mean_squared_error(y_true, y_pred))
-        else:
-            score = accuracy_score(y_true, y_pred)
-            
-        return {"score": float(round(score, 6))}
+# ---------------- METRICS ----------------
+# Scraped from GET /metrics. Counters live per process, so each serverless
+# instance reports its own.
+
+REQUEST_SECONDS = Histogram(
+    "scoring_request_seconds", "End-to-end /api/score latency",
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120), ("metric", "size"),
+)
+STAGE_SECONDS = Histogram(
+    "scoring_stage_seconds", "Time spent per scoring stage",
+    (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60), ("stage",),
+)
+IN_FLIGHT = Gauge("scoring_jobs_in_flight", "Scoring requests currently running")
+def _hit_ratio(stats):
+    lookups = stats["hits"] + stats["misses"]
+    return round(stats["hits"] / lookups, 6) if lookups else 0.0
+
+COLLECTORS = (
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    IN_FLIGHT,
+    Gauge("scoring_jobs_queued", "Jobs waiting for a worker", fn=lambda: jobs.depth()),
+    Gauge("scoring_gt_cache_hits_total", "Ground-truth cache hits", "counter", lambda: gt_cache.cache.stats()["hits"]),
+    Gauge("scoring_gt_cache_misses_total", "Ground-truth cache misses", "counter", lambda: gt_cache.cache.stats()["misses"]),
+    Gauge("scoring_gt_cache_hit_ratio", "Share of ground-truth lookups served from the cache", fn=lambda: _hit_ratio(gt_cache.cache.stats())),
+    Gauge("scoring_gt_cache_bytes", "Bytes held by the ground-truth cache", fn=lambda: gt_cache.cache.stats()["bytes"]),
+    Gauge("scoring_gt_cache_entries", "Ground truths held by the cache", fn=lambda: gt_cache.cache.stats()["entries"]),
+    Gauge("scoring_fetch_downloads_total", "Remote files downloaded", "counter", lambda: remote.stats()["downloads"]),
+    Gauge("scoring_fetch_not_modified_total", "Ground-truth downloads skipped by a 304", "counter", lambda: remote.stats()["not_modified"]),
+    Gauge("scoring_fetch_bytes_total", "Bytes downloaded from remote files", "counter", lambda: remote.stats()["bytes"]),
+)
 
+def calculate_score(sub_url, gt_url, metric, timer=None, bootstrap=None):
+    sub = None
+    try:
+        # Both files are fetched at once through the pooled connections; the
+        # ground truth's local copy is revalidated and only downloaded again
+        # when it changed
+        with stage(timer, "fetch"):
+            sub, gt_file = fetch_inputs(sub_url, gt_url)
+        # Scored from the local copies by the same pipeline as lib/scoring.py
+        return precheck(sub.path, gt_file.path) or _score(sub.path, gt_file.path, metric, bootstrap=bootstrap, timer=timer)
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if sub is not None:
+            sub.close()
+
+def metric_label(metric):
+    # Histogram label for a requested metric: the registered name without its
+    # cutoff, so clients cannot create new series with arbitrary strings
+    try:
+        return get_metric(metric).name.partition("@")[0]
+    except ValueError:
+        return "unknown"
+
+def score_request(sub_url, gt_url, metric, timings=False, bootstrap=None, deadline=None):
+    # Always timed for the /metrics histograms; peak memory and the
+    # per-stage breakdown are only returned when asked for. "bootstrap"
+    # (true or a number of resamples) adds a confidence interval
+    timer = StageTimer(track_memory=timings, deadline=deadline)
+    IN_FLIGHT.inc()
+    try:
+        result = calculate_score(sub_url, gt_url, metric, timer, bootstrap)
+    finally:
+        IN_FLIGHT.dec()
+    report = timer.report()
+    REQUEST_SECONDS.observe(report["timings"]["total"], metric_label(metric), size_bucket(timer.bytes_read))
+    for name, seconds in timer.stages.items():
+        STAGE_SECONDS.observe(seconds, name)
+    if timings:
+        result.update(report)
+    return result
+
+def bootstrap_resamples(value):
+    # Client-chosen bootstrap option as a resample count, or None without one;
+    # counts above SCORING_BOOTSTRAP_MAX are rejected rather than clamped
+    return resample_count(value) if value else None
+
+def _score_args(data):
+    if not data:
+        return None, "No data provided"
+    sub_url = data.get('sub_url')
+    gt_url = data.get('gt_url')
+    if not sub_url or not gt_url:
+        return None, "Missing sub_url or gt_url"
+    try:
+        bootstrap = bootstrap_resamples(data.get('bootstrap'))
+    except ValueError as e:
+        return None, str(e)
+    return (sub_url, gt_url, data.get('metric', 'accuracy'), bool(data.get('timings')), bootstrap), None
 
 @app.route('/api/score', methods=['POST'])
 def score():
+    args, error = _score_args(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(score_request(*args))
+
+# ---------------- JOBS ----------------
+# POST /api/score/jobs takes the same body as /api/score and answers 202 with
+# a job id; GET /api/score/jobs/<id>?wait=N polls, or long-polls for up to N
+# seconds. The queue lives in this process, so job mode needs a long-running
+# server (one process, or sticky routing) rather than per-request functions.
+
+JOB_WAIT_MAX_S = 30
+jobs = JobQueue(
+    score_request,
+    workers=int(os.environ.get("SCORING_JOB_WORKERS", 2)),
+    max_queue=int(os.environ.get("SCORING_JOB_QUEUE", 32)),
+    timeout=float(os.environ.get("SCORING_JOB_TIMEOUT_S", 300)),
+)
+
+@app.route('/api/score/jobs', methods=['POST'])
+def submit_job():
+    args, error = _score_args(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        job = jobs.submit(*args)
+    except QueueFull as e:
+        res = jsonify({"error": str(e)})
+        res.headers["Retry-After"] = str(e.retry_after)
+        return res, 429
+    res = jsonify(job.to_dict())
+    res.headers["Location"] = f"/api/score/jobs/{job.id}"
+    return res, 202
+
+@app.route('/api/score/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOB_WAIT_MAX_S)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    if wait > 0:
+        jobs.wait(job, wait)
+    return jsonify(job.to_dict())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(COLLECTORS), mimetype="text/plain; version=0.0.4")
+
+# Processes one batch request may use; a client's "workers" can ask for fewer
+BATCH_WORKERS_MAX = int(os.environ.get("SCORING_BATCH_WORKERS", 0)) or os.cpu_count() or 1
+
+def batch_workers(value):
+    # Client-chosen worker count, clamped to 1..BATCH_WORKERS_MAX
+    if value is None:
+        return BATCH_WORKERS_MAX
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("workers must be a whole number")
+    return min(max(value, 1), BATCH_WORKERS_MAX)
+
+@app.route('/api/score/batch', methods=['POST'])
+def score_many():
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data provided"}), 400
-    
-    sub_url = data.get('sub_url')
+
+    sub_urls = data.get('sub_urls')
     gt_url = data.get('gt_url')
-    metric = data.get('metric', 'accuracy')
+    metrics = data.get('metrics') or [data.get('metric', 'accuracy')]
 
-    if not sub_url or not gt_url:
-        return jsonify({"error": "Missing sub_url or gt_url"}), 400
+    if not sub_urls or not gt_url:
+        return jsonify({"error": "Missing sub_urls or gt_url"}), 400
+    if not isinstance(sub_urls, list) or not isinstance(metrics, list):
+        return jsonify({"error": "sub_urls and metrics must be lists"}), 400
+    try:
+        workers = batch_workers(data.get('workers'))
+        bootstrap = bootstrap_resamples(data.get('bootstrap'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    result = calculate_score(sub_url, gt_url, metric)
+    try:
+        gt_file = fetch_cached(gt_url)
+    except Exception as e:
+        return jsonify({"error": str(e)})
+    result = score_batch(sub_urls, gt_file.path, metrics, workers=workers, bootstrap=bootstrap)
     return jsonify(result)
 
 # Vercel requirements
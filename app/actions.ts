@@ -8,6 +8,7 @@ import { cookies } from "next/headers"
 import { redirect } from "next/navigation"
 import path from "path"
 import fs from "fs"
+import crypto from "crypto"
 import { revalidatePath } from "next/cache"
 import { parseFromUTC7Input } from "@/lib/dateUtils"
 import { calculateScore } from "@/lib/scoring"
@@ -68,6 +69,13 @@ export async function register(prevState: any, formData: FormData) {
 // Removal of @vercel/blob import for local storage implementation
 
 async function saveFile(file: File, folder: string): Promise<string | null> {
+    const stored = await storeFile(file, folder)
+    return stored ? stored.path : null
+}
+
+// Like saveFile, but also returns the SHA-256 of the bytes written, taken from
+// the same buffer so the file is never read back just to hash it
+async function storeFile(file: File, folder: string): Promise<{ path: string; sha256: string } | null> {
     if (!file || file.size === 0 || file.name === "undefined") return null
 
     // Fallback to local fs for development (now the primary method)
@@ -84,8 +92,9 @@ async function saveFile(file: File, folder: string): Promise<string | null> {
 
     const filePath = path.join(uploadDir, uniqueName)
     fs.writeFileSync(filePath, buffer)
+    const sha256 = crypto.createHash("sha256").update(buffer).digest("hex")
 
-    return `api/file/${folder}/${uniqueName}`
+    return { path: `api/file/${folder}/${uniqueName}`, sha256 }
 }
 
 // --- Competitions ---
@@ -197,8 +206,9 @@ export async function submitSubmission(cid: number, formData: FormData) {
     if (!file) return { message: "No file" }
 
     try {
-        const savedPath = await saveFile(file, "submissions")
-        if (!savedPath) return { message: "Upload failed" }
+        const saved = await storeFile(file, "submissions")
+        if (!saved) return { message: "Upload failed" }
+        const savedPath = saved.path
 
         const comp = await prisma.competition.findUnique({
             where: { id: Number(cid) }
@@ -215,7 +225,9 @@ export async function submitSubmission(cid: number, formData: FormData) {
             const res = await calculateScore(
                 savedPath.replace("api/file/", ""),
                 comp.groundTruthPath,
-                comp.metric
+                comp.metric,
+                saved.sha256,
+                `${comp.id}:${session.id}`
             )
             if (res.score !== null) {
                 score = res.score
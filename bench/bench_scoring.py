@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timezone
+
+# Scoring benchmark harness.
+#
+#   python bench/bench_scoring.py --sizes 1k,100k,1m
+#   python bench/bench_scoring.py --compare            # last two runs
+#   python bench/bench_scoring.py --compare abc123 my-label   # commit prefix / label / index
+#
+# Every case runs in a fresh interpreter, so import cost and peak RSS belong
+# to that case alone. Each case times the stages shared by all scorers
+# (read_sub, load_gt, align, metric) with a cold ground-truth cache, then the
+# scorer's own entry point end to end with a warm cache. All three run the
+# pipeline of lib/scoring.py _score and differ in what surrounds it:
+#   scoring - lib/scoring.py calculate_score
+#   bridge  - lib/scoring_bridge.py calculate_score
+#   flask   - POST /api/score on api/score/index.py through Flask's test client
+# The persistent result and delta caches and the precheck are switched off in
+# every case (BENCH_ENV), so repeated and warm-store runs time scoring rather
+# than cache hits.
+# Results are appended to a JSON history keyed by git commit.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "bench")
+SCORERS = ("scoring", "bridge", "flask")
+DEFAULT_SIZES = "1k,10k,100k,1m"
+BENCH_ENV = {"SCORING_RESULT_CACHE": "off", "SCORING_DELTA_CACHE": "off", "SCORING_PRECHECK": "0"}
+
+sys.path.insert(0, BENCH_DIR)
+from datagen import KINDS, VARIANTS, METRICS_BY_KIND, make_dataset, parse_rows
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+def run_case(case):
+    """Executed in the child interpreter; returns one result record."""
+    start = time.perf_counter()
+    sys.path.insert(0, os.path.join(ROOT, "lib"))
+    import scoring
+    import scoring_bridge
+    from gt_cache import cache, load_ground_truth
+    from alignment import align_targets
+    from metrics import compute_metric
+    if case["scorer"] == "flask":
+        sys.path.insert(0, os.path.join(ROOT, "api", "score"))
+        import index
+        client = index.app.test_client()
+    import_s = time.perf_counter() - start
+
+    sub_path, gt_path, metric = case["sub_path"], case["gt_path"], case["metric"]
+    # Every scorer reads submissions through scoring.read_submission
+    reader = scoring.read_submission
+
+    stages = {"read_sub": [], "load_gt": [], "align": [], "metric": []}
+    for _ in range(case["repeat"]):
+        cache.clear()
+        sub_df, t = _timed(reader, sub_path)
+        stages["read_sub"].append(t)
+        gt, t = _timed(load_ground_truth, gt_path)
+        stages["load_gt"].append(t)
+        (y_true, y_pred, _), t = _timed(align_targets, gt, sub_df)
+        stages["align"].append(t)
+        _, t = _timed(compute_metric, metric, y_true, y_pred)
+        stages["metric"].append(t)
+        del sub_df, y_true, y_pred
+
+    totals = []
+    for _ in range(case["repeat"]):
+        if case["scorer"] == "scoring":
+            result, t = _timed(scoring.calculate_score, sub_path, gt_path, metric)
+        elif case["scorer"] == "bridge":
+            result, t = _timed(scoring_bridge.calculate_score, sub_path, gt_path, metric)
+        else:
+            res, t = _timed(client.post, "/api/score", json={"sub_url": sub_path, "gt_url": gt_path, "metric": metric})
+            result = res.get_json()
+        totals.append(t)
+
+    return {
+        **{k: case[k] for k in ("scorer", "kind", "variant", "rows", "metric")},
+        "import_s": round(import_s, 6),
+        # Best of `repeat`: the least noisy estimate of each stage
+        "stages_s": {k: round(min(v), 6) for k, v in stages.items()},
+        "total_s": round(min(totals), 6),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "error": result.get("error"),
+    }
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def run(args):
+    cases = []
+    for text in args.sizes.split(","):
+        rows = parse_rows(text)
+        for kind in args.kinds.split(","):
+            for variant in args.variants.split(","):
+                gt_path, sub_path = make_dataset(args.data_dir, kind, rows, variant)
+                for metric in METRICS_BY_KIND[kind]:
+                    for scorer in args.scorers.split(","):
+                        cases.append({
+                            "scorer": scorer, "kind": kind, "variant": variant, "rows": rows,
+                            "metric": metric, "gt_path": gt_path, "sub_path": sub_path,
+                            "repeat": args.repeat,
+                        })
+
+    results = []
+    for i, case in enumerate(cases, 1):
+        proc = subprocess.run([sys.executable, __file__, "--case", json.dumps(case)],
+                              capture_output=True, text=True, env={**os.environ, **BENCH_ENV})
+        if proc.returncode != 0:
+            record = {**{k: case[k] for k in ("scorer", "kind", "variant", "rows", "metric")},
+                      "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "crashed"}
+        else:
+            record = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(record)
+        print(f"[{i}/{len(cases)}] {_describe(record)}", flush=True)
+
+    history = load_history(args.history)
+    history.append({
+        "commit": _git_commit(),
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results,
+    })
+    with open(args.history + ".tmp", "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(args.history + ".tmp", args.history)
+    print(f"Appended run #{len(history) - 1} to {args.history}")
+
+def _describe(r):
+    name = f"{r['scorer']:<7} {r['kind']:<14} {r['variant']:<9} {r['rows']:>9} {r['metric']:<13}"
+    if "total_s" not in r:
+        return f"{name} FAILED: {r['error']}"
+    stages = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in r["stages_s"].items())
+    note = f"  [{r['error']}]" if r.get("error") else ""
+    return f"{name} total={r['total_s'] * 1000:.1f}ms {stages} rss={r['peak_rss_mb']}MB{note}"
+
+def _find_run(history, key):
+    # A run is picked by index (negative allowed), commit prefix or label
+    try:
+        return history[int(key)]
+    except (ValueError, IndexError):
+        pass
+    for run in reversed(history):
+        if (run.get("commit") or "").startswith(key) or run.get("label") == key:
+            return run
+    raise SystemExit(f"No run matching '{key}'")
+
+def compare(args):
+    history = load_history(args.history)
+    if len(history) < 2 and len(args.compare) < 2:
+        raise SystemExit("Need at least two runs to compare")
+    keys = args.compare + ["-2", "-1"][len(args.compare):]
+    base, head = _find_run(history, keys[0]), _find_run(history, keys[1])
+    print(f"base {base.get('commit')} ({base['timestamp']})  ->  head {head.get('commit')} ({head['timestamp']})")
+
+    key = lambda r: (r["scorer"], r["kind"], r["variant"], r["rows"], r["metric"])
+    before = {key(r): r for r in base["results"] if "total_s" in r}
+    for r in head["results"]:
+        b = before.get(key(r))
+        if b is None or "total_s" not in r:
+            continue
+        change = (r["total_s"] - b["total_s"]) / b["total_s"] * 100 if b["total_s"] else 0.0
+        rss = r["peak_rss_mb"] - b["peak_rss_mb"]
+        print(f"{' '.join(str(k) for k in key(r)):<58} total {b['total_s'] * 1000:9.1f} -> {r['total_s'] * 1000:9.1f}ms "
+              f"({change:+6.1f}%)  rss {rss:+8.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts, e.g. 1k,1m,50m")
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--scorers", default=",".join(SCORERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, "data"))
+    parser.add_argument("--history", default=os.path.join(BENCH_DIR, "history.json"))
+    parser.add_argument("--label", help="free-form name stored with the run")
+    parser.add_argument("--compare", nargs="*", help="compare two runs (index, commit prefix or label)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+    elif args.compare is not None:
+        compare(args)
+    else:
+        run(args)
+
+if __name__ == "__main__":
+    main()
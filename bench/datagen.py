@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Synthetic ground truth / submission pairs for the scoring benchmarks.
+#
+# kinds:
+#   classification - 5 integer classes, predicted labels    (accuracy, f1)
+#   probability    - binary target, predicted probabilities (roc_auc, cross_entropy)
+#   regression     - float target, float predictions        (mae, mse, rmse)
+# variants:
+#   aligned   - submission IDs in ground-truth order (fast path)
+#   shuffled  - same IDs in random order
+#   partial   - 10% of IDs dropped
+#   duplicate - 5% of rows repeated
+# Files are written once per (kind, rows, variant, seed) and reused.
+
+KINDS = ("classification", "probability", "regression")
+VARIANTS = ("aligned", "shuffled", "partial", "duplicate")
+
+METRICS_BY_KIND = {
+    "classification": ("accuracy", "f1"),
+    "probability": ("roc_auc", "cross_entropy"),
+    "regression": ("mae", "rmse"),
+}
+
+def parse_rows(text):
+    # "1k" -> 1000, "50m" -> 50000000
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+def _targets(kind, rows, rng):
+    if kind == "classification":
+        y_true = rng.integers(0, 5, rows)
+        y_pred = np.where(rng.random(rows) < 0.7, y_true, rng.integers(0, 5, rows))
+    elif kind == "probability":
+        y_true = rng.integers(0, 2, rows)
+        y_pred = np.clip(0.5 + (y_true - 0.5) * 0.4 + rng.normal(0, 0.25, rows), 0, 1).round(6)
+    elif kind == "regression":
+        y_true = rng.normal(100, 20, rows).round(4)
+        y_pred = (y_true + rng.normal(0, 5, rows)).round(4)
+    else:
+        raise ValueError(f"Unknown kind '{kind}'")
+    return y_true, y_pred
+
+def _variant_rows(variant, rows, rng):
+    if variant == "aligned":
+        return np.arange(rows)
+    if variant == "shuffled":
+        return rng.permutation(rows)
+    if variant == "partial":
+        return np.sort(rng.choice(rows, rows - rows // 10, replace=False))
+    if variant == "duplicate":
+        extra = rng.choice(rows, max(1, rows // 20), replace=False)
+        return np.sort(np.concatenate([np.arange(rows), extra]), kind="stable")
+    raise ValueError(f"Unknown variant '{variant}'")
+
+def make_dataset(out_dir, kind, rows, variant="aligned", seed=0):
+    """Write (or reuse) gt.csv / sub.csv for one case; returns their paths."""
+    case_dir = os.path.join(out_dir, f"{kind}-{rows}-{variant}-{seed}")
+    gt_path = os.path.join(case_dir, "gt.csv")
+    sub_path = os.path.join(case_dir, "sub.csv")
+    if os.path.exists(gt_path) and os.path.exists(sub_path):
+        return gt_path, sub_path
+
+    os.makedirs(case_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    # IDs are unique but not contiguous, like real competition IDs
+    ids = np.sort(rng.choice(rows * 4, rows, replace=False))
+    y_true, y_pred = _targets(kind, rows, rng)
+    pick = _variant_rows(variant, rows, rng)
+
+    # Write through a temp name so an interrupted run never leaves half a file
+    for path, frame in (
+        (gt_path, pd.DataFrame({"id": ids, "label": y_true})),
+        (sub_path, pd.DataFrame({"id": ids[pick], "label": y_pred[pick]})),
+    ):
+        frame.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return gt_path, sub_path
@@ -53,6 +53,9 @@ export default function CompetitionForm({ initialData, existingDataFiles = [] }:
                             <optgroup label="Classification" className="text-[10px] font-bold uppercase tracking-widest text-neutral-400">
                                 <option value="accuracy">Accuracy</option>
                                 <option value="f1">F1 Score</option>
+                                <option value="f1_macro">F1 Score (Macro)</option>
+                                <option value="precision_macro">Precision (Macro)</option>
+                                <option value="recall_macro">Recall (Macro)</option>
                                 <option value="roc_auc">ROC AUC</option>
                                 <option value="cross_entropy">Cross Entropy</option>
                             </optgroup>
@@ -61,6 +64,11 @@ export default function CompetitionForm({ initialData, existingDataFiles = [] }:
                                 <option value="mse">Mean Squared Error (MSE)</option>
                                 <option value="rmse">Root Mean Squared Error (RMSE)</option>
                             </optgroup>
+                            <optgroup label="Ranking" className="text-[10px] font-bold uppercase tracking-widest text-neutral-400">
+                                <option value="map@10">Mean Average Precision (MAP@10)</option>
+                                <option value="ndcg@10">Normalized DCG (NDCG@10)</option>
+                                <option value="mrr">Mean Reciprocal Rank (MRR)</option>
+                            </optgroup>
                         </select>
                         <div className="absolute right-4 bottom-4 pointer-events-none text-neutral-400">
                             <X size={12} className="rotate-45" />
@@ -105,7 +113,7 @@ export default function CompetitionForm({ initialData, existingDataFiles = [] }:
                             initialFiles={existingDataFiles} />
                     </div>
                     <div className="sm:col-span-2">
-                        <FileUpload label="Ground Truth (Classified)" name="ground_truth_file" accept=".csv,.json"
+                        <FileUpload label="Ground Truth (Classified)" name="ground_truth_file" accept=".csv,.json,.gz,.bz2,.xz,.zip"
                             initialFiles={initialData?.groundTruthPath ? [{ name: initialData.groundTruthPath.split('/').pop()!, path: initialData.groundTruthPath }] : []} />
                     </div>
                 </div>
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+from metrics import get_metric
+
+# ID alignment shared by every scorer.
+# The common case, a submission whose ID column is exactly the ground truth's
+# ID column in the same order, is detected with one vectorized comparison and
+# uses both target arrays as-is. Anything else is matched against the sorted
+# view of the ground-truth IDs with np.searchsorted. Missing, extra and
+# duplicate IDs are reported as structured diagnostics; for duplicates the
+# first occurrence is scored.
+# For label metrics, string targets are scored as small integer codes: the
+# ground truth's labels are dictionary-encoded once per cached entry and the
+# submission's labels are looked up in that dictionary. Labels the ground
+# truth never uses are coded from len(labels) up, one code each, so macro
+# averages still count every distinct label as scikit-learn does.
+
+SAMPLE_IDS = 5
+
+class AlignmentError(ValueError):
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+class Alignment:
+    def __init__(self, gt_rows, sub_rows, rows, missing=(), extra=(), duplicate=()):
+        # gt_rows / sub_rows are None on the already-aligned fast path
+        self.gt_rows = gt_rows
+        self.sub_rows = sub_rows
+        self.rows = rows
+        self.missing = missing
+        self.extra = extra
+        self.duplicate = duplicate
+
+    @property
+    def matched(self):
+        return self.rows if self.gt_rows is None else len(self.gt_rows)
+
+    @property
+    def clean(self):
+        return not (len(self.missing) or len(self.extra) or len(self.duplicate))
+
+    def report(self):
+        return make_report(self.rows, self.matched, self.missing, self.extra, self.duplicate)
+
+def make_report(rows, matched, missing, extra, duplicate):
+    # missing/extra/duplicate are either ID arrays or (count, sample) pairs
+    def entry(ids):
+        if isinstance(ids, tuple):
+            return ids
+        return len(ids), list(np.asarray(ids[:SAMPLE_IDS]).tolist())
+
+    report = {"rows": int(rows), "matched": int(matched)}
+    for name, ids in (("missing", missing), ("extra", extra), ("duplicate", duplicate)):
+        count, sample = entry(ids)
+        report[name] = int(count)
+        if count:
+            report[f"{name}_ids"] = sample
+    return report
+
+def ensure_sorter(gt):
+    # Compiled ground truths ship one; otherwise sort once and keep it on the cached entry
+    if gt.sorter is None:
+        gt.sorter = np.argsort(gt.ids, kind="stable")
+    return gt.sorter
+
+def ensure_sorted_ids(gt):
+    # ids[sorter], materialized once: binary searches over a contiguous array
+    # avoid an indirection through the sorter at every step
+    if gt.sorted_ids is None:
+        gt.sorted_ids = np.asarray(gt.ids)[ensure_sorter(gt)]
+    return gt.sorted_ids
+
+def normalize_ids(gt, ids):
+    # Compiled string IDs are fixed-width unicode; compare like with like
+    ids = np.asarray(ids)
+    if gt.ids.dtype.kind == 'U' and ids.dtype.kind != 'U':
+        ids = ids.astype(str)
+    return ids
+
+def gt_positions(gt, ids):
+    """Row of each ID in the ground truth, or -1 where it has none."""
+    sorter = ensure_sorter(gt)
+    out = np.full(len(ids), -1, dtype=np.int64)
+    if len(sorter) == 0:
+        return out
+    sorted_ids = ensure_sorted_ids(gt)
+    # Looking the keys up in sorted order keeps consecutive searches in the
+    # same region of sorted_ids, which matters once it outgrows the CPU cache
+    order = np.argsort(ids, kind="stable")
+    keys = ids[order]
+    pos = np.minimum(np.searchsorted(sorted_ids, keys), len(sorter) - 1)
+    hit = sorted_ids[pos] == keys
+    out[order[hit]] = sorter[pos[hit]]
+    return out
+
+def ensure_label_codes(gt):
+    """(codes, labels): int32 code of every ground-truth row and the sorted label dictionary."""
+    if gt.label_codes is None:
+        codes, labels = pd.factorize(np.asarray(gt.target), sort=True, use_na_sentinel=False)
+        gt.label_codes = codes.astype(np.int32), pd.Index(labels)
+    return gt.label_codes
+
+def encode_labels(labels, values):
+    """Codes of values in the label dictionary; unseen labels are numbered from len(labels)."""
+    codes = labels.get_indexer(values).astype(np.int32)
+    unseen = np.flatnonzero(codes < 0)
+    if len(unseen):
+        codes[unseen] = len(labels) + pd.factorize(np.asarray(values)[unseen], use_na_sentinel=False)[0]
+    return codes
+
+def _encodes(gt, metric, y_pred):
+    # Only string labels on both sides gain from encoding; anything else is
+    # left to the metric, which also reports label type mismatches
+    if metric is None or len(gt.target_cols) > 1 or get_metric(metric).kind != "label":
+        return False
+    return gt.target.dtype.kind in "OU" and np.asarray(y_pred).dtype.kind in "OU"
+
+def align(gt, sub_ids):
+    sub_ids = normalize_ids(gt, sub_ids)
+    n = len(sub_ids)
+
+    # Fast path: same IDs in the same order, nothing to gather
+    if n == len(gt.ids) and np.array_equal(sub_ids, gt.ids):
+        return Alignment(None, None, n)
+
+    pos = gt_positions(gt, sub_ids)
+    hit = np.flatnonzero(pos >= 0)
+    gt_rows, first = np.unique(pos[hit], return_index=True)
+    sub_rows = hit[first]
+
+    dup_mask = np.ones(len(hit), dtype=bool)
+    dup_mask[first] = False
+    missing_mask = np.ones(len(gt.ids), dtype=bool)
+    missing_mask[gt_rows] = False
+
+    return Alignment(
+        gt_rows,
+        sub_rows,
+        n,
+        missing=gt.ids[missing_mask],
+        extra=sub_ids[pos < 0],
+        duplicate=sub_ids[hit[dup_mask]],
+    )
+
+def aligned_queries(gt, alignment):
+    """Query code of every aligned row, or None when the ground truth has no query column."""
+    if gt.query_codes is None:
+        return None
+    if alignment.gt_rows is None:
+        return np.asarray(gt.query_codes)
+    return gt.query_codes[alignment.gt_rows]
+
+def check_target_columns(gt, columns):
+    missing = [str(c) for c in gt.target_cols if c not in columns]
+    if len(missing) == 1:
+        raise ValueError(f"Submission is missing the '{missing[0]}' column")
+    if missing:
+        raise ValueError(f"Submission is missing the {', '.join(repr(c) for c in missing)} columns")
+
+def align_targets(gt, sub_df, metric=None):
+    """Aligned (y_true, y_pred, alignment) for a submission frame whose first column is the ID.
+
+    With several target columns y_true and y_pred are rows x targets blocks
+    in the ground truth's column order, whatever order the submission uses.
+    When `metric` is a label metric, string labels come back as dictionary
+    codes (see ensure_label_codes).
+    """
+    check_target_columns(gt, sub_df.columns)
+
+    a = align(gt, sub_df[sub_df.columns[0]].to_numpy())
+    if a.matched == 0:
+        raise AlignmentError("No common IDs found between submission and ground truth.", a.report())
+
+    if len(gt.target_cols) > 1:
+        y_pred = sub_df[gt.target_cols].to_numpy()
+    else:
+        y_pred = sub_df[gt.target_col].to_numpy()
+    y_true = gt.target
+    if _encodes(gt, metric, y_pred):
+        y_true, labels = ensure_label_codes(gt)
+        if a.sub_rows is not None:
+            # Only the scored rows are looked up
+            y_pred = y_pred[a.sub_rows]
+        y_pred = encode_labels(labels, y_pred)
+        return (y_true if a.gt_rows is None else y_true[a.gt_rows]), y_pred, a
+    if a.gt_rows is None:
+        return y_true, y_pred, a
+    return y_true[a.gt_rows], y_pred[a.sub_rows], a
@@ -0,0 +1,297 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from alignment import aligned_queries
+from metrics import get_metric, label_codes, prepare
+from telemetry import check_deadline
+
+# Bootstrap confidence intervals and leaderboard shake-up estimates.
+#
+# A score is measured on one finite test set; rescoring on resamples of its
+# rows shows how much a different draw of the same size could move it. Every
+# resample here is a Poisson bootstrap: each ground-truth row (each query, for
+# ranking metrics with a query column) gets an independent Poisson(1) weight,
+# so RESAMPLES resamples are one resamples x units matrix of small counts.
+# The matrix depends only on the number of units, the number of resamples and
+# the seed, so every submission to a competition is resampled the same way:
+# intervals are reproducible, and two submissions' resampled scores are
+# paired, which is what the shake-up estimate of score_batch compares.
+#
+# The matrix is made of TILE_RESAMPLES x TILE_UNITS tiles, each drawn from its
+# own seed. Matrices within SCORING_BOOTSTRAP_MB are kept whole in an LRU
+# cache; larger ones are generated TILE_RESAMPLES resamples at a time and
+# reduced as they go, which gives the same weights.
+#
+# Scores for a block of resamples come out of one batched reduction per
+# metric, over column chunks of the block:
+#   - mean-of-rows metrics (Metric.rowwise): weighted sums, W @ values
+#   - label metrics (Metric.counts): weighted support / predicted / correct
+#   - roc_auc: a weighted Mann-Whitney U over the rows sorted by score
+#   - ranking metrics: per-query values under per-query weights
+# A row weighted 2 counts as if it were in the resample twice, so each
+# resampled score equals the metric on the corresponding resampled rows.
+# Only submission rows that matched the ground truth take part, as in the
+# score itself. Ground truths with several target columns are not supported.
+
+RESAMPLES = int(os.environ.get("SCORING_BOOTSTRAP_RESAMPLES", 1000))
+# Most resamples a caller may ask for; the cost grows linearly with the count
+RESAMPLES_MAX = int(os.environ.get("SCORING_BOOTSTRAP_MAX", 10000))
+SEED = int(os.environ.get("SCORING_BOOTSTRAP_SEED", 0))
+# Central interval reported around the score
+LEVEL = 0.95
+# Weights are drawn in tiles of this many resamples x units, each from its own
+# seed, so a matrix never depends on how much of it is built at once
+TILE_RESAMPLES = 8
+TILE_UNITS = 4096
+# Resamples x units cells reduced at a time, as one float64 block
+BLOCK_CELLS = 1 << 22
+
+class WeightCache:
+    """Whole Poisson weight matrices, least recently used first out of a byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (units, resamples, seed) -> uint8 matrix
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, units, resamples, seed):
+        """The matrix, or None when it is larger than the whole budget."""
+        key = (units, resamples, seed)
+        with self._lock:
+            weights = self._entries.get(key)
+            if weights is not None:
+                self._entries.move_to_end(key)
+                return weights
+        if units * resamples > self.max_bytes:
+            return None
+        weights = poisson_weights(units, 0, resamples, seed)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = weights
+                self._size += weights.nbytes
+            while self._size > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._size -= oldest.nbytes
+        return weights
+
+def poisson_weights(units, start, stop, seed):
+    """Resamples start:stop of the resamples x units Poisson(1) matrix for `seed`."""
+    if start % TILE_RESAMPLES:
+        raise ValueError("Weight rows start at a tile boundary")
+    weights = np.empty((stop - start, units), dtype=np.uint8)
+    for r in range(start, stop, TILE_RESAMPLES):
+        rows = min(TILE_RESAMPLES, stop - r)
+        for c in range(0, units, TILE_UNITS):
+            cols = min(TILE_UNITS, units - c)
+            rng = np.random.default_rng([seed, r // TILE_RESAMPLES, c // TILE_UNITS])
+            # Poisson(1) never gets near 255 in practice; clip rather than wrap
+            tile = np.minimum(rng.poisson(1.0, size=(TILE_RESAMPLES, cols)), 255)
+            weights[r - start:r - start + rows, c:c + cols] = tile[:rows]
+    return weights
+
+def weight_blocks(units, resamples, seed):
+    """Yield (first resample, weights) blocks covering the whole matrix."""
+    weights = cache.get(units, resamples, seed)
+    if weights is not None:
+        # Row slices of about BLOCK_CELLS, so callers can stop between them
+        step = max(1, BLOCK_CELLS // max(units, 1))
+        for start in range(0, resamples, step):
+            yield start, weights[start:start + step]
+        return
+    for start in range(0, resamples, TILE_RESAMPLES):
+        yield start, poisson_weights(units, start, min(start + TILE_RESAMPLES, resamples), seed)
+
+_budget_mb = float(os.environ.get("SCORING_BOOTSTRAP_MB", 256))
+cache = WeightCache(int(_budget_mb * 1024 * 1024))
+
+# ---------------- REDUCTIONS ----------------
+# Each takes, per aligned row, the unit it belongs to and whatever the metric
+# needs, does the work that does not depend on the weights once, and returns
+# reduce(weights) -> one score per resample of a block (NaN where a resample
+# leaves the metric undefined, e.g. no positives for roc_auc).
+
+def _chunk(weights):
+    # Units per block of every resample
+    return max(1, BLOCK_CELLS // len(weights))
+
+def _weighted_means(units, values):
+    def reduce(weights):
+        sums = np.zeros(len(weights))
+        totals = np.zeros(len(weights))
+        chunk = _chunk(weights)
+        for a in range(0, len(units), chunk):
+            w = weights[:, units[a:a + chunk]].astype(np.float64)
+            sums += w @ values[a:a + chunk]
+            totals += w.sum(axis=1)
+        return np.divide(sums, totals, out=np.full(len(weights), np.nan), where=totals > 0)
+    return reduce
+
+def _key_sums(units, keys, n_keys):
+    # reduce(weights)[:, k]: total weight of the rows whose key is k, one
+    # segment sum per key over the rows sorted by key
+    order = np.argsort(keys, kind="stable")
+    units, keys = units[order], keys[order]
+
+    def reduce(weights):
+        out = np.zeros((len(weights), n_keys))
+        chunk = _chunk(weights)
+        for a in range(0, len(units), chunk):
+            k = keys[a:a + chunk]
+            starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+            out[:, k[starts]] += np.add.reduceat(weights[:, units[a:a + chunk]], starts, axis=1, dtype=np.float64)
+        return out
+    return reduce
+
+def _label_scores(m, units, y_true, y_pred):
+    t, p, k = label_codes(y_true, y_pred)
+    hit = t == p
+    support = _key_sums(units, t, k)
+    predicted = _key_sums(units, p, k)
+    correct = _key_sums(units[hit], t[hit], k)
+
+    def reduce(weights):
+        with np.errstate(all="ignore"):
+            return m.counts(support(weights), predicted(weights), correct(weights))
+    return reduce
+
+def _auc_scores(units, is_pos, y_score):
+    # Over the rows sorted by score, a positive wins against the negatives
+    # before its run of tied scores and ties (half a pair) with those inside
+    # it: with C the running weight of negatives in that order, its pairs
+    # weigh (C[before the run] + C[end of the run]) / 2. Resamples are taken
+    # in steps so the running sums stay BLOCK_CELLS large.
+    order = np.argsort(y_score, kind="mergesort")
+    units, is_pos, y_score = units[order], is_pos[order], y_score[order]
+    is_neg = ~is_pos
+    new_run = np.r_[True, y_score[1:] != y_score[:-1]]
+    run_starts = np.flatnonzero(new_run)
+    run = np.cumsum(new_run) - 1
+    neg_seen = np.cumsum(is_neg)
+    before = (neg_seen - is_neg)[run_starts][run[is_pos]]
+    through = neg_seen[np.r_[run_starts[1:], len(units)] - 1][run[is_pos]]
+    pos_units, neg_units = units[is_pos], units[is_neg]
+
+    def reduce(weights):
+        out = np.full(len(weights), np.nan)
+        step = max(1, BLOCK_CELLS // max(len(units), 1))
+        for b in range(0, len(weights), step):
+            block = weights[b:b + step]
+            c = np.zeros((len(block), len(neg_units) + 1))
+            np.cumsum(block[:, neg_units], axis=1, dtype=np.float64, out=c[:, 1:])
+            w_pos = block[:, pos_units].astype(np.float64)
+            u = (w_pos * (c[:, before] + c[:, through])).sum(axis=1) / 2
+            pairs = w_pos.sum(axis=1) * c[:, -1]
+            np.divide(u, pairs, out=out[b:b + step], where=pairs > 0)
+        return out
+    return reduce
+
+def resample_count(value):
+    """Resamples asked for by a bootstrap option: true for the default, or a count up to RESAMPLES_MAX."""
+    if value is True:
+        return RESAMPLES
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        count = 0
+    if count < 1:
+        raise ValueError("bootstrap must be true or a positive number of resamples")
+    if count > RESAMPLES_MAX:
+        raise ValueError(f"bootstrap is limited to {RESAMPLES_MAX} resamples")
+    return count
+
+def _reducer(m, gt, alignment, y_true, y_pred):
+    """(number of units, reduce(weights)) for a metric on aligned inputs."""
+    units = np.arange(alignment.rows) if alignment.gt_rows is None else np.asarray(alignment.gt_rows)
+    if m.kind == "ranking":
+        queries = aligned_queries(gt, alignment)
+        if queries is not None:
+            # Whole queries are resampled, not their rows
+            n_queries = int(np.max(gt.query_codes)) + 1
+            values = m.by_query(y_true, y_pred, queries, n_queries)
+            defined = ~np.isnan(values)
+            return n_queries, _weighted_means(np.arange(n_queries)[defined], values[defined])
+        values = m.by_query(y_true, y_pred, None)
+        defined = ~np.isnan(values)
+        return len(gt.ids), _weighted_means(units[defined], values[defined])
+    if m.rowwise is not None:
+        with np.errstate(all="ignore"):
+            means = _weighted_means(units, m.rowwise(y_true, y_pred))
+
+        def reduce(weights):
+            with np.errstate(all="ignore"):
+                return m.from_mean(means(weights))
+        return len(gt.ids), reduce
+    if m.counts is not None:
+        return len(gt.ids), _label_scores(m, units, y_true, y_pred)
+    if m.name == "roc_auc":
+        return len(gt.ids), _auc_scores(units, y_true, y_pred)
+    raise ValueError(f"Metric '{m.name}' does not support bootstrap intervals")
+
+def resampled_scores(metric, gt, alignment, y_true, y_pred, resamples=RESAMPLES, seed=SEED, deadline=None):
+    """The metric's score under each of `resamples` shared resamples of the ground truth.
+
+    A `deadline` (time.monotonic() value) is checked between weight blocks.
+    """
+    m = get_metric(metric)
+    if np.ndim(y_true) == 2:
+        raise ValueError("Bootstrap intervals need a single target column")
+    y_true, y_pred = prepare(m.kind, y_true, y_pred)
+    if len(y_true) == 0:
+        raise ValueError("Found empty input arrays")
+    n_units, reduce = _reducer(m, gt, alignment, y_true, y_pred)
+    scores = np.empty(resamples)
+    for start, weights in weight_blocks(n_units, resamples, seed):
+        check_deadline(deadline, "during the bootstrap")
+        scores[start:start + len(weights)] = reduce(weights)
+    return scores
+
+def interval(values, resamples, seed, level=LEVEL):
+    """Percentile interval of resampled scores."""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {"error": "The metric is not defined on any bootstrap resample"}
+    tail = (1 - level) / 2 * 100
+    low, high = np.percentile(values, [tail, 100 - tail])
+    return {
+        "low": float(round(low, 6)),
+        "high": float(round(high, 6)),
+        "std": float(round(values.std(), 6)),
+        "level": level,
+        "resamples": resamples,
+        "seed": seed,
+    }
+
+def bootstrap_interval(metric, gt, alignment, y_true, y_pred, resamples=RESAMPLES, seed=SEED, deadline=None):
+    """{"low", "high", "std", "level", "resamples", "seed"} for a score, or {"error": ...}."""
+    try:
+        resamples = resample_count(resamples)
+        scores = resampled_scores(metric, gt, alignment, y_true, y_pred, resamples, seed, deadline)
+        return interval(scores, resamples, seed)
+    except ValueError as e:
+        return {"error": str(e)}
+
+def shakeup(scores, higher_is_better, level=LEVEL):
+    """Rank stability of N submissions from their paired N x resamples scores.
+
+    Per submission: how often it ranks first and the central `level` interval
+    of its rank (1 is best; ties share the better rank; a resample that leaves
+    a submission's score undefined ranks it last).
+    """
+    key = -scores if higher_is_better else scores.copy()
+    key[np.isnan(key)] = np.inf
+    order = np.argsort(key, axis=0, kind="stable")
+    ordered = np.take_along_axis(key, order, axis=0)
+    # A tied run takes the rank of its first member
+    first = np.r_[np.ones((1, key.shape[1]), dtype=bool), ordered[1:] != ordered[:-1]]
+    positions = np.arange(len(key))[:, None]
+    ranks = np.empty(key.shape, dtype=np.int64)
+    np.put_along_axis(ranks, order, np.maximum.accumulate(np.where(first, positions, 0), axis=0) + 1, axis=0)
+    tail = (1 - level) / 2 * 100
+    low, high = np.percentile(ranks, [tail, 100 - tail], axis=1)
+    p_best = (ranks == 1).mean(axis=1)
+    return [
+        {"p_best": float(round(p, 6)), "rank_low": int(np.floor(lo)), "rank_high": int(np.ceil(hi))}
+        for p, lo, hi in zip(p_best, low, high)
+    ]
@@ -0,0 +1,88 @@
+import bz2
+import gzip
+import lzma
+import os
+import zipfile
+
+# Compressed submissions and ground truths, recognised by their magic bytes
+# rather than their file name. open_input() wraps the file in a decompressing
+# reader that pandas consumes directly, so no decompressed copy is written to
+# disk or held in memory next to the parsed frame; the chunked scorer reads
+# through the same wrapper. A zip archive must hold exactly one file.
+
+MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"PK\x03\x04", "zip"),
+)
+SUFFIXES = (".gz", ".bz2", ".xz", ".zip")
+
+# Typical decompressed / compressed size ratio of a CSV, used where only the
+# on-disk size is known (see streaming.should_stream)
+EXPANSION = 5
+
+def sniff(source):
+    """Compression format of a path or seekable binary buffer, or None if plain."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            head = f.read(6)
+    else:
+        pos = source.tell()
+        head = source.read(6)
+        source.seek(pos)
+    return next((codec for magic, codec in MAGIC if head.startswith(magic)), None)
+
+def _zip_member(archive):
+    members = [i for i in archive.infolist() if not i.is_dir() and not i.filename.startswith("__MACOSX/")]
+    if len(members) != 1:
+        raise ValueError(f"A zip upload must contain exactly one file, found {len(members)}")
+    return members[0]
+
+def open_input(source):
+    """Binary reader over the decompressed contents of a path or buffer."""
+    codec = sniff(source)
+    if codec is None:
+        return open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    if codec == "gzip":
+        return gzip.open(source, "rb")
+    if codec == "bz2":
+        return bz2.open(source, "rb")
+    if codec == "xz":
+        return lzma.open(source, "rb")
+    archive = zipfile.ZipFile(source)
+    try:
+        # The member keeps the archive's file open until it is closed itself
+        return archive.open(_zip_member(archive))
+    finally:
+        archive.close()
+
+def _is_url(source):
+    return isinstance(source, str) and source.startswith(("http://", "https://"))
+
+def decompressing(parse):
+    """parse(source) over the decompressed contents of source.
+
+    URLs are handed to parse as-is; pandas infers their compression from the
+    extension.
+    """
+    def read(source, **kwargs):
+        if _is_url(source):
+            return parse(source, **kwargs)
+        with open_input(source) as f:
+            return parse(f, **kwargs)
+    return read
+
+def data_name(source):
+    # Name of the data inside: the zip member, or the path without its compression suffix
+    name = str(source)
+    if not _is_url(source) and sniff(source) == "zip":
+        with zipfile.ZipFile(source) as archive:
+            return _zip_member(archive).filename
+    for suffix in SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def is_json(source):
+    return data_name(source).lower().endswith(".json")
@@ -0,0 +1,259 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import time
+import numpy as np
+import pandas as pd
+from gt_cache import is_url, load_ground_truth
+from alignment import gt_positions, normalize_ids
+from metrics import get_metric, prepare
+from splits import split_payload
+from compression import is_json, sniff
+from result_cache import SqliteStore, gt_digest, store_path
+
+# Incremental rescoring of resubmissions.
+#
+# Participants often resubmit a file with only a few predictions changed. For
+# metrics that are a function of the mean of per-row values (see
+# Metric.rowwise: accuracy, mae, mse, rmse, cross_entropy) the scorer keeps a
+# compact summary of the last submission of each lineage (a caller-chosen key,
+# e.g. competition + user):
+#   - the file cut into blocks of BLOCK_LINES lines, each with a content hash
+#   - per block and split, the sum of the per-row values and the row count
+#   - per block, an order-independent hash of the ground-truth rows it covers
+# A new file from the same lineage is hashed block by block; only the blocks
+# whose bytes changed are parsed and aligned. If they still cover exactly the
+# same ground-truth rows, their sums are swapped in and the score follows from
+# the totals. Anything else falls back to full scoring: a different row count
+# or header, moved IDs, more than MAX_CHANGED of the rows changed, a metric
+# without a per-row form, several targets, compressed or JSON files, or a
+# previous submission that was not a clean permutation of the ground truth.
+#
+# Summaries live in an SQLite file shared by every process on the host
+# (SCORING_DELTA_CACHE, "off" to disable), one row per lineage.
+
+BLOCK_LINES = 512
+# Share of rows that may change before a full rescore is cheaper
+MAX_CHANGED = float(os.environ.get("SCORING_DELTA_MAX", 0.25))
+# Bytes scanned at a time for line breaks
+SCAN_BYTES = 1 << 24
+# Bump when the stored summary changes shape
+STATE_VERSION = 1
+
+class DeltaStore(SqliteStore):
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS deltas ("
+        " lineage TEXT PRIMARY KEY, gt_hash TEXT, metric TEXT, version INTEGER,"
+        " meta TEXT, state BLOB, updated_at REAL)"
+    )
+
+    def get(self, lineage, gt_hash, metric):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT meta, state FROM deltas WHERE lineage = ? AND gt_hash = ? AND metric = ? AND version = ?",
+                (lineage, gt_hash, metric, STATE_VERSION),
+            ).fetchone()
+        if row is None:
+            return None
+        with np.load(io.BytesIO(row[1])) as arrays:
+            return json.loads(row[0]), {name: arrays[name] for name in arrays.files}
+
+    def put(self, lineage, gt_hash, metric, meta, arrays):
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO deltas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (lineage, gt_hash, metric, STATE_VERSION, json.dumps(meta), buf.getvalue(), time.time()),
+                )
+
+_path = store_path("SCORING_DELTA_CACHE", "scoring-deltas.sqlite3")
+store = None if _path is None else DeltaStore(_path)
+
+class Blocks:
+    """Line-block layout and content hashes of a CSV file."""
+
+    def __init__(self, header, bounds, hashes, rows):
+        self.header = header
+        # Byte offsets: block i spans bounds[i]:bounds[i + 1]
+        self.bounds = bounds
+        self.hashes = hashes
+        # Data lines, including a last line without a trailing newline
+        self.rows = rows
+
+    def lines(self, block):
+        return min(BLOCK_LINES, self.rows - block * BLOCK_LINES)
+
+def scan_blocks(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = mm.find(b"\n")
+            if end < 0:
+                return None
+            body = end + 1
+            bounds = [body]
+            rows = 0
+            for start in range(body, len(mm), SCAN_BYTES):
+                chunk = np.frombuffer(mm, dtype=np.uint8, count=min(SCAN_BYTES, len(mm) - start), offset=start)
+                breaks = np.flatnonzero(chunk == 10)
+                del chunk  # the mmap cannot close while a view is alive
+                line_no = np.arange(rows + 1, rows + 1 + len(breaks))
+                bounds.extend((start + breaks[line_no % BLOCK_LINES == 0] + 1).tolist())
+                rows += len(breaks)
+            if len(mm) > body and mm[len(mm) - 1] != 10:
+                rows += 1
+            if bounds[-1] < len(mm):
+                bounds.append(len(mm))
+            hashes = np.array(
+                [np.frombuffer(hashlib.blake2b(mm[a:b], digest_size=16).digest(), dtype=np.uint8)
+                 for a, b in zip(bounds[:-1], bounds[1:])],
+                dtype=np.uint8,
+            ).reshape(-1, 16)
+            header = hashlib.blake2b(mm[:body].rstrip(b"\r\n"), digest_size=16).hexdigest()
+            return Blocks(header, np.array(bounds), hashes, rows)
+
+def _mix(pos):
+    # splitmix64 finalizer: sums of mixed positions identify a set of rows
+    # regardless of their order
+    z = pos.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _block_sums(values, blocks, codes, n_blocks, n_splits):
+    cells = blocks * n_splits + codes
+    size = n_blocks * n_splits
+    sums = np.bincount(cells, weights=values, minlength=size).reshape(n_blocks, n_splits)
+    counts = np.bincount(cells, minlength=size).reshape(n_blocks, n_splits)
+    return sums, counts
+
+def _split_codes(gt, pos):
+    if gt.split_codes is None:
+        return np.zeros(len(pos), dtype=np.intp)
+    return np.asarray(gt.split_codes, dtype=np.intp)[pos]
+
+def _row_values(m, y_true, y_pred, pos_label):
+    with np.errstate(all="ignore"):
+        return m.rowwise(*prepare(m.kind, y_true, y_pred, pos_label))
+
+def _pos_label(m, gt):
+    # Stored with the summary, so changed blocks never need the whole target
+    if m.kind != "probability":
+        return None
+    labels = np.unique(np.asarray(gt.target))
+    return labels[-1].item() if len(labels) == 2 else None
+
+def _supported(sub_path, gt, m):
+    return (
+        store is not None and m.rowwise is not None and len(gt.target_cols) == 1
+        and not is_url(sub_path) and not is_json(sub_path) and sniff(sub_path) is None
+    )
+
+def _result(m, gt, sums, counts, delta=None):
+    total = counts.sum()
+    result = {"score": float(round(m.from_mean(sums.sum() / total), 6))}
+    if gt.split_codes is not None:
+        split_sums, split_counts = sums.sum(axis=0), counts.sum(axis=0)
+        scores = [float(m.from_mean(s / c)) if c else None for s, c in zip(split_sums, split_counts)]
+        errors = [None if c else "No rows in this split" for c in split_counts]
+        result["splits"] = split_payload(gt.split_names, scores, errors)
+    if delta is not None:
+        result["incremental"] = delta
+    return result
+
+def remember(lineage, sub_path, gt_path, metric, gt, alignment, y_true, y_pred):
+    """Store the summary of a fully scored submission as its lineage's base."""
+    try:
+        _remember(lineage, sub_path, gt_path, metric, gt, alignment, y_true, y_pred)
+    except Exception:
+        pass  # only costs the lineage's next submission its shortcut
+
+def _remember(lineage, sub_path, gt_path, metric, gt, alignment, y_true, y_pred):
+    m = get_metric(metric)
+    if not _supported(sub_path, gt, m) or not alignment.clean or alignment.rows != len(gt.ids):
+        return
+    blocks = scan_blocks(sub_path)
+    if blocks is None or blocks.rows != alignment.rows:
+        # Blank or multi-line rows: file lines don't map onto submission rows
+        return
+    pos_label = _pos_label(m, gt)
+    values = _row_values(m, y_true, y_pred, pos_label)
+    if alignment.gt_rows is None:
+        pos = np.arange(len(values))
+    else:
+        # Back into file order
+        pos = np.empty(alignment.rows, dtype=np.int64)
+        pos[alignment.sub_rows] = alignment.gt_rows
+        in_file_order = np.empty_like(values)
+        in_file_order[alignment.sub_rows] = values
+        values = in_file_order
+    n_splits = max(len(gt.split_names), 1)
+    sums, counts = _block_sums(values, np.arange(len(pos)) // BLOCK_LINES, _split_codes(gt, pos),
+                               len(blocks.hashes), n_splits)
+    row_sets = np.add.reduceat(_mix(pos), np.arange(0, len(pos), BLOCK_LINES))
+    meta = {"header": blocks.header, "rows": blocks.rows, "block_lines": BLOCK_LINES, "pos_label": pos_label}
+    store.put(lineage, gt_digest(gt_path), metric,
+              meta, {"hashes": blocks.hashes, "row_sets": row_sets, "sums": sums, "counts": counts})
+
+def delta_score(sub_path, gt_path, metric, lineage):
+    """Score from the lineage's previous submission and the changed blocks, or None for a full rescore."""
+    if store is None:
+        return None
+    try:
+        return _delta_score(sub_path, gt_path, metric, lineage)
+    except Exception:
+        # Unparseable rows, NaN predictions, ...: the full scorer reports them
+        return None
+
+def _delta_score(sub_path, gt_path, metric, lineage):
+    gt = load_ground_truth(gt_path)
+    m = get_metric(metric)
+    if not _supported(sub_path, gt, m):
+        return None
+    gt_hash = gt_digest(gt_path)
+    found = store.get(lineage, gt_hash, metric)
+    if found is None:
+        return None
+    meta, base = found
+    if meta["block_lines"] != BLOCK_LINES:
+        return None
+    blocks = scan_blocks(sub_path)
+    if blocks is None or blocks.header != meta["header"] or blocks.rows != meta["rows"]:
+        return None
+
+    changed = np.flatnonzero((blocks.hashes != base["hashes"]).any(axis=1))
+    lines = np.array([blocks.lines(b) for b in changed], dtype=np.int64)
+    if lines.sum() > MAX_CHANGED * blocks.rows:
+        return None
+    sums, counts = base["sums"].copy(), base["counts"]
+    if len(changed):
+        with open(sub_path, "rb") as f:
+            header = f.readline()
+            parts = [header]
+            for b in changed:
+                f.seek(blocks.bounds[b])
+                part = f.read(blocks.bounds[b + 1] - blocks.bounds[b])
+                parts.append(part if part.endswith(b"\n") else part + b"\n")
+        frame = pd.read_csv(io.BytesIO(b"".join(parts)))
+        if len(frame) != lines.sum():
+            return None
+        pos = gt_positions(gt, normalize_ids(gt, frame[frame.columns[0]].to_numpy()))
+        starts = np.r_[0, np.cumsum(lines)[:-1]]
+        if (pos < 0).any() or not np.array_equal(np.add.reduceat(_mix(pos), starts), base["row_sets"][changed]):
+            # IDs moved between blocks or changed: alignment has to be redone in full
+            return None
+        values = _row_values(m, gt.target[pos], frame[gt.target_col].to_numpy(), meta["pos_label"])
+        if not np.isfinite(values).all():
+            return None
+        new_sums, _ = _block_sums(values, np.repeat(np.arange(len(changed)), lines), _split_codes(gt, pos),
+                                  len(changed), sums.shape[1])
+        sums[changed] = new_sums
+
+    # The new file becomes the base for the lineage's next submission
+    store.put(lineage, gt_hash, metric, meta,
+              {"hashes": blocks.hashes, "row_sets": base["row_sets"], "sums": sums, "counts": counts})
+    return _result(m, gt, sums, counts, {"changed_rows": int(lines.sum()), "rows": blocks.rows})
@@ -0,0 +1,229 @@
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+from compression import decompressing, is_json
+
+# Shared ground-truth cache for the scorers.
+# Entries are keyed by path (or URL) and validated against a fingerprint:
+# mtime + size for local files, ETag / Last-Modified for URLs. A changed
+# fingerprint means the file was replaced and the entry is reparsed.
+
+DEFAULT_BUDGET_MB = 512
+
+# Local files are loaded from their compiled, memory-mapped form (see
+# gt_compile.py) unless SCORING_GT_COMPILE=0.
+COMPILE_LOCAL = os.environ.get("SCORING_GT_COMPILE", "1") != "0"
+
+# A ground-truth column with one of these names (case-insensitive) assigns
+# each row to a leaderboard split, e.g. "public" / "private".
+SPLIT_COLUMNS = ("split", "usage")
+
+# A ground-truth column with one of these names groups rows into queries for
+# the ranking metrics (map, ndcg, mrr); the target is then each row's relevance.
+QUERY_COLUMNS = ("query", "query_id", "qid")
+
+class GroundTruth:
+    """Parsed ground truth: ID array plus the target column(s), in file order."""
+
+    def __init__(self, ids, target, id_col, target_col, sorter=None, split_codes=None, split_names=(), query_codes=None):
+        self.ids = ids
+        # 1-D for a single target; rows x targets when target_col is a list
+        self.target = target
+        self.id_col = id_col
+        self.target_cols = list(target_col) if isinstance(target_col, (list, tuple)) else [target_col]
+        self.target_col = self.target_cols[0]
+        # Stable argsort of ids used for alignment; compiled ground truths ship
+        # one, otherwise it is built on first use (see alignment.ensure_sorter)
+        self.sorter = sorter
+        # ids in sorted order, built on first lookup (see alignment.ensure_sorted_ids)
+        self.sorted_ids = None
+        # Per-row index into split_names, or None when there is no split column
+        self.split_codes = split_codes
+        self.split_names = list(split_names)
+        # Per-row query code (0..n_queries-1), or None when there is no query column
+        self.query_codes = query_codes
+        # (codes, labels) dictionary encoding of a string target, built on
+        # first use by a label metric (see alignment.ensure_label_codes)
+        self.label_codes = None
+
+    @property
+    def nbytes(self):
+        sorter_bytes = 8 * len(self.ids) if self.sorter is None else _array_bytes(self.sorter)
+        split_bytes = 0 if self.split_codes is None else _array_bytes(self.split_codes)
+        query_bytes = 0 if self.query_codes is None else _array_bytes(self.query_codes)
+        # sorted_ids is an in-memory copy even for compiled ids; object ids share their strings
+        sorted_bytes = 8 * len(self.ids) if self.ids.dtype == object else self.ids.nbytes
+        # Room for the int32 label codes of a string target
+        label_bytes = 4 * len(self.ids) if self.target.dtype.kind in "OU" else 0
+        return (_array_bytes(self.ids) + _array_bytes(self.target) + sorter_bytes + split_bytes
+                + query_bytes + sorted_bytes + label_bytes)
+
+def _array_bytes(arr):
+    if isinstance(arr, np.memmap):
+        # Backed by the page cache and shared between processes
+        return 0
+    if arr.dtype == object:
+        return int(pd.Series(arr, copy=False).memory_usage(index=False, deep=True))
+    return arr.nbytes
+
+def is_url(source):
+    return source.startswith("http://") or source.startswith("https://")
+
+def read_frame(source):
+    # Compressed files are decompressed on the fly (see compression.py)
+    if is_json(source):
+        return decompressing(pd.read_json)(source)
+    return decompressing(pd.read_csv)(source)
+
+def parse_ground_truth(source):
+    if COMPILE_LOCAL and not is_url(source):
+        # Imported here because gt_compile builds on this module
+        from gt_compile import load_compiled
+        return load_compiled(source)
+
+    gt_df = read_frame(source)
+    id_col, target_cols, split_col, query_col = ground_truth_columns(gt_df)
+    split_codes, split_names = encode_splits(gt_df[split_col]) if split_col else (None, ())
+    return GroundTruth(
+        gt_df[id_col].to_numpy(),
+        target_block(gt_df, target_cols),
+        id_col,
+        target_cols if len(target_cols) > 1 else target_cols[0],
+        split_codes=split_codes,
+        split_names=split_names,
+        query_codes=encode_queries(gt_df[query_col]) if query_col else None,
+    )
+
+def ground_truth_columns(frame):
+    # ID first, then one or more targets; optional split and query columns may
+    # sit anywhere after the ID
+    id_col = frame.columns[0]
+    rest = list(frame.columns[1:])
+    split_col = next((c for c in rest if str(c).lower() in SPLIT_COLUMNS), None)
+    query_col = next((c for c in rest if str(c).lower() in QUERY_COLUMNS), None)
+    targets = [c for c in rest if c != split_col and c != query_col]
+    if not targets:
+        raise ValueError("Ground truth needs an ID column and a target column")
+    return id_col, targets, split_col, query_col
+
+def target_block(frame, target_cols):
+    # One target stays 1-D; several become a single rows x targets array
+    if len(target_cols) == 1:
+        return frame[target_cols[0]].to_numpy()
+    return frame[target_cols].to_numpy()
+
+def encode_splits(column):
+    # Split labels are normalised to lower case; codes are small ints into the sorted names
+    names, codes = np.unique(column.astype(str).str.strip().str.lower().to_numpy(), return_inverse=True)
+    return codes.astype(np.int8), [str(n) for n in names]
+
+def encode_queries(column):
+    # Query IDs only matter for grouping, so they are factorized to dense codes
+    codes, _ = pd.factorize(column)
+    if (codes < 0).any():
+        raise ValueError("Ground truth query column has missing values")
+    return codes.astype(np.int32)
+
+def fingerprint(source):
+    """Cheap identity for the current contents of `source`, or None if unknown."""
+    if is_url(source):
+        req = urllib.request.Request(source, method="HEAD")
+        try:
+            with urllib.request.urlopen(req, timeout=10) as res:
+                etag = res.headers.get("ETag")
+                modified = res.headers.get("Last-Modified")
+                length = res.headers.get("Content-Length")
+        except Exception:
+            return None
+        if not etag and not modified:
+            return None
+        return (etag, modified, length)
+
+    st = os.stat(source)
+    return (st.st_mtime_ns, st.st_size)
+
+class GroundTruthCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # source -> (fingerprint, GroundTruth, nbytes)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # source -> Lock, so one thread parses while others wait
+
+    def get(self, source, loader=parse_ground_truth):
+        fp = fingerprint(source)
+        if fp is None:
+            # No way to tell whether the remote file changed; don't cache it
+            with self._lock:
+                self.misses += 1
+            return loader(source)
+
+        gt = self._lookup(source, fp)
+        if gt is not None:
+            return gt
+
+        with self._lock:
+            load_lock = self._loading.setdefault(source, threading.Lock())
+        with load_lock:
+            # Another thread may have loaded it while we waited
+            gt = self._lookup(source, fp, count_miss=False)
+            if gt is not None:
+                return gt
+            gt = loader(source)
+            self._store(source, fp, gt)
+            return gt
+
+    def _lookup(self, source, fp, count_miss=True):
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is not None and entry[0] == fp:
+                self._entries.move_to_end(source)
+                self.hits += 1
+                return entry[1]
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def _store(self, source, fp, gt):
+        nbytes = gt.nbytes
+        with self._lock:
+            self._discard(source)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[source] = (fp, gt, nbytes)
+            self._size += nbytes
+            # Evict least recently used entries until we're back under budget
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def _discard(self, source):
+        entry = self._entries.pop(source, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+_budget_mb = float(os.environ.get("SCORING_GT_CACHE_MB", DEFAULT_BUDGET_MB))
+cache = GroundTruthCache(int(_budget_mb * 1024 * 1024))
+
+def load_ground_truth(source):
+    return cache.get(source)
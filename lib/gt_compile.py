@@ -0,0 +1,118 @@
+import os
+import json
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+from gt_cache import GroundTruth, encode_queries, encode_splits, ground_truth_columns, read_frame
+
+# Compiled ground truth: a sidecar directory next to the source file,
+#   <gt>.compiled/<mtime_ns>-<size>/{ids.npy, target.npy, sorter.npy, meta.json}
+# plus split_codes.npy / query_codes.npy when the ground truth has a split or
+# query column. target.npy is 2-D (rows x targets) when there are several
+# target columns.
+# ids/target keep the source row order; sorter is the stable argsort of ids,
+# so `ids[sorter]` is the sorted ID column and np.searchsorted(ids, x, sorter=sorter)
+# works without materializing it. Everything is loaded with mmap_mode='r', so
+# concurrent scoring processes share the same pages through the OS page cache.
+# The version directory is named after the source fingerprint: replacing the
+# source yields a new directory and the stale one is removed on recompile.
+
+FORMAT_VERSION = 4
+
+def compiled_root(source):
+    return source + ".compiled"
+
+def _version_dir(source):
+    st = os.stat(source)
+    return os.path.join(compiled_root(source), f"{st.st_mtime_ns}-{st.st_size}")
+
+def _typed(series):
+    # Numeric and boolean columns keep their dtype; anything else becomes a
+    # fixed-width unicode array, which (unlike object arrays) can be memory-mapped
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return series.to_numpy()
+    return series.to_numpy(dtype=str)
+
+def _typed_block(frame, target_cols):
+    if len(target_cols) == 1:
+        return _typed(frame[target_cols[0]])
+    block = frame[target_cols]
+    if all(pd.api.types.is_numeric_dtype(t) or pd.api.types.is_bool_dtype(t) for t in block.dtypes):
+        return block.to_numpy()
+    return block.to_numpy(dtype=str)
+
+def compile_ground_truth(source, frame=None):
+    """Compile `source` (CSV/JSON) into its memory-mappable form; returns the directory."""
+    target_dir = _version_dir(source)
+    if os.path.exists(os.path.join(target_dir, "meta.json")):
+        return target_dir
+
+    if frame is None:
+        frame = read_frame(source)
+    id_col, target_cols, split_col, query_col = ground_truth_columns(frame)
+    split_codes, split_names = encode_splits(frame[split_col]) if split_col else (None, [])
+    query_codes = encode_queries(frame[query_col]) if query_col else None
+    ids = _typed(frame[id_col])
+    target = _typed_block(frame, target_cols)
+    sorter = np.argsort(ids, kind="stable")
+
+    root = compiled_root(source)
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        np.save(os.path.join(tmp_dir, "ids.npy"), ids)
+        np.save(os.path.join(tmp_dir, "target.npy"), target)
+        np.save(os.path.join(tmp_dir, "sorter.npy"), sorter)
+        if split_codes is not None:
+            np.save(os.path.join(tmp_dir, "split_codes.npy"), split_codes)
+        if query_codes is not None:
+            np.save(os.path.join(tmp_dir, "query_codes.npy"), query_codes)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "id_col": str(id_col),
+                "target_cols": [str(c) for c in target_cols],
+                "split_names": split_names,
+                "rows": int(len(ids)),
+            }, f)
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            # Another process finished compiling the same version first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Drop versions compiled from earlier contents of the source file
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if path != target_dir and not name.startswith(".tmp-"):
+            shutil.rmtree(path, ignore_errors=True)
+    return target_dir
+
+def load_compiled(source):
+    """Memory-map the compiled form of `source`, compiling it first if stale or missing."""
+    version_dir = compile_ground_truth(source)
+    with open(os.path.join(version_dir, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        version_dir = compile_ground_truth(source)
+        with open(os.path.join(version_dir, "meta.json")) as f:
+            meta = json.load(f)
+
+    split_path = os.path.join(version_dir, "split_codes.npy")
+    query_path = os.path.join(version_dir, "query_codes.npy")
+    return GroundTruth(
+        np.load(os.path.join(version_dir, "ids.npy"), mmap_mode="r"),
+        np.load(os.path.join(version_dir, "target.npy"), mmap_mode="r"),
+        meta["id_col"],
+        meta["target_cols"] if len(meta["target_cols"]) > 1 else meta["target_cols"][0],
+        sorter=np.load(os.path.join(version_dir, "sorter.npy"), mmap_mode="r"),
+        split_codes=np.load(split_path, mmap_mode="r") if os.path.exists(split_path) else None,
+        split_names=meta.get("split_names", []),
+        query_codes=np.load(query_path, mmap_mode="r") if os.path.exists(query_path) else None,
+    )
@@ -0,0 +1,174 @@
+import math
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# In-process job queue for scoring requests that should not hold an HTTP
+# request open.
+#
+# submit() enqueues a job and returns at once; a fixed set of worker threads
+# runs fn(*args, deadline=...) for each job, where deadline is a
+# time.monotonic() value the job should stop at. The scorers pass it to their
+# StageTimer and raise TimeoutError when it has passed: between stages, between
+# streamed chunks and between bootstrap weight blocks, so a runaway job gives
+# its worker back within about one chunk or block. A job past its deadline is
+# reported as timed out at once; fn's late result, if any, is dropped.
+#
+# The queue is bounded: submit() raises QueueFull, carrying a Retry-After
+# estimate, instead of letting work pile up. Finished jobs are kept for
+# lookup until `keep` newer ones have finished. Everything lives in one
+# process, so there is no broker to run and tests can drive it directly.
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Scoring queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class Job:
+    def __init__(self, args):
+        self.id = uuid.uuid4().hex
+        self.args = args
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.deadline = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def _finish(self, status, result=None, error=None):
+        if self.done:
+            return False
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self._done.set()
+        return True
+
+    def to_dict(self):
+        out = {"job_id": self.id, "status": self.status}
+        if self.result is not None:
+            out["result"] = self.result
+        if self.error is not None:
+            out["error"] = self.error
+        if self.started is not None:
+            out["queued_s"] = round(self.started - self.created, 6)
+        if self.finished is not None and self.started is not None:
+            out["run_s"] = round(self.finished - self.started, 6)
+        return out
+
+class JobQueue:
+    def __init__(self, fn, workers=2, max_queue=32, timeout=300.0, keep=1000):
+        self.fn = fn
+        self.workers = workers
+        self.timeout = timeout
+        self.keep = keep
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._avg_run_s = None
+        self.running = 0
+
+    def _ensure_workers(self):
+        # Threads start on first use so importing the app stays cheap
+        with self._lock:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"scoring-job-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, *args):
+        self._ensure_workers()
+        job = Job(args)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFull(self.retry_after())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            self._expire(job)
+        return job
+
+    def wait(self, job, timeout):
+        """Block until the job finishes, its deadline passes or `timeout` seconds elapse."""
+        end = time.monotonic() + timeout
+        while not job.done:
+            now = time.monotonic()
+            if now >= end:
+                break
+            # Wake at the deadline so a stuck job is reported promptly; until
+            # the job starts there is no deadline yet, so check back shortly
+            if job.deadline is None:
+                step = min(end - now, 0.25)
+            else:
+                step = min(end - now, max(job.deadline - now, 0.0) + 0.01)
+            job._done.wait(step)
+            self._expire(job)
+        return job
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def retry_after(self):
+        # Seconds until a slot is likely free: queued work spread over the workers
+        per_job = self._avg_run_s or 1.0
+        return max(1, math.ceil(per_job * (self._queue.qsize() + 1) / self.workers))
+
+    def _expire(self, job):
+        if job.status == "running" and job.deadline is not None and time.monotonic() > job.deadline:
+            if job._finish("failed", error=f"Scoring timed out after {self.timeout:g}s"):
+                self._retire(job)
+
+    def _retire(self, job):
+        with self._lock:
+            self._finished[job.id] = None
+            while len(self._finished) > self.keep:
+                old_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_id, None)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.started = time.time()
+            job.deadline = time.monotonic() + self.timeout
+            job.status = "running"
+            with self._lock:
+                self.running += 1
+            try:
+                result = self.fn(*job.args, deadline=job.deadline)
+                error = None
+            except Exception as e:
+                result, error = None, str(e)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+            run_s = time.time() - job.started
+            self._avg_run_s = run_s if self._avg_run_s is None else 0.8 * self._avg_run_s + 0.2 * run_s
+            if time.monotonic() > job.deadline:
+                finished = job._finish("failed", error=f"Scoring timed out after {self.timeout:g}s")
+            elif error is not None:
+                finished = job._finish("failed", error=error)
+            else:
+                finished = job._finish("done", result=result)
+            if finished:
+                self._retire(job)
+            self._queue.task_done()
@@ -0,0 +1,640 @@
+import copy
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Metric registry.
+# Every metric is a plain NumPy function over already-aligned 1-D arrays.
+# `kind` says how the inputs are prepared before the function sees them:
+#   'regression'  - both sides float64, NaN and infinity rejected
+#   'label'       - class labels, compared as-is after a type check; every
+#                   label metric is read off one confusion matrix (see LABELS)
+#   'probability' - binary y_true as a boolean "is positive" mask, y_pred float64
+#   'ranking'     - per-query ranking quality, see RANKING below
+# A metric may also provide a streaming accumulator factory, used by the
+# chunked scorer in streaming.py, and a per-row form for metrics that are a
+# function of the mean of per-row values, used for incremental rescoring in
+# delta.py; label metrics also expose their score over per-label counts,
+# used for bootstrap intervals in bootstrap.py. New metrics only need a
+# @register_metric; the scorers look them up by name.
+#
+# Ground truths with several target columns arrive as 2-D (rows x targets)
+# arrays; those are scored per column through the metric's grouped form, with
+# each column as one group, so all columns go through a single vectorized
+# pass. The headline score is the mean over columns (column-wise RMSE, mean
+# column-wise AUC, multilabel log loss, ...).
+#
+# Ranking metrics (map, ndcg, mrr) take an optional cutoff in their name,
+# e.g. "map@10", and are scored per query: either rows of (query, relevance)
+# in the ground truth against predicted scores, or one row per query with
+# space-separated item lists on both sides. The headline score is the mean
+# over queries that have at least one relevant item.
+
+METRICS = {}
+
+class Metric:
+    def __init__(self, name, fn, kind, higher_is_better, accumulator=None, grouped=None, rowwise=None, from_mean=None,
+                 counts=None):
+        self.name = name
+        # Ranking cutoff (the K in map@K); None ranks every item
+        self.k = None
+        self.fn = fn
+        self.kind = kind
+        self.higher_is_better = higher_is_better
+        # accumulator(gt) -> object with update(y_true, y_pred) / result()
+        self.accumulator = accumulator
+        # grouped(y_true, y_pred, groups, n_groups) -> per-group scores (NaN if empty)
+        self.grouped = grouped
+        # rowwise(y_true, y_pred) -> per-row values on prepared inputs; the
+        # score is from_mean(their mean), from_mean defaulting to the identity
+        self.rowwise = rowwise
+        self.from_mean = from_mean or (lambda mean: mean)
+        # counts(support, predicted, correct) -> per-group scores of a label
+        # metric from its n_groups x labels counts (see LABELS)
+        self.counts = counts
+
+    def __call__(self, y_true, y_pred, queries=None):
+        y_true, y_pred = prepare(self.kind, y_true, y_pred)
+        if len(y_true) == 0:
+            raise ValueError("Found empty input arrays")
+        if self.kind == "ranking":
+            values = self.by_query(y_true, y_pred, queries)
+            defined = ~np.isnan(values)
+            if not defined.any():
+                raise ValueError("No query has a relevant item; ranking metrics are not defined in that case.")
+            return float(values[defined].mean())
+        return float(self.fn(y_true, y_pred))
+
+    def at(self, k):
+        if self.kind != "ranking":
+            raise ValueError(f"Metric '{self.name}' does not take a cutoff")
+        metric = copy.copy(self)
+        metric.name = f"{self.name}@{k}"
+        metric.k = k
+        return metric
+
+    def by_query(self, y_true, y_pred, queries, n_queries=None):
+        """Per-query scores of a ranking metric on prepared inputs; NaN where undefined."""
+        return self.fn(rank(y_true, y_pred, queries, n_queries), np.inf if self.k is None else self.k)
+
+    def columns(self, y_true, y_pred):
+        """Per-column scores for 2-D (rows x targets) inputs; NaN where undefined."""
+        if self.grouped is None:
+            raise ValueError(f"Metric '{self.name}' does not support multiple target columns")
+        y_true, y_pred = prepare(self.kind, y_true, y_pred)
+        if y_true.shape != y_pred.shape:
+            raise ValueError(f"Shape mismatch: y_true {y_true.shape}, y_pred {y_pred.shape}")
+        n, k = y_true.shape
+        if n == 0:
+            raise ValueError("Found empty input arrays")
+        # Column-major flattening keeps each column contiguous as one group
+        cols = np.repeat(np.arange(k), n)
+        return self.grouped(y_true.T.ravel(), y_pred.T.ravel(), cols, k)
+
+def register_metric(name, kind="regression", higher_is_better=False, accumulator=None, grouped=None,
+                    rowwise=None, from_mean=None, counts=None):
+    def decorator(fn):
+        METRICS[name] = Metric(name, fn, kind, higher_is_better, accumulator, grouped, rowwise, from_mean, counts)
+        return fn
+    return decorator
+
+def get_metric(name):
+    base, _, cutoff = str(name).lower().partition("@")
+    metric = METRICS.get(base)
+    if metric is None:
+        available = sorted(n + ("[@K]" if m.kind == "ranking" else "") for n, m in METRICS.items())
+        raise ValueError(f"Unknown metric '{name}'. Available: {', '.join(available)}")
+    if not cutoff:
+        return metric
+    if not cutoff.isdigit() or int(cutoff) < 1:
+        raise ValueError(f"Invalid cutoff in metric '{name}', expected e.g. '{base}@10'")
+    return metric.at(int(cutoff))
+
+def compute_metric(name, y_true, y_pred, queries=None):
+    if np.ndim(y_true) == 2:
+        return score_targets(name, y_true, y_pred)[0]
+    return get_metric(name)(y_true, y_pred, queries)
+
+def score_targets(name, y_true, y_pred, columns=None, queries=None):
+    """(score, {column: score}) for 2-D inputs, (score, None) for a single target."""
+    metric = get_metric(name)
+    if np.ndim(y_true) != 2:
+        return metric(y_true, y_pred, queries), None
+    values = metric.columns(y_true, y_pred)
+    columns = list(columns) if columns is not None else [str(i) for i in range(len(values))]
+    undefined = [str(c) for c, v in zip(columns, values) if np.isnan(v)]
+    if undefined:
+        raise ValueError(f"Metric '{metric.name}' is not defined for target column(s): {', '.join(undefined)}")
+    return float(np.mean(values)), {str(c): float(round(v, 6)) for c, v in zip(columns, values)}
+
+def grouped_scores(name, y_true, y_pred, groups, n_groups, queries=None):
+    """Score each group (codes 0..n_groups-1) separately; returns (scores, errors) lists."""
+    metric = get_metric(name)
+    y_true, y_pred = prepare(metric.kind, y_true, y_pred)
+    groups = np.asarray(groups, dtype=np.intp)
+    scores = [None] * n_groups
+    errors = [None] * n_groups
+
+    if metric.kind == "ranking" or metric.grouped is not None:
+        # One vectorized pass over all rows for every group at once. With
+        # several targets every (group, column) pair is its own group and a
+        # group's score is the mean over its columns.
+        if metric.kind == "ranking":
+            values = _ranking_by_group(metric, y_true, y_pred, groups, n_groups, queries)
+        elif y_true.ndim == 2:
+            k = y_true.shape[1]
+            cells = (groups[:, None] * k + np.arange(k)).ravel()
+            values = metric.grouped(y_true.ravel(), y_pred.ravel(), cells, n_groups * k)
+            values = values.reshape(n_groups, k).mean(axis=1)
+        else:
+            values = metric.grouped(y_true, y_pred, groups, n_groups)
+        rows = np.bincount(groups, minlength=n_groups)
+        for g, v in enumerate(values):
+            if np.isnan(v):
+                errors[g] = "No rows in this split" if rows[g] == 0 else f"Metric '{metric.name}' is not defined for this split"
+            else:
+                scores[g] = float(v)
+        return scores, errors
+
+    for g in range(n_groups):
+        mask = groups == g
+        try:
+            if not mask.any():
+                raise ValueError("No rows in this split")
+            scores[g] = float(metric.fn(y_true[mask], y_pred[mask]))
+        except Exception as e:
+            errors[g] = str(e)
+    return scores, errors
+
+# ---------------- INPUT PREPARATION ----------------
+
+def _as_float(arr):
+    arr = np.asarray(arr, dtype=np.float64)
+    if not np.isfinite(arr).all():
+        # scikit-learn's check_array messages
+        if np.isnan(arr).any():
+            raise ValueError("Input contains NaN.")
+        raise ValueError("Input contains infinity or a value too large for dtype('float64').")
+    return arr
+
+def binary_labels(y_true):
+    labels = np.unique(np.asarray(y_true))
+    if len(labels) < 2:
+        raise ValueError("Only one class present in y_true; the metric is not defined in that case.")
+    if len(labels) > 2:
+        raise ValueError(f"Expected a binary target, got {len(labels)} classes.")
+    return labels
+
+def binary_columns(y_true):
+    """Boolean "is positive" mask for a 2-D binary target, column by column."""
+    if y_true.dtype.kind not in "biuf":
+        raise ValueError("Multi-target probability metrics need numeric targets.")
+    if np.isin(y_true, (0, 1)).all():
+        # Multilabel 0/1 indicators: 1 is positive even in a column without any
+        return y_true == 1
+    lo, hi = y_true.min(axis=0), y_true.max(axis=0)
+    if (lo == hi).any() or not ((y_true == lo) | (y_true == hi)).all():
+        raise ValueError("Expected exactly two classes in every target column.")
+    return y_true == hi
+
+def _as_items(arr):
+    # Item lists as strings; an empty cell is an empty list
+    return pd.Series(arr, dtype=object).fillna("").astype(str).to_numpy()
+
+def prepare(kind, y_true, y_pred, pos_label=None):
+    if kind == "regression":
+        return _as_float(y_true), _as_float(y_pred)
+
+    if kind == "ranking":
+        # Numeric relevance vs. scores, or item lists compared as strings
+        y_true = np.asarray(y_true)
+        y_pred = np.asarray(y_pred)
+        if y_true.dtype.kind in "biuf" and y_pred.dtype.kind in "biuf":
+            return _as_float(y_true), _as_float(y_pred)
+        return _as_items(y_true), _as_items(y_pred)
+
+    if kind == "probability":
+        # The larger label is the positive class, as in scikit-learn; pos_label
+        # names it when y_true is only part of the ground truth
+        y_true = np.asarray(y_true)
+        if y_true.ndim == 2:
+            return binary_columns(y_true), _as_float(y_pred)
+        if pos_label is None:
+            pos_label = binary_labels(y_true)[-1]
+        return y_true == pos_label, _as_float(y_pred)
+
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    true_numeric = y_true.dtype.kind in "biuf"
+    pred_numeric = y_pred.dtype.kind in "biuf"
+    if true_numeric != pred_numeric:
+        raise ValueError("Labels in y_true and y_pred should be of the same type.")
+    if true_numeric and y_pred.dtype.kind == "f" and not np.array_equal(y_pred, np.round(y_pred)):
+        raise ValueError("Classification metrics can't handle a mix of label and continuous targets.")
+    return y_true, y_pred
+
+# ---------------- STREAMING ACCUMULATORS ----------------
+# Every chunk goes through prepare(), so a NaN, infinite or mistyped value is
+# rejected with the same error whether or not the submission is streamed.
+
+class SumAccumulator:
+    def __init__(self, kind):
+        self.kind = kind
+        self.total = 0.0
+        self.n = 0
+
+    def update(self, y_true, y_pred):
+        y_true, y_pred = prepare("regression", y_true, y_pred)
+        err = y_pred - y_true
+        self.total += float(np.abs(err).sum() if self.kind == 'mae' else np.dot(err, err))
+        self.n += len(err)
+
+    def result(self):
+        mean = self.total / self.n
+        return float(np.sqrt(mean)) if self.kind == 'rmse' else mean
+
+class ConfusionAccumulator:
+    # Per-label true/predicted/correct counts; enough for every label metric
+    def __init__(self, score):
+        # score(support, predicted, correct) -> per-group values, as in LABELS
+        self.score = score
+        self.true_counts = Counter()
+        self.pred_counts = Counter()
+        self.tp = Counter()
+        self.n = 0
+
+    def update(self, y_true, y_pred):
+        y_true, y_pred = prepare("label", y_true, y_pred)
+        y_true = pd.Series(y_true)
+        y_pred = pd.Series(y_pred)
+        hit = (y_true.to_numpy() == y_pred.to_numpy())
+        self.true_counts.update(y_true.value_counts().to_dict())
+        self.pred_counts.update(y_pred.value_counts().to_dict())
+        self.tp.update(y_true[hit].value_counts().to_dict())
+        self.n += len(y_true)
+
+    def result(self):
+        labels = list(self.true_counts.keys() | self.pred_counts.keys())
+        counts = [np.array([[c.get(label, 0) for label in labels]]) for c in (self.true_counts, self.pred_counts, self.tp)]
+        return float(self.score(*counts)[0])
+
+class LogLossAccumulator:
+    def __init__(self, labels):
+        self.pos_label = labels[-1]
+        self.total = 0.0
+        self.n = 0
+
+    def update(self, y_true, y_pred):
+        pos, p = prepare("probability", y_true, y_pred, self.pos_label)
+        p = _clip_proba(p)
+        self.total -= float(np.log(p[pos]).sum() + np.log1p(-p[~pos]).sum())
+        self.n += len(p)
+
+    def result(self):
+        return self.total / self.n
+
+# roc_auc is streamed through a fixed histogram of the predicted probabilities:
+# predictions that share one of the 2**20 bins count as tied.
+AUC_BINS = 1 << 20
+
+class AUCAccumulator:
+    def __init__(self, labels):
+        self.pos_label = labels[-1]
+        self.pos = np.zeros(AUC_BINS, dtype=np.int64)
+        self.neg = np.zeros(AUC_BINS, dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        is_pos, p = prepare("probability", y_true, y_pred, self.pos_label)
+        if len(p) and (p.min() < 0 or p.max() > 1):
+            raise ValueError("Streaming roc_auc expects probabilities in [0, 1]")
+        bins = np.minimum((p * AUC_BINS).astype(np.int64), AUC_BINS - 1)
+        self.pos += np.bincount(bins[is_pos], minlength=AUC_BINS)
+        self.neg += np.bincount(bins[~is_pos], minlength=AUC_BINS)
+
+    def result(self):
+        n_pos, n_neg = self.pos.sum(), self.neg.sum()
+        if n_pos == 0 or n_neg == 0:
+            raise ValueError("Only one class present in y_true. ROC AUC score is not defined in that case.")
+        # Each positive beats every negative in a lower bin and ties half of its own
+        neg_below = np.cumsum(self.neg) - self.neg
+        wins = np.dot(self.pos, neg_below) + 0.5 * np.dot(self.pos, self.neg)
+        return float(wins / (n_pos * n_neg))
+
+# ---------------- RANKING ----------------
+# Every ranking metric sees the same Ranking: the ranked rows of all queries,
+# sorted by (query, rank) with one lexsort, so each query is one contiguous
+# segment and per-query sums are a single np.add.reduceat over segment starts.
+
+class Ranking:
+    def __init__(self, q, rel, n_queries, n_relevant, ideal=None):
+        # q / rel: query code and relevance of each ranked row, best first within a query
+        self.q = q
+        self.rel = rel
+        self.n_queries = n_queries
+        # Relevant items per query, including ones that were never ranked
+        self.n_relevant = n_relevant
+        # (relevance, queries) of the unsorted rows for the ideal ordering, or
+        # None when every relevant item has relevance 1 (item lists)
+        self._ideal = ideal
+        self.starts = np.flatnonzero(np.r_[True, q[1:] != q[:-1]]) if len(q) else np.zeros(0, dtype=np.intp)
+        lengths = np.diff(np.r_[self.starts, len(q)])
+        # 0-based rank of each row within its query
+        self.pos = np.arange(len(q)) - np.repeat(self.starts, lengths)
+
+    def segment_sum(self, values):
+        out = np.zeros(self.n_queries)
+        if len(values):
+            out[self.q[self.starts]] = np.add.reduceat(values, self.starts)
+        return out
+
+    def segment_max(self, values):
+        out = np.zeros(self.n_queries)
+        if len(values):
+            out[self.q[self.starts]] = np.maximum.reduceat(values, self.starts)
+        return out
+
+    def ideal_dcg(self, k):
+        if self._ideal is None:
+            # Binary relevance: the ideal ranking puts every relevant item first
+            top = np.minimum(self.n_relevant, k).astype(np.int64)
+            gains = np.r_[0.0, np.cumsum(_discount(np.arange(top.max() if len(top) else 0)))]
+            return gains[top]
+        rel, queries = self._ideal
+        # Same query segments as the ranked rows, so self.pos still applies
+        ideal = rel[np.lexsort((-rel, queries))]
+        return self.segment_sum(np.where(self.pos < k, ideal * _discount(self.pos), 0.0))
+
+def rank(y_true, y_pred, queries=None, n_queries=None):
+    if queries is None:
+        return rank_item_lists(y_true, y_pred)
+    if y_true.dtype.kind != "f" or y_pred.dtype.kind != "f":
+        raise ValueError("Ranking metrics with a query column need numeric relevance and scores.")
+    return rank_scored_rows(y_true, y_pred, np.asarray(queries, dtype=np.intp), n_queries)
+
+def rank_scored_rows(rel, scores, queries, n_queries=None):
+    """Rows of (query, relevance) ranked by predicted score; ties keep ground-truth order."""
+    if n_queries is None:
+        n_queries = int(queries.max()) + 1 if len(queries) else 0
+    order = np.lexsort((-scores, queries))
+    n_relevant = np.bincount(queries, weights=rel > 0, minlength=n_queries)
+    return Ranking(queries[order], rel[order], n_queries, n_relevant, ideal=(rel, queries))
+
+def _explode(items):
+    # Space-separated lists -> (row, item) pairs, in list order
+    s = pd.Series(_as_items(items)).str.split().explode().dropna()
+    return s.index.to_numpy(dtype=np.intp), s.to_numpy(dtype=str)
+
+def rank_item_lists(relevant, predicted):
+    """One query per row: space-separated relevant items vs. predicted items, best first."""
+    n = len(predicted)
+    pred_rows, pred_items = _explode(predicted)
+    true_rows, true_items = _explode(relevant)
+    codes, uniques = pd.factorize(np.concatenate([pred_items, true_items]))
+    m = max(len(uniques), 1)
+    pred_keys = pred_rows * m + codes[:len(pred_items)]
+    true_keys = np.unique(true_rows * m + codes[len(pred_items):])
+    # A repeated prediction only counts at its first rank
+    _, first = np.unique(pred_keys, return_index=True)
+    first.sort()
+    pred_keys = pred_keys[first]
+    rel = np.isin(pred_keys, true_keys).astype(np.float64)
+    return Ranking(pred_rows[first], rel, n, np.bincount(true_keys // m, minlength=n))
+
+def _discount(pos):
+    return 1.0 / np.log2(pos + 2.0)
+
+def _ranking_by_group(metric, y_true, y_pred, groups, n_groups, queries):
+    # A query's rows in different groups count as separate queries; each
+    # group's score is the mean over its defined queries
+    if queries is None:
+        values, owner = metric.by_query(y_true, y_pred, None), groups
+    else:
+        queries = np.asarray(queries, dtype=np.intp)
+        nq = int(queries.max()) + 1 if len(queries) else 0
+        values = metric.by_query(y_true, y_pred, groups * nq + queries, n_groups * nq)
+        owner = np.repeat(np.arange(n_groups), nq)
+    defined = ~np.isnan(values)
+    return _group_mean(values[defined], owner[defined], n_groups)
+
+# ---------------- LABELS ----------------
+# Label metrics are computed from per-label counts: support (true), predicted
+# and correct, all read off one confusion matrix built with a single
+# np.bincount. Labels are first turned into small integer codes: either they
+# already are (including the ground-truth dictionary codes produced by
+# alignment.encode_labels) or both sides are factorized together.
+
+# Confusion matrices up to this many cells are built in full; beyond that the
+# three marginals are counted directly
+CONFUSION_CELLS = 1 << 22
+
+def label_codes(y_true, y_pred):
+    """(true codes, predicted codes, number of codes)."""
+    n = len(y_true)
+    if n and y_true.dtype.kind in "iu" and y_pred.dtype.kind in "iu":
+        lo = min(y_true.min(), y_pred.min())
+        hi = max(y_true.max(), y_pred.max())
+        if lo >= 0 and hi < 2 * n + 1024:
+            return y_true.astype(np.intp, copy=False), y_pred.astype(np.intp, copy=False), int(hi) + 1
+    codes, uniques = pd.factorize(np.concatenate([y_true, y_pred]), use_na_sentinel=False)
+    return codes[:n], codes[n:], len(uniques)
+
+def confusion_counts(y_true, y_pred, groups, n_groups):
+    """(support, predicted, correct) per group and label, each n_groups x labels."""
+    t, p, k = label_codes(y_true, y_pred)
+    cells = n_groups * k
+    if cells * k <= CONFUSION_CELLS:
+        m = np.bincount((groups * k + t) * k + p, minlength=cells * k).reshape(n_groups, k, k)
+        return m.sum(axis=2), m.sum(axis=1), np.diagonal(m, axis1=1, axis2=2)
+    hit = t == p
+    return (
+        np.bincount(groups * k + t, minlength=cells).reshape(n_groups, k),
+        np.bincount(groups * k + p, minlength=cells).reshape(n_groups, k),
+        np.bincount(groups[hit] * k + t[hit], minlength=cells).reshape(n_groups, k),
+    )
+
+def _ratio(num, denom):
+    return np.divide(num, denom, out=np.zeros(np.shape(denom)), where=denom > 0)
+
+def _weighted(values, support):
+    # Support-weighted mean per group; labels that only appear in predictions drop out
+    rows = support.sum(axis=1)
+    return np.divide((values * support).sum(axis=1), rows, out=np.full(len(rows), np.nan), where=rows > 0)
+
+def _macro(values, support, predicted):
+    # Unweighted mean over the labels seen on either side, as in scikit-learn
+    present = (support + predicted) > 0
+    n = present.sum(axis=1)
+    return np.divide(np.where(present, values, 0.0).sum(axis=1), n, out=np.full(len(n), np.nan), where=n > 0)
+
+def _accuracy_counts(support, predicted, correct):
+    rows = support.sum(axis=1)
+    return np.divide(correct.sum(axis=1), rows, out=np.full(len(rows), np.nan), where=rows > 0)
+
+def _f1(support, predicted, correct):
+    return _ratio(2 * correct, support + predicted)
+
+def _label_metric(score):
+    # Grouped form of a label metric given score(support, predicted, correct)
+    return lambda t, p, g, n: score(*confusion_counts(t, p, g, n))
+
+def _single(score, y_true, y_pred):
+    return score(*confusion_counts(y_true, y_pred, np.zeros(len(y_true), dtype=np.intp), 1))[0]
+
+# ---------------- METRICS ----------------
+
+def _clip_proba(p):
+    # Probabilities outside [0, 1] are rejected as in scikit-learn; clipping
+    # only keeps the logs finite at exactly 0 and 1
+    if p.size and p.max() > 1:
+        raise ValueError(f"y_prob contains values greater than 1: {p.max()}")
+    if p.size and p.min() < 0:
+        raise ValueError(f"y_prob contains values lower than 0: {p.min()}")
+    eps = np.finfo(p.dtype).eps
+    return np.clip(p, eps, 1 - eps)
+
+def _group_mean(values, groups, n_groups):
+    total = np.bincount(groups, weights=values, minlength=n_groups)
+    count = np.bincount(groups, minlength=n_groups)
+    return np.divide(total, count, out=np.full(n_groups, np.nan), where=count > 0)
+
+def _log_losses(is_pos, y_prob):
+    p = _clip_proba(y_prob)
+    return -np.where(is_pos, np.log(p), np.log1p(-p))
+
+def average_ranks(x, groups=None):
+    # 1-based ranks with ties sharing their average rank (scipy's rankdata 'average');
+    # with groups, ranking restarts at 1 within each group
+    if groups is None:
+        order = np.argsort(x, kind="mergesort")
+        xs = x[order]
+        new_run = xs[1:] != xs[:-1]
+    else:
+        order = np.lexsort((x, groups))
+        xs, gs = x[order], groups[order]
+        new_run = (xs[1:] != xs[:-1]) | (gs[1:] != gs[:-1])
+    starts = np.flatnonzero(np.r_[True, new_run])
+    ends = np.r_[starts[1:], len(xs)]
+    sorted_ranks = np.repeat((starts + ends + 1) / 2.0, ends - starts)
+    if groups is not None:
+        # Shift by where each group begins in the sorted order
+        sorted_ranks -= np.searchsorted(gs, gs)
+    ranks = np.empty(len(x), dtype=np.float64)
+    ranks[order] = sorted_ranks
+    return ranks
+
+def _auc_by_group(is_pos, y_score, groups, n_groups):
+    # Mann-Whitney U per group from one grouped ranking; NaN where a group
+    # lacks either class
+    ranks = average_ranks(y_score, groups)
+    n_pos = np.bincount(groups, weights=is_pos, minlength=n_groups)
+    n_neg = np.bincount(groups, minlength=n_groups) - n_pos
+    pos_ranks = np.bincount(groups, weights=np.where(is_pos, ranks, 0.0), minlength=n_groups)
+    pairs = n_pos * n_neg
+    return np.divide(pos_ranks - n_pos * (n_pos + 1) / 2.0, pairs, out=np.full(n_groups, np.nan), where=pairs > 0)
+
+@register_metric("accuracy", kind="label", higher_is_better=True,
+                 accumulator=lambda gt: ConfusionAccumulator(_accuracy_counts),
+                 grouped=lambda t, p, g, n: _group_mean((t == p).astype(np.float64), g, n),
+                 rowwise=lambda t, p: (t == p).astype(np.float64), counts=_accuracy_counts)
+def accuracy(y_true, y_pred):
+    # The confusion matrix's trace over its total, without building it
+    return np.mean(y_true == y_pred)
+
+def _f1_weighted(support, predicted, correct):
+    return _weighted(_f1(support, predicted, correct), support)
+
+@register_metric("f1", kind="label", higher_is_better=True,
+                 accumulator=lambda gt: ConfusionAccumulator(_f1_weighted),
+                 grouped=_label_metric(_f1_weighted), counts=_f1_weighted)
+def f1_weighted(y_true, y_pred):
+    # Support-weighted mean of per-label F1 over the union of labels
+    return _single(_f1_weighted, y_true, y_pred)
+
+def _f1_macro(support, predicted, correct):
+    return _macro(_f1(support, predicted, correct), support, predicted)
+
+@register_metric("f1_macro", kind="label", higher_is_better=True,
+                 accumulator=lambda gt: ConfusionAccumulator(_f1_macro),
+                 grouped=_label_metric(_f1_macro), counts=_f1_macro)
+def f1_macro(y_true, y_pred):
+    return _single(_f1_macro, y_true, y_pred)
+
+def _precision_macro(support, predicted, correct):
+    return _macro(_ratio(correct, predicted), support, predicted)
+
+@register_metric("precision_macro", kind="label", higher_is_better=True,
+                 accumulator=lambda gt: ConfusionAccumulator(_precision_macro),
+                 grouped=_label_metric(_precision_macro), counts=_precision_macro)
+def precision_macro(y_true, y_pred):
+    return _single(_precision_macro, y_true, y_pred)
+
+def _recall_macro(support, predicted, correct):
+    return _macro(_ratio(correct, support), support, predicted)
+
+@register_metric("recall_macro", kind="label", higher_is_better=True,
+                 accumulator=lambda gt: ConfusionAccumulator(_recall_macro),
+                 grouped=_label_metric(_recall_macro), counts=_recall_macro)
+def recall_macro(y_true, y_pred):
+    return _single(_recall_macro, y_true, y_pred)
+
+@register_metric("roc_auc", kind="probability", higher_is_better=True,
+                 accumulator=lambda gt: AUCAccumulator(binary_labels(gt.target)),
+                 grouped=_auc_by_group)
+def roc_auc(is_pos, y_score):
+    # Mann-Whitney U over average ranks
+    n_pos = int(is_pos.sum())
+    n_neg = len(is_pos) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        raise ValueError("Only one class present in y_true. ROC AUC score is not defined in that case.")
+    ranks = average_ranks(y_score)
+    return (ranks[is_pos].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg)
+
+@register_metric("cross_entropy", kind="probability",
+                 accumulator=lambda gt: LogLossAccumulator(binary_labels(gt.target)),
+                 grouped=lambda t, p, g, n: _group_mean(_log_losses(t, p), g, n),
+                 rowwise=_log_losses)
+def cross_entropy(is_pos, y_prob):
+    return np.mean(_log_losses(is_pos, y_prob))
+
+@register_metric("mae", accumulator=lambda gt: SumAccumulator("mae"),
+                 grouped=lambda t, p, g, n: _group_mean(np.abs(p - t), g, n),
+                 rowwise=lambda t, p: np.abs(p - t))
+def mae(y_true, y_pred):
+    return np.mean(np.abs(y_pred - y_true))
+
+@register_metric("mse", accumulator=lambda gt: SumAccumulator("mse"),
+                 grouped=lambda t, p, g, n: _group_mean((p - t) ** 2, g, n),
+                 rowwise=lambda t, p: (p - t) ** 2)
+def mse(y_true, y_pred):
+    err = y_pred - y_true
+    return np.dot(err, err) / len(err)
+
+@register_metric("rmse", accumulator=lambda gt: SumAccumulator("rmse"),
+                 grouped=lambda t, p, g, n: np.sqrt(_group_mean((p - t) ** 2, g, n)),
+                 rowwise=lambda t, p: (p - t) ** 2, from_mean=np.sqrt)
+def rmse(y_true, y_pred):
+    return np.sqrt(mse(y_true, y_pred))
+
+@register_metric("map", kind="ranking", higher_is_better=True)
+def average_precision(r, k):
+    # AP@K divides by min(K, relevant items), as in the usual MAP@K definition
+    hit = (r.rel > 0) & (r.pos < k)
+    # Hits up to and including each row, within its query
+    seen = np.cumsum(hit)
+    seen -= np.repeat(seen[r.starts] - hit[r.starts], np.diff(np.r_[r.starts, len(hit)]))
+    total = r.segment_sum(np.where(hit, seen / (r.pos + 1.0), 0.0))
+    denom = np.minimum(r.n_relevant, k)
+    return np.divide(total, denom, out=np.full(r.n_queries, np.nan), where=denom > 0)
+
+@register_metric("ndcg", kind="ranking", higher_is_better=True)
+def ndcg(r, k):
+    # Linear gains (the relevance itself) and a log2 discount, as in scikit-learn's ndcg_score
+    dcg = r.segment_sum(np.where(r.pos < k, r.rel * _discount(r.pos), 0.0))
+    ideal = r.ideal_dcg(k)
+    return np.divide(dcg, ideal, out=np.full(r.n_queries, np.nan), where=ideal > 0)
+
+@register_metric("mrr", kind="ranking", higher_is_better=True)
+def reciprocal_rank(r, k):
+    hit = (r.rel > 0) & (r.pos < k)
+    best = r.segment_max(np.where(hit, 1.0 / (r.pos + 1.0), 0.0))
+    return np.where(r.n_relevant > 0, best, np.nan)
@@ -0,0 +1,176 @@
+import csv
+import mmap
+import os
+import numpy as np
+from gt_cache import is_url, load_ground_truth
+from alignment import SAMPLE_IDS, gt_positions, normalize_ids
+from compression import is_json, open_input, sniff
+
+# Cheap pre-validation of a CSV submission, run before anything reads the
+# whole file (hashing, parsing, scoring). The file is memory-mapped and only
+# touched in a few places:
+#   header - ID column first, then exactly the ground truth's target columns
+#   rows   - counted exactly in small files, otherwise estimated from the
+#            average line length of a few blocks spread over the file;
+#            only gross mismatches are rejected, since partial and duplicated
+#            rows are scored and reported by the alignment step
+#   ids    - a few lines spread evenly over the file, looked up in the
+#            ground-truth ID index
+# Compressed files cannot be sampled without decompressing them, so only
+# their header is checked, read through the decompressor.
+# A failed check is a structured rejection: {"error": ..., "rejected": {...}}.
+# Set SCORING_PRECHECK=0 to skip the stage.
+
+ENABLED = os.environ.get("SCORING_PRECHECK", "1") != "0"
+
+# Longest header line read from a compressed file
+HEADER_BYTES = 1 << 20
+# Files up to this size have their lines counted exactly
+EXACT_BYTES = 1 << 20
+# Blocks read from a larger file to estimate its line length
+SAMPLE_BLOCKS = 16
+BLOCK_BYTES = 16 * 1024
+# A row count this far off the ground truth's is rejected
+ROW_TOLERANCE = 0.25
+SAMPLE_LINES = 64
+# Header columns echoed back in a rejection
+REPORT_COLUMNS = 20
+# Share of sampled IDs that may be unknown before the file is rejected
+MAX_UNKNOWN_IDS = 0.5
+
+class SubmissionRejected(ValueError):
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+def precheck(sub_path, gt_path):
+    """A rejection result for a malformed submission, or None if it may be scored."""
+    if not ENABLED or is_url(sub_path):
+        return None
+    try:
+        if is_json(sub_path):
+            return None
+        gt = load_ground_truth(gt_path)
+        check_submission(sub_path, gt)
+    except SubmissionRejected as e:
+        return {"error": str(e), "rejected": e.report}
+    except Exception:
+        # Unreadable files and ground-truth problems are reported by the scorer itself
+        return None
+    return None
+
+def check_submission(sub_path, gt):
+    if os.path.getsize(sub_path) == 0:
+        raise SubmissionRejected("Submission is empty", {"check": "empty"})
+    if sniff(sub_path) is not None:
+        with open_input(sub_path) as f:
+            check_header(f.readline(HEADER_BYTES), gt)
+        return
+    with open(sub_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = _line_end(mm, 0)
+            check_header(mm[:end], gt)
+            body = min(end + 1, len(mm))
+            check_rows(mm, body, gt)
+            check_ids(mm, body, gt)
+
+def _line_end(mm, start):
+    end = mm.find(b"\n", start)
+    return len(mm) if end < 0 else end
+
+def check_header(line, gt):
+    raw = line.rstrip(b"\r\n")
+    if raw.startswith(b"\xef\xbb\xbf"):
+        raw = raw[3:]
+    try:
+        columns = next(csv.reader([raw.decode("utf-8")]), [])
+    except UnicodeDecodeError:
+        raise SubmissionRejected("Submission is not a UTF-8 CSV file", {"check": "header"})
+    columns = [c.strip() for c in columns]
+
+    targets = [str(c) for c in gt.target_cols]
+    missing = [c for c in targets if c not in columns[1:]]
+    unexpected = [c for c in columns[1:] if c not in targets]
+    if missing or unexpected:
+        report = {"check": "header", "columns": columns[:REPORT_COLUMNS], "expected": [str(gt.id_col), *targets]}
+        if missing:
+            report["missing"] = missing
+        if unexpected:
+            report["unexpected"] = unexpected[:REPORT_COLUMNS]
+        if missing:
+            names = ", ".join(f"'{c}'" for c in missing)
+            message = f"Submission is missing the {names} column{'s' if len(missing) > 1 else ''}"
+        else:
+            names = ", ".join(f"'{c}'" for c in unexpected[:REPORT_COLUMNS])
+            message = f"Submission has unexpected column{'s' if len(unexpected) > 1 else ''} {names}"
+        raise SubmissionRejected(message, report)
+
+def _count_lines(data):
+    # Non-blank lines, including a last line without a trailing newline
+    return sum(1 for line in data.split(b"\n") if line.strip())
+
+def check_rows(mm, body, gt):
+    expected = len(gt.ids)
+    size = len(mm) - body
+    if len(mm) <= EXACT_BYTES:
+        rows = _count_lines(mm[body:])
+        estimated = False
+    else:
+        # Evenly spaced, first and last included, so files whose line length
+        # drifts (e.g. sorted predictions) are still estimated fairly
+        starts = np.linspace(body, len(mm) - BLOCK_BYTES, SAMPLE_BLOCKS).astype(np.int64)
+        blocks = [mm[s:s + BLOCK_BYTES] for s in starts]
+        lines = sum(b.count(b"\n") for b in blocks)
+        rows = int(round(size * lines / sum(len(b) for b in blocks))) if lines else 1
+        estimated = True
+    if abs(rows - expected) > ROW_TOLERANCE * expected:
+        about = "about " if estimated else ""
+        raise SubmissionRejected(
+            f"Submission has {about}{rows:,} rows, expected {expected:,}",
+            {"check": "rows", "rows": rows, "expected": expected, "estimated": estimated},
+        )
+
+def _parse_id(field, kind):
+    field = field.strip().strip('"')
+    try:
+        if kind in "iu":
+            return int(field)
+        if kind == "f":
+            return float(field)
+    except ValueError:
+        return None
+    return field
+
+def sample_ids(mm, body, n=SAMPLE_LINES):
+    """First field of up to n lines spread evenly over the body."""
+    ids = []
+    seen = set()
+    for offset in np.linspace(body, len(mm) - 1, n).astype(np.int64):
+        # Every sample but the first starts at the line after its offset
+        start = body if offset == body else _line_end(mm, int(offset)) + 1
+        if start >= len(mm) or start in seen:
+            continue
+        seen.add(start)
+        line = mm[start:_line_end(mm, start)].rstrip(b"\r")
+        if line.strip():
+            ids.append(line.split(b",", 1)[0].decode("utf-8", "replace"))
+    return ids
+
+def check_ids(mm, body, gt):
+    sampled = sample_ids(mm, body)
+    if not sampled:
+        return
+    kind = gt.ids.dtype.kind
+    parsed = [_parse_id(i, kind) for i in sampled]
+    known = np.zeros(len(parsed), dtype=bool)
+    valid = [k for k, v in enumerate(parsed) if v is not None]
+    if valid:
+        values = [parsed[k] for k in valid]
+        values = np.array(values, dtype=gt.ids.dtype) if kind in "iuf" else normalize_ids(gt, np.array(values, dtype=object))
+        known[valid] = gt_positions(gt, values) >= 0
+    unknown = [i for i, ok in zip(sampled, known) if not ok]
+    if len(unknown) > MAX_UNKNOWN_IDS * len(sampled):
+        raise SubmissionRejected(
+            f"{len(unknown)} of {len(sampled)} sampled IDs are not in the ground truth",
+            {"check": "ids", "sampled": len(sampled), "unknown": len(unknown), "unknown_ids": unknown[:SAMPLE_IDS]},
+        )
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import urllib3
+from gt_cache import is_url
+
+# Remote inputs for the URL-based scorer (api/score/index.py).
+# Every download goes through one process-wide urllib3 pool, so a warm
+# function instance reuses its keep-alive connections. Bodies are streamed to
+# disk in chunks rather than held in memory:
+#   submissions   - a temporary file, removed when the Download is closed
+#   ground truths - a local copy under SCORING_FETCH_CACHE, revalidated with
+#                   If-None-Match / If-Modified-Since; a 304 reuses the copy
+#                   without downloading it again
+# A revalidated copy keeps its mtime, so its compiled form (gt_compile.py) and
+# the in-process ground-truth cache stay valid across requests. Local paths
+# pass through untouched.
+
+CHUNK_BYTES = 1 << 20
+CACHE_DIR = os.environ.get("SCORING_FETCH_CACHE") or os.path.join(tempfile.gettempdir(), "scoring-fetch")
+
+http = urllib3.PoolManager(
+    maxsize=int(os.environ.get("SCORING_FETCH_POOL", 8)),
+    timeout=urllib3.Timeout(connect=10, read=60),
+    retries=urllib3.Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504)),
+)
+# Fetches that run alongside the caller's own (see fetch_inputs)
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("SCORING_FETCH_WORKERS", 8)))
+
+_lock = threading.Lock()
+_loading = {}  # cache path -> Lock, so one thread revalidates while others wait
+_stats = {"downloads": 0, "not_modified": 0, "bytes": 0}
+
+class Download:
+    def __init__(self, path, nbytes, temporary=False, not_modified=False):
+        self.path = path
+        self.nbytes = nbytes
+        self.temporary = temporary
+        # True when a cached copy was confirmed current by a 304
+        self.not_modified = not_modified
+
+    def close(self):
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+def _suffix(url):
+    # Keep the extension so readers can still tell JSON from CSV
+    return os.path.splitext(urlparse(url).path)[1] or ".csv"
+
+def _stream_to(res, f):
+    nbytes = 0
+    for chunk in res.stream(CHUNK_BYTES):
+        f.write(chunk)
+        nbytes += len(chunk)
+    return nbytes
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+def _check(res, url):
+    if res.status != 200:
+        res.drain_conn()
+        raise ValueError(f"Could not fetch {url}: HTTP {res.status}")
+
+def fetch(url):
+    """Download `url` to a temporary file; local paths are returned as-is."""
+    if not is_url(url):
+        return Download(url, os.path.getsize(url))
+    res = http.request("GET", url, preload_content=False)
+    try:
+        _check(res, url)
+        fd, path = tempfile.mkstemp(suffix=_suffix(url))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                nbytes = _stream_to(res, f)
+        except BaseException:
+            os.remove(path)
+            raise
+    finally:
+        res.release_conn()
+    _count("downloads")
+    _count("bytes", nbytes)
+    return Download(path, nbytes, temporary=True)
+
+def fetch_cached(url):
+    """Local copy of `url`, downloaded only when the server reports a change."""
+    if not is_url(url):
+        return Download(url, os.path.getsize(url))
+    key = hashlib.sha256(url.encode()).hexdigest()[:32]
+    path = os.path.join(CACHE_DIR, key + _suffix(url))
+    meta_path = os.path.join(CACHE_DIR, key + ".json")
+
+    with _lock:
+        load_lock = _loading.setdefault(path, threading.Lock())
+    with load_lock:
+        headers = {}
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if os.path.exists(path):
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+        except (OSError, ValueError):
+            pass
+
+        res = http.request("GET", url, headers=headers, preload_content=False)
+        try:
+            if res.status == 304 and headers:
+                res.drain_conn()
+                _count("not_modified")
+                return Download(path, os.path.getsize(path), not_modified=True)
+            _check(res, url)
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    nbytes = _stream_to(res, f)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+            with open(meta_path, "w") as f:
+                json.dump({
+                    "url": url,
+                    "etag": res.headers.get("ETag"),
+                    "last_modified": res.headers.get("Last-Modified"),
+                }, f)
+        finally:
+            res.release_conn()
+    _count("downloads")
+    _count("bytes", nbytes)
+    return Download(path, nbytes)
+
+def fetch_inputs(sub_url, gt_url):
+    """(submission, ground truth) Downloads, fetched concurrently."""
+    sub_future = _executor.submit(fetch, sub_url)
+    try:
+        gt = fetch_cached(gt_url)
+    except BaseException:
+        # Don't leave the submission's temporary file behind
+        sub_future.add_done_callback(_close_result)
+        raise
+    return sub_future.result(), gt
+
+def _close_result(future):
+    if future.exception() is None:
+        future.result().close()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from gt_cache import fingerprint, is_url
+
+# Persistent memo of scoring results, keyed by
+# (submission content hash, ground-truth content hash, metric).
+#
+# Resubmitting a byte-identical file against an unchanged ground truth returns
+# the stored result without touching pandas. Replacing the ground truth
+# changes its hash, and a different metric is a different key, so stale
+# entries are never served; they just stop being looked up.
+#
+# Uploaders should hash while they write the file and pass the digest in;
+# otherwise the submission is hashed here, which costs one extra read.
+# Ground-truth hashes are memoized per fingerprint (mtime + size, or ETag for
+# URLs), so each version of a ground truth is hashed once per process.
+#
+# The store is an SQLite file shared by every process on the host
+# (SCORING_RESULT_CACHE, "off" to disable). Only successful scores are kept.
+
+HASH_BLOCK = 1 << 20
+# Bump when scoring changes in a way that alters stored results
+RESULT_VERSION = 1
+
+def store_path(env, filename):
+    """SQLite file named by the `env` variable, `filename` in the temp dir by default; None when "off"."""
+    path = os.environ.get(env, os.path.join(tempfile.gettempdir(), filename))
+    return None if path == "off" else path
+
+class SqliteStore:
+    """Base for the persistent stores: an SQLite file with one table, SCHEMA."""
+
+    SCHEMA = None
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per process; forked workers open their own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(self.SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+def new_hasher():
+    return hashlib.sha256()
+
+def file_digest(path):
+    h = new_hasher()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+_gt_digests = {}  # source -> (fingerprint, digest)
+_gt_lock = threading.Lock()
+
+def gt_digest(source):
+    """Content hash of a ground truth, or None when it cannot be identified cheaply."""
+    fp = fingerprint(source)
+    if fp is None:
+        return None
+    with _gt_lock:
+        entry = _gt_digests.get(source)
+    if entry is not None and entry[0] == fp:
+        return entry[1]
+    # A remote file is identified by its validators rather than downloaded twice
+    digest = hashlib.sha256(repr(fp).encode()).hexdigest() if is_url(source) else file_digest(source)
+    with _gt_lock:
+        _gt_digests[source] = (fp, digest)
+    return digest
+
+class ResultCache(SqliteStore):
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS results ("
+        " sub_hash TEXT, gt_hash TEXT, metric TEXT, version INTEGER,"
+        " result TEXT, created_at REAL,"
+        " PRIMARY KEY (sub_hash, gt_hash, metric, version))"
+    )
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT result FROM results WHERE sub_hash = ? AND gt_hash = ? AND metric = ? AND version = ?",
+                key + (RESULT_VERSION,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, result):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    key + (RESULT_VERSION, json.dumps(result), time.time()),
+                )
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM results")
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}
+
+_path = store_path("SCORING_RESULT_CACHE", "scoring-results.sqlite3")
+cache = None if _path is None else ResultCache(_path)
+
+# Per-request output that should not be replayed from the cache
+VOLATILE_KEYS = ("timings", "bytes_read", "peak_mem_mb")
+
+def cached_score(score, sub_path, gt_path, metric, sub_hash=None, **kwargs):
+    """score(sub_path, gt_path, metric, **kwargs), memoized on content hashes."""
+    key = None
+    if cache is not None and not is_url(sub_path):
+        try:
+            gt_hash = gt_digest(gt_path)
+            if gt_hash is not None:
+                key = (sub_hash or file_digest(sub_path), gt_hash, metric)
+        except OSError:
+            key = None  # let the scorer report the missing file
+    if key is not None:
+        try:
+            hit = cache.get(key)
+        except sqlite3.Error:
+            hit = None
+        if hit is not None:
+            return {**hit, "cached": True}
+
+    result = score(sub_path, gt_path, metric, **kwargs)
+    if key is not None and "score" in result:
+        try:
+            cache.put(key, {k: v for k, v in result.items() if k not in VOLATILE_KEYS})
+        except sqlite3.Error:
+            pass  # a read-only or locked store only costs the memo
+    return result
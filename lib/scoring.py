@@ -1,64 +1,269 @@
 import sys
 import pandas as pd
 import json
-from sklearn.metrics import (
-    accuracy_score, f1_score, roc_auc_score, log_loss,
-    mean_absolute_error, mean_squared_error
-)
-import numpy as np
 import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from gt_cache import load_ground_truth
+from alignment import AlignmentError, align_targets, aligned_queries
+from splits import split_scores
+from metrics import get_metric, score_targets
+from streaming import should_stream, stream_score
+from telemetry import StageTimer, deadline_of, stage, timed_read, with_timings
+from result_cache import cached_score
+from precheck import precheck
+from compression import decompressing, is_json
+from delta import delta_score, remember
+from bootstrap import bootstrap_interval, interval, resample_count, resampled_scores, shakeup, SEED
+
+def read_submission(sub_path, timer=None):
+    # gzip/bz2/xz/zip uploads are recognised by their magic bytes and
+    # decompressed straight into the parser
+    if is_json(sub_path):
+        return timed_read(sub_path, decompressing(pd.read_json), timer)
+    return timed_read(sub_path, decompressing(pd.read_csv), timer)
+
+def calculate_score(sub_path, gt_path, metric, stream=False, timings=False, sub_hash=None, lineage=None,
+                    bootstrap=None):
+    # Malformed files are rejected from a few sampled lines before anything
+    # reads them in full; byte-identical resubmissions are answered from the
+    # persistent result cache. `lineage` (e.g. competition and user) lets a
+    # resubmission be rescored from the rows it changed, see delta.py.
+    # `bootstrap` (true or a number of resamples) adds a confidence interval,
+    # see bootstrap.py; those results are computed in full and not cached
+    rejected = precheck(sub_path, gt_path)
+    if rejected:
+        return rejected
+    if bootstrap:
+        return _score(sub_path, gt_path, metric, timings=timings, bootstrap=bootstrap)
+    return cached_score(_score, sub_path, gt_path, metric, sub_hash, stream=stream, timings=timings, lineage=lineage)
 
-def calculate_score(sub_path, gt_path, metric):
+def _score(sub_path, gt_path, metric, stream=False, timings=False, lineage=None, bootstrap=None, timer=None):
+    # The one scoring pipeline: the bridge and the Flask handler call it too.
+    # `timer` is a caller's StageTimer to record the stages in; the caller
+    # reports it, so `timings` only applies without one
+    if lineage is not None:
+        result = delta_score(sub_path, gt_path, metric, lineage)
+        if result is not None:
+            return result
+
+    # Large submissions are scored in bounded memory, chunk by chunk; an
+    # interval needs every row in memory
+    if not bootstrap and (stream or should_stream(sub_path, gt_path, metric)):
+        return stream_score(sub_path, gt_path, metric, timings=timings, timer=timer)
+
+    # Optional per-stage timings and peak memory, attached to the result
+    reported = StageTimer(track_memory=True) if timings and timer is None else None
+    timer = timer or reported
     try:
         # Load datasets
-        if sub_path.endswith('.csv'):
-            sub_df = pd.read_csv(sub_path)
-        elif sub_path.endswith('.json'):
-            sub_df = pd.read_json(sub_path)
-        else:
-            sub_df = pd.read_csv(sub_path)
-
-        if gt_path.endswith('.csv'):
-            gt_df = pd.read_csv(gt_path)
-        elif gt_path.endswith('.json'):
-            gt_df = pd.read_json(gt_path)
-        else:
-            gt_df = pd.read_csv(gt_path)
+        sub_df = read_submission(sub_path, timer)
+
+        # Ground truth is parsed once and reused while the file is unchanged
+        with stage(timer, "ground_truth"):
+            gt = load_ground_truth(gt_path)
 
         # Align on the first column (ID) and extract the target column(s)
-        gt_df = gt_df.set_index(gt_df.columns[0])
-        sub_df = sub_df.set_index(sub_df.columns[0])
-        
-        y_true = gt_df[gt_df.columns[0]].values
-        y_pred = sub_df[gt_df.columns[0]].values
-
-        score = 0.0
-        m = metric.lower()
-
-        if m == 'accuracy':
-            score = accuracy_score(y_true, y_pred)
-        elif m == 'f1':
-            score = f1_score(y_true, y_pred, average='weighted')
-        elif m == 'roc_auc':
-            score = roc_auc_score(y_true, y_pred)
-        elif m == 'cross_entropy':
-            score = log_loss(y_true, y_pred)
-        elif m == 'mae':
-            score = mean_absolute_error(y_true, y_pred)
-        elif m == 'mse':
-            score = mean_squared_error(y_true, y_pred)
-        elif m == 'rmse':
-            score = np.sqrt(mean_squared_error(y_true, y_pred))
-        else:
-            # Default to accuracy if unknown
-            score = accuracy_score(y_true, y_pred)
-            
-        return {"score": float(round(score, 6))}
+        with stage(timer, "align"):
+            y_true, y_pred, alignment = align_targets(gt, sub_df, metric)
+
+        with stage(timer, "metric"):
+            queries = aligned_queries(gt, alignment)
+            score, columns = score_targets(metric, y_true, y_pred, gt.target_cols, queries)
+            splits = split_scores(metric, gt, alignment, y_true, y_pred)
+
+        result = {"score": float(round(score, 6))}
+        if columns:
+            result["columns"] = columns
+        if splits:
+            result["splits"] = splits
+        if bootstrap:
+            with stage(timer, "bootstrap"):
+                result["bootstrap"] = bootstrap_interval(metric, gt, alignment, y_true, y_pred, bootstrap,
+                                                         deadline=deadline_of(timer))
+        if not alignment.clean:
+            result["alignment"] = alignment.report()
+        if lineage is not None:
+            # Base for the lineage's next resubmission
+            remember(lineage, sub_path, gt_path, metric, gt, alignment, y_true, y_pred)
+        return with_timings(result, reported)
+
+    except AlignmentError as e:
+        return with_timings({"error": str(e), "alignment": e.report}, reported)
+    except Exception as e:
+        return with_timings({"error": str(e)}, reported)
+
+# ---------------- BATCH ----------------
+
+_batch_gt = None
+
+def _init_batch_worker(gt):
+    global _batch_gt
+    _batch_gt = gt
+
+def _score_row(sub_path, metrics, gt=None, bootstrap=None):
+    # One submission against every metric; errors are reported per cell.
+    # Several target columns add each cell's per-column scores. With
+    # bootstrap, each cell's scores on the shared resamples come along
+    gt = gt if gt is not None else _batch_gt
+    scores = [None] * len(metrics)
+    errors = [None] * len(metrics)
+    resampled = [None] * len(metrics)
+    columns = [None] * len(metrics)
+    try:
+        # A lone label metric can score dictionary-encoded labels
+        y_true, y_pred, alignment = align_targets(gt, read_submission(sub_path), metrics[0] if len(metrics) == 1 else None)
+    except AlignmentError as e:
+        return scores, [str(e)] * len(metrics), e.report, [None] * len(metrics), resampled, columns
+    except Exception as e:
+        return scores, [str(e)] * len(metrics), None, [None] * len(metrics), resampled, columns
+
+    queries = aligned_queries(gt, alignment)
+    splits = [None] * len(metrics)
+    for i, metric in enumerate(metrics):
+        try:
+            score, columns[i] = score_targets(metric, y_true, y_pred, gt.target_cols, queries)
+            scores[i] = float(round(score, 6))
+            splits[i] = split_scores(metric, gt, alignment, y_true, y_pred)
+        except Exception as e:
+            errors[i] = str(e)
+            continue
+        if bootstrap:
+            try:
+                resampled[i] = resampled_scores(metric, gt, alignment, y_true, y_pred, bootstrap)
+            except ValueError as e:
+                resampled[i] = str(e)
+    return scores, errors, None if alignment.clean else alignment.report(), splits, resampled, columns
 
+def score_batch(sub_paths, gt_path, metrics, workers=None, bootstrap=None):
+    """Score N submissions with M metrics against one ground truth.
+
+    Returns {"submissions", "metrics", "scores", "errors", "alignment"} where
+    scores/errors are N x M matrices (a cell has either a score or an error
+    message) and alignment holds each submission's ID diagnostics, or None.
+    Ground truths with a split column add "splits", an N x M matrix of
+    per-split payloads, and ground truths with several target columns add
+    "columns", an N x M matrix of {column: score}. With `bootstrap` (true or a number of resamples),
+    "bootstrap" is an N x M matrix of confidence intervals and "shakeup" one
+    of {"p_best", "rank_low", "rank_high"}: how often the submission ranks
+    first and its rank interval over resamples shared by all submissions.
+    """
+    try:
+        for metric in metrics:
+            get_metric(metric)
+        gt = load_ground_truth(gt_path)
+        bootstrap = resample_count(bootstrap) if bootstrap else None
     except Exception as e:
         return {"error": str(e)}
 
+    workers = min(workers or os.cpu_count() or 1, len(sub_paths))
+    if workers <= 1:
+        rows = [_score_row(p, metrics, gt, bootstrap) for p in sub_paths]
+    else:
+        # The ground truth is handed to each worker once, not per submission;
+        # workers draw the same resample weights from the fixed seed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(gt,)) as pool:
+            chunksize = max(1, len(sub_paths) // (workers * 4))
+            n = len(sub_paths)
+            rows = list(pool.map(_score_row, sub_paths, [metrics] * n, [None] * n, [bootstrap] * n, chunksize=chunksize))
+
+    result = {
+        "submissions": list(sub_paths),
+        "metrics": list(metrics),
+        "scores": [r[0] for r in rows],
+        "errors": [r[1] for r in rows],
+        "alignment": [r[2] for r in rows],
+    }
+    if gt.split_codes is not None:
+        result["splits"] = [r[3] for r in rows]
+    if len(gt.target_cols) > 1:
+        result["columns"] = [r[5] for r in rows]
+    if bootstrap:
+        result["bootstrap"], result["shakeup"] = _bootstrap_matrices(metrics, [r[4] for r in rows], bootstrap)
+    return result
+
+def _bootstrap_matrices(metrics, resampled, resamples):
+    # Interval per cell; the shake-up ranks each metric's scored submissions
+    # against each other on every resample
+    n = len(resampled)
+    intervals = [[None] * len(metrics) for _ in range(n)]
+    shakeups = [[None] * len(metrics) for _ in range(n)]
+    for j, metric in enumerate(metrics):
+        scored = []
+        for i in range(n):
+            cell = resampled[i][j]
+            if isinstance(cell, str):
+                intervals[i][j] = {"error": cell}
+            elif cell is not None:
+                intervals[i][j] = interval(cell, resamples, SEED)
+                scored.append(i)
+        if scored:
+            ranks = shakeup(np.array([resampled[i][j] for i in scored]), get_metric(metric).higher_is_better)
+            for i, entry in zip(scored, ranks):
+                shakeups[i][j] = entry
+    return intervals, shakeups
+
+def _load_batch_gt(gt_path):
+    # Each worker loads the ground truth itself; a compiled one is memory-mapped,
+    # so its pages are shared rather than pickled to every process
+    _init_batch_worker(load_ground_truth(gt_path))
+
+def _checked_row(sub_path, gt_path, metric, gt=None):
+    # (score, error) for one submission, behind the same precheck as
+    # calculate_score, so a file rejected at submit time stays rejected
+    rejected = precheck(sub_path, gt_path)
+    if rejected:
+        return None, rejected["error"]
+    scores, errors = _score_row(sub_path, [metric], gt)[:2]
+    return scores[0], errors[0]
+
+def score_each(items, gt_path, metric, workers=None, chunksize=8):
+    """Yield (key, score, error) for every (key, sub_path) in items, in input order.
+
+    Submissions the precheck rejects come back with its error and no score.
+    Results are produced while the pool keeps working, so callers can write
+    them back in batches; closing the generator early cancels whatever has
+    not started yet.
+    """
+    items = list(items)
+    gt = load_ground_truth(gt_path)
+    workers = min(workers or os.cpu_count() or 1, len(items))
+    if workers <= 1:
+        for key, path in items:
+            yield (key, *_checked_row(path, gt_path, metric, gt))
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_load_batch_gt, initargs=(gt_path,))
+    try:
+        n = len(items)
+        rows = pool.map(_checked_row, [p for _, p in items], [gt_path] * n, [metric] * n, chunksize=chunksize)
+        for (key, _), (score, error) in zip(items, rows):
+            yield key, score, error
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
 if __name__ == "__main__":
+    # --bootstrap adds confidence intervals (and, in batch mode, shake-up
+    # estimates) from the default number of resamples; --bootstrap=N sets it
+    bootstrap = next((f.partition("=")[2] or True for f in sys.argv if f.split("=", 1)[0] == "--bootstrap"), None)
+    sys.argv = [a for a in sys.argv if a.split("=", 1)[0] != "--bootstrap"]
+
+    # Batch mode: scoring.py --batch <gt_path> <metric[,metric...]> <sub_path>...
+    if len(sys.argv) >= 2 and sys.argv[1] == "--batch":
+        if len(sys.argv) < 5:
+            print(json.dumps({"error": "Missing arguments"}))
+            sys.exit(1)
+        result = score_batch(sys.argv[4:], sys.argv[2], sys.argv[3].split(","), bootstrap=bootstrap)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    stream = "--stream" in sys.argv
+    if stream:
+        sys.argv.remove("--stream")
+    timings = "--timings" in sys.argv
+    if timings:
+        sys.argv.remove("--timings")
+
     if len(sys.argv) < 4:
         print(json.dumps({"error": "Missing arguments"}))
         sys.exit(1)
@@ -67,5 +272,5 @@ if __name__ == "__main__":
     gt = sys.argv[2]
     met = sys.argv[3]
 
-    result = calculate_score(sub, gt, met)
+    result = calculate_score(sub, gt, met, stream=stream, timings=timings, bootstrap=bootstrap)
     print(json.dumps(result))
@@ -1,6 +1,7 @@
-import { exec } from "child_process"
+import { exec, spawn, ChildProcessWithoutNullStreams } from "child_process"
 import path from "path"
 import fs from "fs"
+import readline from "readline"
 import { promisify } from "util"
 
 const execPromise = promisify(exec)
@@ -36,10 +37,135 @@ class ConcurrencyLimiter {
 
 const limiter = new ConcurrencyLimiter();
 
+type BridgeResult = { score?: number; error?: string }
+
+// Long-lived `scoring_bridge.py --serve` process with a pre-warmed worker pool.
+// Avoids paying interpreter start-up plus the pandas/NumPy import on every submission.
+class ScoringDaemon {
+    private proc: ChildProcessWithoutNullStreams | null = null;
+    private ready: Promise<void> | null = null;
+    private nextId = 1;
+    private pending = new Map<number, { done: (result: BridgeResult) => void; timer: NodeJS.Timeout }>();
+
+    constructor(private script: string, private workers = 4, private timeoutMs = 300_000) {}
+
+    private settle(id: number, result: BridgeResult) {
+        const entry = this.pending.get(id)
+        if (!entry) return
+        clearTimeout(entry.timer)
+        this.pending.delete(id)
+        entry.done(result)
+    }
+
+    private failAll(reason: string) {
+        for (const id of [...this.pending.keys()]) this.settle(id, { error: reason })
+    }
+
+    private start(): Promise<void> {
+        if (this.ready) return this.ready;
+
+        this.ready = new Promise<void>((resolve, reject) => {
+            const proc = spawn("python3", [this.script, "--serve", String(this.workers)])
+            this.proc = proc
+
+            // Only the current process may tear down the daemon's state; a
+            // replaced one exiting late must not fail its successor's requests
+            const fail = (reason: string) => {
+                if (this.proc !== proc) return
+                this.proc = null
+                this.ready = null
+                this.failAll(reason)
+                reject(new Error(reason))
+            }
+
+            const lines = readline.createInterface({ input: proc.stdout })
+            lines.on("line", (line) => {
+                let msg: any
+                try {
+                    msg = JSON.parse(line)
+                } catch {
+                    // Responses can no longer be matched to requests: fail
+                    // everything in flight and start over with a new process
+                    console.error("Scoring daemon sent invalid output:", line)
+                    fail("Scoring daemon sent invalid output")
+                    proc.kill()
+                    return
+                }
+                if (msg.ready) {
+                    resolve()
+                    return
+                }
+                this.settle(msg.id, msg)
+            })
+
+            proc.stderr.on("data", (chunk) => console.error("Scoring daemon:", chunk.toString()))
+
+            // A write to a daemon that closed its input (EPIPE) is reported
+            // here rather than thrown; requests already sent won't be answered
+            proc.stdin.on("error", (e) => {
+                fail(`Scoring daemon input failed: ${e.message}`)
+                proc.kill()
+            })
+            proc.on("error", (e) => fail(`Scoring daemon failed: ${e.message}`))
+            proc.on("exit", (code) => fail(`Scoring daemon exited with code ${code}`))
+        })
+        // Callers that already awaited a resolved promise don't care about a later exit
+        this.ready.catch(() => {})
+        return this.ready
+    }
+
+    async score(subPath: string, gtPath: string, metric: string, subHash?: string, lineage?: string): Promise<BridgeResult> {
+        await this.start()
+        const id = this.nextId++
+        return new Promise<BridgeResult>((resolve) => {
+            // A request the daemon never answers still frees its caller
+            const timer = setTimeout(() => this.settle(id, { error: "Scoring timed out" }), this.timeoutMs)
+            this.pending.set(id, { done: resolve, timer })
+            this.proc!.stdin.write(JSON.stringify({ id, sub_path: subPath, gt_path: gtPath, metric, sub_hash: subHash, lineage }) + "\n")
+        })
+    }
+}
+
+const bridgeScript = path.join(process.cwd(), "lib", "scoring_bridge.py")
+// Longest a single scoring request may take before its caller gives up
+const scoringTimeoutMs = Number(process.env.SCORING_TIMEOUT_MS) || 300_000
+const daemon = new ScoringDaemon(bridgeScript, Number(process.env.SCORING_WORKERS) || 4, scoringTimeoutMs)
+
+// One-off fallback used when the daemon cannot be started
+async function runBridgeOnce(subPath: string, gtPath: string, metric: string, subHash?: string, lineage?: string): Promise<BridgeResult> {
+    // Using python3 as common alias, might need to adjust based on environment
+    const hashFlag = subHash && /^[0-9a-f]+$/.test(subHash) ? ` --sub-hash=${subHash}` : ""
+    const lineageFlag = lineage && /^[\w:-]+$/.test(lineage) ? ` --lineage=${lineage}` : ""
+    const { stdout, stderr } = await execPromise(
+        `python3 "${bridgeScript}" "${subPath}" "${gtPath}" "${metric}"${hashFlag}${lineageFlag}`,
+        { timeout: scoringTimeoutMs },
+    )
+
+    if (stderr && !stdout) {
+        return { error: `Python Error: ${stderr}` }
+    }
+
+    if (!stdout || stdout.trim() === "") {
+        return { error: "Python bridge returned no output." }
+    }
+
+    try {
+        return JSON.parse(stdout)
+    } catch (parseError) {
+        return { error: `JSON parsing error from bridge: ${stdout}` }
+    }
+}
+
 export async function calculateScore(
     submissionPath: string,
     groundTruthPath: string,
-    metric: string
+    metric: string,
+    // SHA-256 of the submission, computed while it was written; lets the
+    // bridge answer byte-identical resubmissions from its result cache
+    submissionHash?: string,
+    // Groups one user's submissions to one competition, so a resubmission
+    // that changes a few rows is rescored from those rows only
+    lineage?: string
 ): Promise<{ score: number | null; error?: string }> {
     await limiter.acquire();
     try {
@@ -50,25 +176,12 @@ export async function calculateScore(
         const subPath = subRelative.startsWith('http') ? subRelative : path.join(process.cwd(), "uploads", subRelative)
         const gtPath = gtRelative.startsWith('http') ? gtRelative : path.join(process.cwd(), "uploads", gtRelative)
 
-        const bridgeScript = path.join(process.cwd(), "lib", "scoring_bridge.py")
-
-        // Execute local python bridge
-        // Using python3 as common alias, might need to adjust based on environment
-        const { stdout, stderr } = await execPromise(`python3 "${bridgeScript}" "${subPath}" "${gtPath}" "${metric}"`)
-
-        if (stderr && !stdout) {
-             return { score: null, error: `Python Error: ${stderr}` }
-        }
-
-        if (!stdout || stdout.trim() === "") {
-             return { score: null, error: "Python bridge returned no output." }
-        }
-
-        let result;
+        let result: BridgeResult
         try {
-            result = JSON.parse(stdout)
-        } catch (parseError) {
-            return { score: null, error: `JSON parsing error from bridge: ${stdout}` }
+            result = await daemon.score(subPath, gtPath, metric, submissionHash, lineage)
+        } catch (e) {
+            console.error("Scoring daemon unavailable, falling back to one-off bridge:", e)
+            result = await runBridgeOnce(subPath, gtPath, metric, submissionHash, lineage)
         }
 
         if (result.error) {
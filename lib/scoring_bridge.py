@@ -1,56 +1,116 @@
 import sys
-import pandas as pd
-import numpy as np
+import os
+import threading
 import json
-from sklearn.metrics import (
-    accuracy_score, f1_score, roc_auc_score, log_loss,
-    mean_absolute_error, mean_squared_error
-)
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from result_cache import cached_score
+from precheck import precheck
+from scoring import _score
+
+def calculate_score(sub_path, gt_path, metric, timings=False, sub_hash=None, lineage=None, bootstrap=None):
+    # Malformed files are rejected before anything reads them in full
+    return precheck(sub_path, gt_path) or _cached_score(sub_path, gt_path, metric, timings, sub_hash, lineage, bootstrap)
+
+def _cached_score(sub_path, gt_path, metric, timings=False, sub_hash=None, lineage=None, bootstrap=None):
+    # Byte-identical resubmissions are answered from the persistent result cache;
+    # sub_hash is the digest the uploader computed while writing the file.
+    # Resubmissions within a lineage are rescored from their changed rows (delta.py).
+    # Results with a bootstrap interval are always computed in full.
+    # Scoring itself is scoring._score, shared with the CLI and the Flask API
+    if bootstrap:
+        return _score(sub_path, gt_path, metric, timings=timings, bootstrap=bootstrap)
+    return cached_score(_score, sub_path, gt_path, metric, sub_hash, timings=timings, lineage=lineage)
+
+# ---------------- SERVER MODE ----------------
+# Long-lived alternative to spawning this script once per submission.
+# Reads one JSON request per line on stdin:
+#   {"id": 1, "sub_path": "...", "gt_path": "...", "metric": "rmse"}
+# ("timings": true adds per-stage timings and peak memory to the response,
+# "sub_hash" is the upload's SHA-256 for the result cache, "lineage" groups a
+# user's submissions to one competition for incremental rescoring, "bootstrap"
+# (true or a number of resamples) adds a confidence interval)
+# and writes one JSON response per line on stdout, echoing the id:
+#   {"id": 1, "score": 0.5}  or  {"id": 1, "error": "..."}
+# Responses may arrive out of order when several jobs run in parallel.
+
+def _warm_up():
+    # pandas/NumPy and the scoring modules are imported at module load, so a
+    # worker that has run this once has already paid the import cost.
+    return os.getpid()
+
+def _new_pool(workers):
+    pool = ProcessPoolExecutor(max_workers=workers)
+    # Touch every worker before announcing readiness
+    for f in [pool.submit(_warm_up) for _ in range(workers)]:
+        f.result()
+    return pool
+
+def serve(workers=None, stdin=sys.stdin, stdout=sys.stdout):
+    workers = workers or int(os.environ.get("SCORING_WORKERS", 0)) or os.cpu_count() or 1
+    out_lock = threading.Lock()
+
+    def emit(payload):
+        # Strict JSON: a NaN or infinite value would leave the reader unable
+        # to parse the line, and with it every response still in flight
+        try:
+            line = json.dumps(payload, allow_nan=False)
+        except ValueError:
+            line = json.dumps({"id": payload.get("id"), "error": "Score is not a finite number"})
+        with out_lock:
+            stdout.write(line + "\n")
+            stdout.flush()
+
+    pool = _new_pool(workers)
+    emit({"ready": True, "workers": workers})
+
+    def on_done(req_id, future):
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            result = {"error": "Scoring worker crashed"}
+        except Exception as e:
+            result = {"error": str(e)}
+        emit({"id": req_id, **result})
 
-def calculate_score(sub_path, gt_path, metric):
     try:
-        # Read CSV files
-        sub_df = pd.read_csv(sub_path)
-        gt_df = pd.read_csv(gt_path)
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                req = json.loads(line)
+                req_id = req.get("id")
+                args = (
+                    req["sub_path"], req["gt_path"], req.get("metric", "accuracy"),
+                    bool(req.get("timings")), req.get("sub_hash"), req.get("lineage"), req.get("bootstrap"),
+                )
+            except (ValueError, KeyError, AttributeError) as e:
+                emit({"id": None, "error": f"Invalid request: {e}"})
+                continue
 
-        # Align on the first column (ID) and extract the target column(s)
-        gt_df = gt_df.set_index(gt_df.columns[0])
-        sub_df = sub_df.set_index(sub_df.columns[0])
-        
-        # Ensure they have the same index
-        common_idx = gt_df.index.intersection(sub_df.index)
-        if len(common_idx) == 0:
-            return {"error": "No common IDs found between submission and ground truth."}
-            
-        y_true = gt_df.loc[common_idx, gt_df.columns[0]].values
-        y_pred = sub_df.loc[common_idx, gt_df.columns[0]].values
-
-        score = 0.0
-        m = metric.lower()
-
-        if m == 'accuracy':
-            score = accuracy_score(y_true, y_pred)
-        elif m == 'f1':
-            score = f1_score(y_true, y_pred, average='weighted')
-        elif m == 'roc_auc':
-            score = roc_auc_score(y_true, y_pred)
-        elif m == 'cross_entropy':
-            score = log_loss(y_true, y_pred)
-        elif m == 'mae':
-            score = mean_absolute_error(y_true, y_pred)
-        elif m == 'mse':
-            score = mean_squared_error(y_true, y_pred)
-        elif m == 'rmse':
-            score = np.sqrt(mean_squared_error(y_true, y_pred))
-        else:
-            score = accuracy_score(y_true, y_pred)
-            
-        return {"score": float(round(score, 6))}
-
-    except Exception as e:
-        return {"error": str(e)}
+            # Malformed submissions are answered here and never take a worker
+            rejected = precheck(args[0], args[1])
+            if rejected:
+                emit({"id": req_id, **rejected})
+                continue
+
+            try:
+                future = pool.submit(_cached_score, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM kill); replace the pool and retry once
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _new_pool(workers)
+                future = pool.submit(_cached_score, *args)
+            future.add_done_callback(lambda f, req_id=req_id: on_done(req_id, f))
+    finally:
+        pool.shutdown(wait=True)
 
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--serve":
+        serve(int(sys.argv[2]) if len(sys.argv) >= 3 else None)
+        sys.exit(0)
+
     if len(sys.argv) < 4:
         print(json.dumps({"error": "Missing arguments"}))
         sys.exit(1)
@@ -59,5 +119,10 @@ if __name__ == "__main__":
     gt_path = sys.argv[2]
     metric = sys.argv[3]
     
-    result = calculate_score(sub_path, gt_path, metric)
+    flags = sys.argv[4:]
+    sub_hash = next((f.split("=", 1)[1] for f in flags if f.startswith("--sub-hash=")), None)
+    lineage = next((f.split("=", 1)[1] for f in flags if f.startswith("--lineage=")), None)
+    bootstrap = next((f.partition("=")[2] or True for f in flags if f.split("=", 1)[0] == "--bootstrap"), None)
+    result = calculate_score(sub_path, gt_path, metric, timings="--timings" in flags, sub_hash=sub_hash,
+                             lineage=lineage, bootstrap=bootstrap)
     print(json.dumps(result))
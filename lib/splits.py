@@ -0,0 +1,27 @@
+import numpy as np
+from alignment import aligned_queries
+from metrics import grouped_scores
+
+# Leaderboard splits (e.g. public / private) from a ground-truth split column.
+# The split codes are compiled alongside the ground truth, so after one parse
+# and one alignment every split is scored in the same grouped metric pass.
+
+def aligned_split_codes(gt, alignment):
+    if alignment.gt_rows is None:
+        return np.asarray(gt.split_codes)
+    return gt.split_codes[alignment.gt_rows]
+
+def split_payload(names, scores, errors):
+    return {
+        name: {"score": round(score, 6)} if error is None else {"error": error}
+        for name, score, error in zip(names, scores, errors)
+    }
+
+def split_scores(metric, gt, alignment, y_true, y_pred):
+    """{split: {"score": ...} or {"error": ...}}, or None if the GT has no split column."""
+    if gt.split_codes is None:
+        return None
+    codes = aligned_split_codes(gt, alignment)
+    queries = aligned_queries(gt, alignment)
+    scores, errors = grouped_scores(metric, y_true, y_pred, codes, len(gt.split_names), queries)
+    return split_payload(gt.split_names, scores, errors)
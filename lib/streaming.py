@@ -0,0 +1,156 @@
+import os
+import numpy as np
+import pandas as pd
+from gt_cache import load_ground_truth
+from compression import EXPANSION, open_input, sniff
+from metrics import get_metric
+from splits import split_payload
+from telemetry import StageTimer, stage, with_timings
+from alignment import SAMPLE_IDS, check_target_columns, ensure_sorter, gt_positions, make_report, normalize_ids
+
+# Bounded-memory scoring for very large submissions.
+# The submission is read in fixed-size chunks; each chunk is aligned against
+# the (memory-mapped) ground truth by ID and folded into a metric accumulator,
+# so peak memory depends on the chunk size, not on the file size.
+#
+# Scores match the in-memory scorer to within float summation error for
+# accuracy, f1, mae, mse, rmse and cross_entropy. roc_auc is computed from a
+# fixed 2**20-bin histogram of the predicted probabilities (see metrics.py),
+# which must lie in [0, 1]: predictions that
+# share a bin are treated as tied, so the result is exact when predictions are
+# coarser than 1e-6 and otherwise within the fraction of pos/neg pairs that
+# fall into the same bin (far below the 6 decimals we report in practice).
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+def make_accumulator(metric, gt):
+    m = get_metric(metric)
+    if m.accumulator is None:
+        raise ValueError(f"Metric '{m.name}' does not support streaming")
+    return m.accumulator(gt)
+
+def stream_score(sub_path, gt_path, metric, chunk_rows=DEFAULT_CHUNK_ROWS, timings=False, timer=None):
+    # Reading and parsing are interleaved chunk by chunk, so they share one
+    # "parse" stage. A caller's `timer` is recorded into and left for the
+    # caller to report
+    reported = StageTimer(track_memory=True) if timings and timer is None else None
+    timer = timer or reported
+    try:
+        with stage(timer, "ground_truth"):
+            gt = load_ground_truth(gt_path)
+            ensure_sorter(gt)
+        if len(gt.target_cols) > 1:
+            raise ValueError("Streaming scoring supports a single target column")
+        acc = make_accumulator(metric, gt)
+        # One extra accumulator per leaderboard split, fed from the same chunks
+        split_accs = [make_accumulator(metric, gt) for _ in gt.split_names] if gt.split_codes is not None else []
+        split_rows = [0] * len(split_accs)
+
+        # One flag per ground-truth row, so duplicates are caught across chunks
+        seen = np.zeros(len(gt.ids), dtype=bool)
+        rows = matched = 0
+        extra = [0, []]
+        duplicate = [0, []]
+
+        # Compressed submissions are decompressed chunk by chunk along with the parse
+        with open_input(sub_path) as f:
+            reader = pd.read_csv(f, chunksize=chunk_rows)
+            while True:
+                with stage(timer, "parse"):
+                    chunk = next(reader, None)
+                if chunk is None:
+                    break
+                check_target_columns(gt, chunk.columns)
+
+                with stage(timer, "align"):
+                    ids = normalize_ids(gt, chunk[chunk.columns[0]].to_numpy())
+                    pos = gt_positions(gt, ids)
+                    rows += len(ids)
+                    _tally(extra, ids[pos < 0])
+
+                    # Keep the first occurrence of each ID, within and across chunks
+                    hit = np.flatnonzero(pos >= 0)
+                    _, first = np.unique(pos[hit], return_index=True)
+                    fresh = np.zeros(len(hit), dtype=bool)
+                    fresh[first] = True
+                    fresh &= ~seen[pos[hit]]
+                    _tally(duplicate, ids[hit[~fresh]])
+                    hit = hit[fresh]
+                    seen[pos[hit]] = True
+                if not len(hit):
+                    continue
+
+                with stage(timer, "metric"):
+                    y_pred = chunk[gt.target_col].to_numpy()[hit]
+                    y_true = gt.target[pos[hit]]
+                    acc.update(y_true, y_pred)
+                    if split_accs:
+                        codes = gt.split_codes[pos[hit]]
+                        for k, split_acc in enumerate(split_accs):
+                            in_split = codes == k
+                            if in_split.any():
+                                split_acc.update(y_true[in_split], y_pred[in_split])
+                                split_rows[k] += int(in_split.sum())
+                matched += len(hit)
+
+        missing_rows = np.flatnonzero(~seen)
+        report = make_report(
+            rows, matched,
+            (len(missing_rows), gt.ids[missing_rows[:SAMPLE_IDS]].tolist()),
+            tuple(extra),
+            tuple(duplicate),
+        )
+        if matched == 0:
+            return with_timings({"error": "No common IDs found between submission and ground truth.", "alignment": report}, reported)
+
+        result = {"score": float(round(acc.result(), 6))}
+        if split_accs:
+            scores, errors = [], []
+            for split_acc, n in zip(split_accs, split_rows):
+                try:
+                    if not n:
+                        raise ValueError("No rows in this split")
+                    scores.append(float(split_acc.result()))
+                    errors.append(None)
+                except Exception as e:
+                    scores.append(None)
+                    errors.append(str(e))
+            result["splits"] = split_payload(gt.split_names, scores, errors)
+        if report["missing"] or report["extra"] or report["duplicate"]:
+            result["alignment"] = report
+        return with_timings(result, reported)
+
+    except Exception as e:
+        return with_timings({"error": str(e)}, reported)
+
+def _tally(counter, ids):
+    # counter is [count, sample]; the sample is capped so memory stays bounded
+    counter[0] += len(ids)
+    if len(counter[1]) < SAMPLE_IDS:
+        counter[1].extend(ids[:SAMPLE_IDS - len(counter[1])].tolist())
+
+def should_stream(sub_path, gt_path=None, metric=None):
+    # Submissions above SCORING_STREAM_MB (default 512) are scored in chunks,
+    # unless the metric has no accumulator (ranking metrics need whole queries)
+    # or the ground truth has several targets (streaming scores one column).
+    # Compressed files are judged by their estimated decompressed size.
+    limit_mb = float(os.environ.get("SCORING_STREAM_MB", 512))
+    try:
+        size = os.path.getsize(sub_path)
+        if sniff(sub_path) is not None:
+            size *= EXPANSION
+        if size <= limit_mb * 1024 * 1024:
+            return False
+    except OSError:
+        return False
+    try:
+        if metric is not None and get_metric(metric).accumulator is None:
+            return False
+    except ValueError:
+        pass
+    if gt_path is None:
+        return True
+    try:
+        return len(load_ground_truth(gt_path).target_cols) == 1
+    except Exception:
+        return True
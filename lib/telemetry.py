@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Per-stage timing for the scorers and a minimal Prometheus text exposition.
+#
+# A StageTimer accumulates wall time per named stage (parse, ground_truth,
+# align, metric) and, when asked, the peak memory allocated while the job
+# ran. Peak memory comes from tracemalloc, which NumPy and
+# pandas report their array buffers to; it is process-wide, so concurrent jobs
+# in one process see each other's allocations.
+#
+# A timer can also carry a deadline (time.monotonic() value): entering a stage
+# after it has passed raises TimeoutError, which is how queued jobs are stopped
+# between stages. Long loops inside a stage (streamed chunks, bootstrap
+# blocks) call check_deadline themselves.
+
+class StageTimer:
+    def __init__(self, track_memory=False, deadline=None):
+        self.stages = {}
+        self.deadline = deadline
+        self.bytes_read = None
+        self._start = time.perf_counter()
+        self._own_trace = False
+        if track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_trace = True
+            tracemalloc.reset_peak()
+        self.track_memory = track_memory
+
+    @contextmanager
+    def stage(self, name):
+        check_deadline(self.deadline, f"before the '{name}' stage")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self):
+        return time.perf_counter() - self._start
+
+    def report(self):
+        """{"timings": {...seconds, "total"}, "peak_mem_mb": ...} to merge into a result."""
+        out = {"timings": {name: round(t, 6) for name, t in self.stages.items()}}
+        out["timings"]["total"] = round(self.total, 6)
+        if self.bytes_read is not None:
+            out["bytes_read"] = self.bytes_read
+        if self.track_memory:
+            out["peak_mem_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+            if self._own_trace:
+                tracemalloc.stop()
+                self._own_trace = False
+        return out
+
+def check_deadline(deadline, where):
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError(f"Scoring timed out {where}")
+
+def deadline_of(timer):
+    return timer.deadline if timer is not None else None
+
+def stage(timer, name):
+    # Scorers call this unconditionally; without a timer it does nothing
+    return timer.stage(name) if timer is not None else nullcontext()
+
+def with_timings(result, timer):
+    if timer is not None:
+        result.update(timer.report())
+    return result
+
+def timed_read(source, parse, timer=None):
+    """parse(source), timed as the "parse" stage when there is a timer.
+
+    The parser reads the file itself, so timing never holds a second copy of
+    the raw bytes in memory; bytes_read is the size of a local file.
+    """
+    if timer is None:
+        return parse(source)
+    if not (source.startswith("http://") or source.startswith("https://")):
+        timer.bytes_read = os.path.getsize(source)
+    with timer.stage("parse"):
+        return parse(source)
+
+# ---------------- PROMETHEUS ----------------
+
+def _escape(value):
+    # Label values are quoted strings in the text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Histogram:
+    def __init__(self, name, help, buckets, label_names=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(tuple(label_values), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _labels(self.label_names + ("le",), values + (repr(float(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), values + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, values)} {series[-1]}")
+        return lines
+
+class Gauge:
+    # Set directly, or backed by a callable evaluated at scrape time
+    def __init__(self, name, help, kind="gauge", fn=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def render(self):
+        value = self.fn() if self.fn is not None else self.value
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {value}"]
+
+def render_metrics(collectors):
+    lines = []
+    for collector in collectors:
+        lines.extend(collector.render())
+    return "\n".join(lines) + "\n"
+
+SIZE_BUCKETS_MB = (1, 10, 100, 1000)
+
+def size_bucket(nbytes):
+    # Coarse file-size label so latency can be compared between similar uploads
+    if nbytes is None:
+        return "unknown"
+    mb = nbytes / (1024 * 1024)
+    for bound in SIZE_BUCKETS_MB:
+        if mb < bound:
+            return f"lt_{bound}mb"
+    return f"ge_{SIZE_BUCKETS_MB[-1]}mb"
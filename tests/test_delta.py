@@ -0,0 +1,101 @@
+"""Incremental rescoring matches a full rescore, and falls back to one when it can't."""
+import gzip
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import delta
+from delta import BLOCK_LINES, DeltaStore, delta_score
+from scoring import _score
+
+N = 10 * BLOCK_LINES + 100  # a short last block
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(delta, "store", DeltaStore(str(tmp_path / "deltas.sqlite3")))
+
+def make_values(metric, rng, n):
+    if metric == "accuracy":
+        return rng.integers(0, 3, n), rng.integers(0, 3, n)
+    if metric == "cross_entropy":
+        return rng.integers(0, 2, n), rng.uniform(0.01, 0.99, n)
+    return rng.normal(size=n), rng.normal(size=n)
+
+def write_files(tmp_path, metric, splits):
+    rng = np.random.default_rng(0)
+    target, pred = make_values(metric, rng, N)
+    gt = pd.DataFrame({"id": np.arange(N), "target": target})
+    if splits:
+        gt["usage"] = np.where(rng.uniform(size=N) < 0.3, "Public", "Private")
+    gt.to_csv(tmp_path / "gt.csv", index=False)
+    order = rng.permutation(N)
+    sub = pd.DataFrame({"id": order, "target": pred[order]})
+    sub.to_csv(tmp_path / "v0.csv", index=False)
+    return sub, str(tmp_path / "gt.csv")
+
+def resubmit(tmp_path, sub, name, rows, metric, seed):
+    # Same IDs in the same places, new predictions on `rows`
+    sub = sub.copy()
+    sub.loc[rows, "target"] = make_values(metric, np.random.default_rng(seed), len(rows))[1]
+    sub.to_csv(tmp_path / name, index=False)
+    return sub, str(tmp_path / name)
+
+def assert_same_result(incremental, full):
+    assert incremental["score"] == pytest.approx(full["score"], abs=2e-6)
+    assert incremental.get("splits", {}).keys() == full.get("splits", {}).keys()
+    for name, split in full.get("splits", {}).items():
+        assert incremental["splits"][name]["score"] == pytest.approx(split["score"], abs=2e-6)
+
+@pytest.mark.parametrize("metric", ["accuracy", "mae", "mse", "rmse", "cross_entropy"])
+@pytest.mark.parametrize("splits", [False, True], ids=["no-splits", "splits"])
+def test_delta_score_matches_full_rescore(tmp_path, metric, splits):
+    sub, gt = write_files(tmp_path, metric, splits)
+    base = _score(str(tmp_path / "v0.csv"), gt, metric, lineage="L")
+    assert "error" not in base and "incremental" not in base
+
+    # One changed block, then a change in the last (short) block on top of it
+    sub, path = resubmit(tmp_path, sub, "v1.csv", np.arange(3, 40), metric, 1)
+    result = delta_score(path, gt, metric, "L")
+    assert result["incremental"] == {"changed_rows": BLOCK_LINES, "rows": N}
+    assert_same_result(result, _score(path, gt, metric))
+
+    sub, path = resubmit(tmp_path, sub, "v2.csv", np.arange(N - 10, N), metric, 2)
+    result = _score(path, gt, metric, lineage="L")
+    assert result["incremental"] == {"changed_rows": N - 10 * BLOCK_LINES, "rows": N}
+    assert_same_result(result, _score(path, gt, metric))
+
+def test_delta_score_falls_back_to_full_scoring(tmp_path):
+    sub, gt = write_files(tmp_path, "cross_entropy", True)
+    _score(str(tmp_path / "v0.csv"), gt, "cross_entropy", lineage="L")
+
+    # Another lineage, or metric, has no base to start from
+    _, path = resubmit(tmp_path, sub, "other.csv", np.arange(5), "cross_entropy", 1)
+    assert delta_score(path, gt, "cross_entropy", "M") is None
+    assert delta_score(path, gt, "roc_auc", "L") is None
+
+    # IDs moved between blocks
+    moved = sub.copy()
+    moved.loc[[0, N - 1], "id"] = moved.loc[[N - 1, 0], "id"].to_numpy()
+    moved.to_csv(tmp_path / "moved.csv", index=False)
+    assert delta_score(str(tmp_path / "moved.csv"), gt, "cross_entropy", "L") is None
+    assert_same_result(_score(str(tmp_path / "moved.csv"), gt, "cross_entropy", lineage="L"),
+                       _score(str(tmp_path / "moved.csv"), gt, "cross_entropy"))
+
+    # Compressed input
+    with open(path, "rb") as src, gzip.open(tmp_path / "other.csv.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    assert delta_score(str(tmp_path / "other.csv.gz"), gt, "cross_entropy", "L") is None
+
+    # Too many changed rows
+    _, path = resubmit(tmp_path, sub, "many.csv", np.arange(0, N, 7), "cross_entropy", 2)
+    assert delta_score(path, gt, "cross_entropy", "L") is None
+
+    # A changed block the full scorer rejects is reported by it, not scored
+    bad = sub.copy()
+    bad.loc[10, "target"] = 1.5
+    bad.to_csv(tmp_path / "bad.csv", index=False)
+    assert delta_score(str(tmp_path / "bad.csv"), gt, "cross_entropy", "L") is None
+    assert _score(str(tmp_path / "bad.csv"), gt, "cross_entropy", lineage="L") == \
+        {"error": "y_prob contains values greater than 1: 1.5"}
@@ -0,0 +1,156 @@
+"""Job queue: back-pressure, deadlines inside long loops and the /metrics counters."""
+import importlib.util
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignment import align_targets
+from bootstrap import resampled_scores
+from gt_cache import load_ground_truth
+from jobs import JobQueue, QueueFull
+from scoring import _score
+from streaming import stream_score
+from telemetry import StageTimer, check_deadline
+
+API = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api", "score", "index.py")
+
+@pytest.fixture
+def files(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 2000
+    gt = tmp_path / "gt.csv"
+    pd.DataFrame({"id": np.arange(n), "target": rng.normal(size=n)}).to_csv(gt, index=False)
+    sub = tmp_path / "sub.csv"
+    pd.DataFrame({"id": np.arange(n), "target": rng.normal(size=n)}).to_csv(sub, index=False)
+    return str(sub), str(gt)
+
+@pytest.fixture
+def api():
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    spec = importlib.util.spec_from_file_location("score_api", API)
+    index = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(index)
+    return index
+
+def blocking_queue(max_queue):
+    release = threading.Event()
+    q = JobQueue(lambda *args, deadline: release.wait(10), workers=1, max_queue=max_queue, timeout=30)
+    return q, release
+
+def wait_running(q, job):
+    end = time.monotonic() + 5
+    while job.status != "running":
+        assert time.monotonic() < end
+        time.sleep(0.01)
+
+def test_queue_full_raises_with_retry_after():
+    q, release = blocking_queue(max_queue=1)
+    try:
+        running = q.submit()
+        wait_running(q, running)
+        queued = q.submit()
+        with pytest.raises(QueueFull) as full:
+            q.submit()
+        assert full.value.retry_after >= 1
+        assert q.depth() == 1
+    finally:
+        release.set()
+    assert q.wait(queued, 5).status == "done"
+
+def test_full_queue_answers_429(api, monkeypatch):
+    q, release = blocking_queue(max_queue=1)
+    monkeypatch.setattr(api, "jobs", q)
+    client = api.app.test_client()
+    body = {"sub_url": "sub.csv", "gt_url": "gt.csv", "metric": "rmse"}
+    try:
+        first = client.post("/api/score/jobs", json=body)
+        assert first.status_code == 202
+        wait_running(q, q.get(first.get_json()["job_id"]))
+        assert client.post("/api/score/jobs", json=body).status_code == 202
+        res = client.post("/api/score/jobs", json=body)
+        assert res.status_code == 429
+        assert int(res.headers["Retry-After"]) >= 1
+        assert "scoring_jobs_queued 1" in client.get("/metrics").get_data(as_text=True)
+    finally:
+        release.set()
+
+def test_job_stopped_inside_a_long_loop_frees_its_worker():
+    def spin(deadline):
+        # Never finishes on its own: only the deadline check inside the loop stops it
+        while True:
+            check_deadline(deadline, "in the loop")
+            time.sleep(0.01)
+
+    stops = []
+    def fn(kind, deadline):
+        if kind == "spin":
+            try:
+                spin(deadline)
+            except TimeoutError as e:
+                stops.append(str(e))
+                raise
+        return "ok"
+
+    q = JobQueue(fn, workers=1, max_queue=4, timeout=0.2)
+    stuck = q.submit("spin")
+    after = q.submit("quick")
+    assert q.wait(stuck, 5).status == "failed"
+    assert stuck.error == "Scoring timed out after 0.2s"
+    # The worker came back and ran the next job within its own deadline
+    q.timeout = 30
+    assert q.wait(after, 5).status == "done" and after.result == "ok"
+    assert stops == ["Scoring timed out in the loop"]
+
+def test_bootstrap_checks_the_deadline_between_blocks(files):
+    sub, gt = files
+    g = load_ground_truth(gt)
+    y_true, y_pred, alignment = align_targets(g, pd.read_csv(sub), "rmse")
+    with pytest.raises(TimeoutError, match="during the bootstrap"):
+        resampled_scores("rmse", g, alignment, y_true, y_pred, 64, deadline=time.monotonic() - 1)
+
+    class ExpireInBootstrap(StageTimer):
+        # The deadline passes once the bootstrap stage has been entered, where
+        # only the per-block check can notice it
+        @contextmanager
+        def stage(self, name):
+            with super().stage(name):
+                if name == "bootstrap":
+                    self.deadline = time.monotonic() - 1
+                yield
+
+    timer = ExpireInBootstrap(deadline=time.monotonic() + 3600)
+    assert _score(sub, gt, "rmse", bootstrap=64, timer=timer) == {"error": "Scoring timed out during the bootstrap"}
+
+def test_streaming_checks_the_deadline_between_chunks(files):
+    sub, gt = files
+
+    class ExpireAfterFirstChunk(StageTimer):
+        @contextmanager
+        def stage(self, name):
+            with super().stage(name):
+                yield
+            if name == "metric":
+                self.deadline = time.monotonic() - 1
+
+    timer = ExpireAfterFirstChunk(deadline=time.monotonic() + 3600)
+    result = stream_score(sub, gt, "rmse", chunk_rows=500, timer=timer)
+    assert result == {"error": "Scoring timed out before the 'parse' stage"}
+    assert "score" in stream_score(sub, gt, "rmse", chunk_rows=500)
+
+def test_metrics_counts_requests_and_stages(api, files):
+    sub, gt = files
+    client = api.app.test_client()
+    for _ in range(2):
+        res = client.post("/api/score", json={"sub_url": sub, "gt_url": gt, "metric": "rmse"})
+        assert "score" in res.get_json()
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'scoring_request_seconds_count{metric="rmse",size="lt_1mb"} 2' in text
+    assert 'scoring_stage_seconds_count{stage="fetch"} 2' in text
+    assert "scoring_jobs_in_flight 0" in text
+    assert "# TYPE scoring_gt_cache_hits_total counter" in text
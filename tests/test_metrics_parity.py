@@ -0,0 +1,273 @@
+"""Parity of the NumPy metric registry with scikit-learn.
+
+Every registered metric is checked against its scikit-learn counterpart (or,
+for MRR, which scikit-learn lacks, a direct per-query definition) on the
+input shapes the scorers hand it: string, int and bool labels, probability
+edge cases, tied scores, several target columns and ranked queries.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import metrics as skm
+
+from alignment import align_targets
+from gt_cache import GroundTruth
+from metrics import METRICS, LogLossAccumulator, compute_metric, grouped_scores, score_targets
+
+RNG = np.random.default_rng(0)
+N = 500
+
+def approx(expected):
+    return pytest.approx(expected, rel=1e-9, abs=1e-12)
+
+# ---------------- LABELS ----------------
+
+LABEL_METRICS = {
+    "accuracy": skm.accuracy_score,
+    "f1": lambda t, p: skm.f1_score(t, p, average="weighted", zero_division=0),
+    "f1_macro": lambda t, p: skm.f1_score(t, p, average="macro", zero_division=0),
+    "precision_macro": lambda t, p: skm.precision_score(t, p, average="macro", zero_division=0),
+    "recall_macro": lambda t, p: skm.recall_score(t, p, average="macro", zero_division=0),
+}
+
+def _noisy(y_true, labels, keep=0.6):
+    return np.where(RNG.random(len(y_true)) < keep, y_true, RNG.choice(labels, size=len(y_true)))
+
+LABEL_CASES = {
+    "strings": (lambda: RNG.choice(["cat", "dog", "bird"], N), ["cat", "dog", "bird", "fish"]),
+    "ints": (lambda: RNG.integers(0, 5, N), [0, 1, 2, 3, 4, 7]),
+    "bools": (lambda: RNG.random(N) < 0.3, [True, False]),
+    "negative ints": (lambda: RNG.integers(-3, 2, N), [-3, -2, -1, 0, 1]),
+}
+
+@pytest.mark.parametrize("metric", sorted(LABEL_METRICS))
+@pytest.mark.parametrize("case", sorted(LABEL_CASES))
+def test_label_metrics(metric, case):
+    make, labels = LABEL_CASES[case]
+    y_true = make()
+    y_pred = _noisy(y_true, np.array(labels, dtype=y_true.dtype))
+    assert compute_metric(metric, y_true, y_pred) == approx(LABEL_METRICS[metric](y_true, y_pred))
+
+@pytest.mark.parametrize("metric", sorted(LABEL_METRICS))
+def test_label_metrics_on_dictionary_codes(metric):
+    # String ground truths are scored from dictionary codes; labels only the
+    # submission uses must still count as distinct classes
+    y_true = RNG.choice(["a", "b", "c", "d"], N).astype(object)
+    y_pred = _noisy(y_true, np.array(["a", "b", "x", "y", "z"], dtype=object), keep=0.5)
+    gt = GroundTruth(np.arange(N), y_true, "id", "label")
+    order = RNG.permutation(N)
+    sub = pd.DataFrame({"id": order, "label": y_pred[order]})
+    t, p, _ = align_targets(gt, sub, metric)
+    assert compute_metric(metric, t, p) == approx(LABEL_METRICS[metric](y_true, y_pred))
+
+@pytest.mark.parametrize("metric", sorted(LABEL_METRICS))
+def test_label_metrics_single_class(metric):
+    y_true = np.array(["a"] * 10)
+    y_pred = np.array(["a"] * 7 + ["b"] * 3)
+    assert compute_metric(metric, y_true, y_pred) == approx(LABEL_METRICS[metric](y_true, y_pred))
+
+def test_label_metrics_reject_continuous_predictions():
+    with pytest.raises(ValueError, match="mix of label and continuous"):
+        compute_metric("accuracy", np.array([0, 1, 1]), np.array([0.0, 0.5, 1.0]))
+
+def test_label_metrics_reject_mixed_types():
+    with pytest.raises(ValueError, match="same type"):
+        compute_metric("f1", np.array(["a", "b"]), np.array([0, 1]))
+
+# ---------------- PROBABILITIES ----------------
+
+def _binary(n=N, labels=(0, 1)):
+    y = RNG.random(n) < 0.4
+    return np.where(y, labels[1], labels[0]), np.clip(y * 0.3 + RNG.random(n) * 0.7, 0, 1)
+
+@pytest.mark.parametrize("labels", [(0, 1), ("neg", "pos"), (False, True), (-1, 1)])
+def test_roc_auc(labels):
+    y_true, y_score = _binary(labels=labels)
+    assert compute_metric("roc_auc", y_true, y_score) == approx(skm.roc_auc_score(y_true, y_score))
+
+def test_roc_auc_tied_scores():
+    y_true, y_score = _binary()
+    y_score = np.round(y_score, 1)
+    assert compute_metric("roc_auc", y_true, y_score) == approx(skm.roc_auc_score(y_true, y_score))
+
+def test_roc_auc_constant_scores():
+    y_true, _ = _binary()
+    assert compute_metric("roc_auc", y_true, np.full(N, 0.5)) == approx(0.5)
+
+def test_roc_auc_unbounded_scores():
+    # Any real-valued score ranks, not only probabilities
+    y_true, y_score = _binary()
+    y_score = (y_score - 0.5) * 100
+    assert compute_metric("roc_auc", y_true, y_score) == approx(skm.roc_auc_score(y_true, y_score))
+
+@pytest.mark.parametrize("labels", [(0, 1), ("neg", "pos")])
+def test_cross_entropy(labels):
+    y_true, y_prob = _binary(labels=labels)
+    assert compute_metric("cross_entropy", y_true, y_prob) == approx(skm.log_loss(y_true, y_prob))
+
+def test_cross_entropy_certain_predictions():
+    # 0 and 1 are clipped to [eps, 1 - eps] before the log, as in scikit-learn
+    y_true = np.array([0, 1, 1, 0, 1])
+    y_prob = np.array([0.0, 1.0, 0.0, 1.0, 0.7])
+    assert compute_metric("cross_entropy", y_true, y_prob) == approx(skm.log_loss(y_true, y_prob))
+
+@pytest.mark.parametrize("bad", [1.3, -0.1])
+def test_cross_entropy_rejects_out_of_range(bad):
+    # Rejected as scikit-learn does, rather than clipped into range and scored
+    y_true = np.array([0, 1, 1, 0])
+    y_prob = np.array([0.2, bad, 0.5, 0.4])
+    with pytest.raises(ValueError) as expected:
+        skm.log_loss(y_true, y_prob)
+    message = re.escape(str(expected.value))
+    with pytest.raises(ValueError, match=message):
+        compute_metric("cross_entropy", y_true, y_prob)
+    with pytest.raises(ValueError, match=message):
+        grouped_scores("cross_entropy", y_true, y_prob, np.array([0, 0, 1, 1]), 2)
+    acc = LogLossAccumulator([0, 1])
+    with pytest.raises(ValueError, match=message):
+        acc.update(y_true, y_prob)
+
+@pytest.mark.parametrize("metric", ["roc_auc", "cross_entropy"])
+def test_probability_metrics_one_class(metric):
+    with pytest.raises(ValueError, match="Only one class"):
+        compute_metric(metric, np.ones(10), RNG.random(10))
+
+def test_probability_metrics_reject_more_classes():
+    with pytest.raises(ValueError, match="binary"):
+        compute_metric("roc_auc", np.array([0, 1, 2]), np.array([0.1, 0.5, 0.9]))
+
+# ---------------- REGRESSION ----------------
+
+REGRESSION_METRICS = {
+    "mae": skm.mean_absolute_error,
+    "mse": skm.mean_squared_error,
+    "rmse": lambda t, p: np.sqrt(skm.mean_squared_error(t, p)),
+}
+
+@pytest.mark.parametrize("metric", sorted(REGRESSION_METRICS))
+@pytest.mark.parametrize("dtype", [np.float64, np.int64, np.float32])
+def test_regression(metric, dtype):
+    y_true = (RNG.normal(size=N) * 10).astype(dtype)
+    y_pred = (y_true + RNG.normal(size=N) * 3).astype(dtype)
+    # Inputs are scored in float64 whatever their dtype; scikit-learn would
+    # average float32 inputs in float32
+    expected = REGRESSION_METRICS[metric](y_true.astype(np.float64), y_pred.astype(np.float64))
+    assert compute_metric(metric, y_true, y_pred) == approx(expected)
+
+@pytest.mark.parametrize("metric", sorted(REGRESSION_METRICS) + ["roc_auc", "cross_entropy"])
+@pytest.mark.parametrize("bad, message", [(np.nan, "NaN"), (np.inf, "infinity"), (-np.inf, "infinity")])
+def test_non_finite_predictions(metric, bad, message):
+    y_true = np.array([0.0, 1.0, 1.0, 0.0])
+    y_pred = np.array([0.1, bad, 0.8, 0.3])
+    with pytest.raises(ValueError, match=message):
+        compute_metric(metric, y_true, y_pred)
+
+# ---------------- SEVERAL TARGETS ----------------
+
+def test_multi_target_regression():
+    y_true = RNG.normal(size=(N, 3))
+    y_pred = y_true + RNG.normal(size=(N, 3))
+    score, columns = score_targets("rmse", y_true, y_pred, ["a", "b", "c"])
+    per_column = np.sqrt(skm.mean_squared_error(y_true, y_pred, multioutput="raw_values"))
+    assert score == approx(per_column.mean())
+    assert list(columns.values()) == pytest.approx(per_column, abs=1e-6)
+    assert score_targets("mae", y_true, y_pred)[0] == approx(skm.mean_absolute_error(y_true, y_pred))
+
+def test_multi_label_probabilities():
+    y_true = (RNG.random((N, 4)) < 0.3).astype(int)
+    y_prob = np.clip(y_true * 0.4 + RNG.random((N, 4)) * 0.6, 0, 1)
+    assert score_targets("roc_auc", y_true, y_prob)[0] == approx(skm.roc_auc_score(y_true, y_prob, average="macro"))
+    log_losses = [skm.log_loss(y_true[:, j], y_prob[:, j], labels=[0, 1]) for j in range(4)]
+    assert score_targets("cross_entropy", y_true, y_prob)[0] == approx(np.mean(log_losses))
+
+def test_multi_label_accuracy_per_column():
+    y_true = RNG.integers(0, 3, (N, 2))
+    y_pred = _noisy(y_true.ravel(), np.arange(3)).reshape(N, 2)
+    expected = np.mean([skm.accuracy_score(y_true[:, j], y_pred[:, j]) for j in range(2)])
+    assert score_targets("accuracy", y_true, y_pred)[0] == approx(expected)
+
+# ---------------- RANKING ----------------
+
+def _queries(n_queries=40):
+    # Distinct scores, so no tie-breaking convention is involved
+    sizes = RNG.integers(1, 12, n_queries)
+    queries = np.repeat(np.arange(n_queries), sizes)
+    relevance = RNG.integers(0, 4, len(queries)) * (RNG.random(len(queries)) < 0.5)
+    scores = RNG.permutation(len(queries)).astype(np.float64)
+    return queries, relevance.astype(np.float64), scores
+
+def _per_query(queries, relevance, scores, fn):
+    values = []
+    for q in np.unique(queries):
+        rel, s = relevance[queries == q], scores[queries == q]
+        if (rel > 0).any():
+            values.append(fn(rel, s))
+    return np.mean(values)
+
+@pytest.mark.parametrize("k", [None, 1, 3, 10])
+def test_ndcg(k):
+    queries, relevance, scores = _queries()
+
+    def reference(rel, s):
+        if len(rel) == 1:
+            return 1.0  # scikit-learn rejects single-item queries
+        return skm.ndcg_score([rel], [s], k=k)
+
+    name = "ndcg" if k is None else f"ndcg@{k}"
+    assert compute_metric(name, relevance, scores, queries) == approx(_per_query(queries, relevance, scores, reference))
+
+def test_map_without_cutoff():
+    queries, relevance, scores = _queries()
+    expected = _per_query(queries, relevance, scores, lambda rel, s: skm.average_precision_score(rel > 0, s))
+    assert compute_metric("map", relevance, scores, queries) == approx(expected)
+
+def test_map_at_k():
+    queries, relevance, scores = _queries()
+    k = 3
+
+    def reference(rel, s):
+        hits = (rel[np.argsort(-s)] > 0)[:k]
+        precision = np.cumsum(hits) / np.arange(1, len(hits) + 1)
+        return (precision * hits).sum() / min(k, (rel > 0).sum())
+
+    assert compute_metric(f"map@{k}", relevance, scores, queries) == approx(_per_query(queries, relevance, scores, reference))
+
+@pytest.mark.parametrize("k", [None, 2])
+def test_mrr(k):
+    queries, relevance, scores = _queries()
+
+    def reference(rel, s):
+        ranked = rel[np.argsort(-s)] > 0
+        first = np.flatnonzero(ranked)[0] + 1
+        return 1.0 / first if k is None or first <= k else 0.0
+
+    name = "mrr" if k is None else f"mrr@{k}"
+    assert compute_metric(name, relevance, scores, queries) == approx(_per_query(queries, relevance, scores, reference))
+
+def test_item_lists_match_scored_rows():
+    # One row per query with space-separated items scores like (query, item) rows
+    relevant = np.array(["a b", "c", "", "d e f"], dtype=object)
+    predicted = np.array(["b x a", "y c", "z", "f q d"], dtype=object)
+    for name in ("map", "ndcg@2", "mrr"):
+        rows, rel, scores = [], [], []
+        for q, (truth, ranked) in enumerate(zip(relevant, predicted)):
+            items = ranked.split()
+            rows += [q] * len(items)
+            rel += [float(item in truth.split()) for item in items]
+            scores += list(range(len(items), 0, -1))
+        got = compute_metric(name, relevant, predicted)
+        if name == "map":
+            # Relevant items that were never predicted still count towards AP's denominator
+            expected = np.mean([(1 + 2 / 3) / 2, 0.5, (1 + 2 / 3) / 3])
+        elif name == "mrr":
+            expected = np.mean([1.0, 0.5, 1.0])
+        else:
+            expected = _per_query(np.array(rows), np.array(rel), np.array(scores, dtype=float),
+                                  lambda r, s: skm.ndcg_score([r], [s], k=2))
+        assert got == approx(expected), name
+
+def test_every_metric_is_covered():
+    covered = set(LABEL_METRICS) | set(REGRESSION_METRICS) | {"roc_auc", "cross_entropy", "map", "ndcg", "mrr"}
+    assert covered == set(METRICS)
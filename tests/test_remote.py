@@ -0,0 +1,107 @@
+"""Remote inputs: pooled connections, ETag revalidation and failed downloads."""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import remote
+
+GT = b"id,target\n0,1\n1,0\n2,1\n"
+SUB = b"id,target\n0,1\n1,1\n2,1\n"
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so pooled requests can share a connection
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.client_address, self.headers.get("If-None-Match")))
+        body = server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"%x"' % hash(body)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(remote, "CACHE_DIR", str(tmp_path / "cache"))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.files = {"/gt.csv": GT, "/sub.csv": SUB}
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    remote.http.clear()
+
+def test_fetch_reuses_pooled_connection(server):
+    for _ in range(3):
+        with remote.fetch(server.url + "/sub.csv") as d:
+            with open(d.path, "rb") as f:
+                assert f.read() == SUB
+            assert d.path.endswith(".csv") and d.nbytes == len(SUB)
+        assert not os.path.exists(d.path)
+    # Three requests over one keep-alive connection
+    assert len({client for _, client, _ in server.requests}) == 1
+
+def test_fetch_cached_revalidates_with_etag(server):
+    before = remote.stats()
+    first = remote.fetch_cached(server.url + "/gt.csv")
+    assert not first.not_modified and first.nbytes == len(GT)
+    mtime = os.path.getmtime(first.path)
+
+    again = remote.fetch_cached(server.url + "/gt.csv")
+    assert again.not_modified and again.path == first.path
+    # The 304 leaves the copy alone, so its compiled form stays valid
+    assert os.path.getmtime(again.path) == mtime
+    assert server.requests[-1][2] is not None
+
+    server.files["/gt.csv"] = GT + b"3,0\n"
+    changed = remote.fetch_cached(server.url + "/gt.csv")
+    assert not changed.not_modified
+    with open(changed.path, "rb") as f:
+        assert f.read() == GT + b"3,0\n"
+
+    after = remote.stats()
+    assert after["downloads"] - before["downloads"] == 2
+    assert after["not_modified"] - before["not_modified"] == 1
+    assert after["bytes"] - before["bytes"] == 2 * len(GT) + 4
+
+def test_failed_downloads_leave_nothing_behind(server, monkeypatch):
+    os.makedirs(remote.CACHE_DIR)
+    with pytest.raises(ValueError, match="HTTP 404"):
+        remote.fetch(server.url + "/missing.csv")
+    with pytest.raises(ValueError, match="HTTP 404"):
+        remote.fetch_cached(server.url + "/missing.csv")
+    assert not any(name.startswith(".tmp-") for name in os.listdir(remote.CACHE_DIR))
+
+    # A ground truth that fails to download closes the submission fetched alongside it
+    downloads = []
+    real_fetch = remote.fetch
+    monkeypatch.setattr(remote, "fetch", lambda url: downloads.append(real_fetch(url)) or downloads[-1])
+    with pytest.raises(ValueError, match="HTTP 404"):
+        remote.fetch_inputs(server.url + "/sub.csv", server.url + "/missing.csv")
+    # The submission's fetch may still be running; it is closed once it lands
+    deadline = time.monotonic() + 5
+    while not downloads or os.path.exists(downloads[0].path):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
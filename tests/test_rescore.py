@@ -0,0 +1,95 @@
+"""Bulk rescoring applies the same precheck as scoring at submit time."""
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import calculate_score, score_each
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "_legacy_backup", "backend", "main.py")
+
+@pytest.fixture
+def files(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 50
+    gt = tmp_path / "gt.csv"
+    pd.DataFrame({"id": np.arange(n), "target": rng.normal(size=n)}).to_csv(gt, index=False)
+    good = tmp_path / "good.csv"
+    pd.DataFrame({"id": np.arange(n), "target": rng.normal(size=n)}).to_csv(good, index=False)
+    # One row against a 50-row ground truth: rejected by the precheck
+    short = tmp_path / "short.csv"
+    pd.DataFrame({"id": [0], "target": [0.5]}).to_csv(short, index=False)
+    return str(gt), str(good), str(short)
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_score_each_rejects_what_submit_rejects(files, workers):
+    gt, good, short = files
+    assert "error" in calculate_score(short, gt, "rmse", sub_hash="short")
+    results = list(score_each([(1, good), (2, short)], gt, "rmse", workers=workers))
+    assert [key for key, _, _ in results] == [1, 2]
+    assert results[0][1] is not None and results[0][2] is None
+    assert results[1][1] is None
+    assert results[1][2] == calculate_score(short, gt, "rmse", sub_hash="short")["error"]
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("jose")
+    pytest.importorskip("passlib")
+    # The backend keeps its database and media next to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("media")
+    monkeypatch.syspath_prepend(os.path.dirname(BACKEND))
+    spec = importlib.util.spec_from_file_location("legacy_main", BACKEND)
+    main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(main)
+    monkeypatch.setattr(main, "RESCORE_WORKERS", 1)
+    return main
+
+def test_rescore_keeps_rejected_submission_failed(files, main):
+    gt, good, short = files
+
+    with main.SessionLocal() as s:
+        u = main.User(email="a@x", name="A", hashed_password="-")
+        s.add(u); s.flush()
+        c = main.Competition(title="T", subtitle="S", metric="mae", ground_truth_path=gt, host_id=u.id)
+        s.add(c); s.flush()
+        ok = main.Submission(competition_id=c.id, user_id=u.id, file_path=good, score=1.0, status="graded")
+        bad = main.Submission(competition_id=c.id, user_id=u.id, file_path=short, status="failed")
+        s.add_all([ok, bad]); s.flush()
+        job = main.RescoreJob(competition_id=c.id, metric="mae", ground_truth_path=gt,
+                              max_submission_id=bad.id, total=2)
+        s.add(job); s.commit()
+        job_id, ok_id, bad_id, cid = job.id, ok.id, bad.id, c.id
+
+    main.run_rescore(job_id)
+
+    with main.SessionLocal() as s:
+        assert s.get(main.RescoreJob, job_id).status == "done"
+        assert s.get(main.Submission, ok_id).status == "graded"
+        rejected = s.get(main.Submission, bad_id)
+        assert (rejected.status, rejected.score) == ("failed", None)
+        board = s.query(main.LeaderboardEntry).filter_by(competition_id=cid).all()
+        assert [e.submission_id for e in board] == [ok_id]
+
+def test_rescore_status_is_host_only(files, main):
+    from fastapi.testclient import TestClient
+    gt = files[0]
+    with main.SessionLocal() as s:
+        host = main.User(email="h@x", name="H", hashed_password="-")
+        other = main.User(email="o@x", name="O", hashed_password="-")
+        s.add_all([host, other]); s.flush()
+        c = main.Competition(title="T", subtitle="S", metric="mae", ground_truth_path=gt, host_id=host.id)
+        s.add(c); s.commit()
+        host_id, other_id, cid = host.id, other.id, c.id
+
+    client = TestClient(main.app)
+    url = f"/competitions/{cid}/rescore"
+    assert client.get(url).status_code == 401
+    auth = lambda uid: {"Authorization": f"Bearer {main.make_token(uid)}"}
+    assert client.get(url, headers=auth(other_id)).status_code == 403
+    res = client.get(url, headers=auth(host_id))
+    assert res.status_code == 200 and res.json() is None
+    assert client.get("/competitions/999/rescore", headers=auth(host_id)).status_code == 404
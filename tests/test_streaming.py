@@ -0,0 +1,72 @@
+"""Streaming scores match the in-memory scorer, split by split and on gzip input."""
+import gzip
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scoring import _score
+from streaming import stream_score
+
+N = 1000
+CHUNK_ROWS = 97  # not a divisor of N, so the last chunk is short
+
+def make_values(kind, rng):
+    if kind == "regression":
+        return rng.normal(size=N), rng.normal(size=N)
+    if kind == "label":
+        return rng.integers(0, 3, N), rng.integers(0, 3, N)
+    # Coarser than the streamed AUC histogram's bins, so both scores are exact
+    return rng.integers(0, 2, N), np.round(rng.uniform(size=N), 3)
+
+STREAMED = [
+    ("rmse", "regression"), ("mse", "regression"), ("mae", "regression"),
+    ("accuracy", "label"), ("f1", "label"), ("f1_macro", "label"),
+    ("precision_macro", "label"), ("recall_macro", "label"),
+    ("cross_entropy", "probability"), ("roc_auc", "probability"),
+]
+
+def write_files(tmp_path, kind, splits, gz):
+    rng = np.random.default_rng(0)
+    target, pred = make_values(kind, rng)
+    gt = pd.DataFrame({"id": np.arange(N), "target": target})
+    if splits:
+        gt["usage"] = np.where(rng.uniform(size=N) < 0.3, "Public", "Private")
+    gt.to_csv(tmp_path / "gt.csv", index=False)
+    # Rows in a different order than the ground truth
+    order = rng.permutation(N)
+    sub = tmp_path / "sub.csv"
+    pd.DataFrame({"id": order, "target": pred[order]}).to_csv(sub, index=False)
+    if gz:
+        with open(sub, "rb") as src, gzip.open(tmp_path / "sub.csv.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        sub = tmp_path / "sub.csv.gz"
+    return str(sub), str(tmp_path / "gt.csv")
+
+def assert_same_result(streamed, full):
+    assert streamed.keys() == full.keys()
+    assert streamed["score"] == pytest.approx(full["score"], abs=2e-6)
+    if "splits" in full:
+        assert streamed["splits"].keys() == full["splits"].keys()
+        for name, split in full["splits"].items():
+            assert streamed["splits"][name]["score"] == pytest.approx(split["score"], abs=2e-6)
+
+@pytest.mark.parametrize("metric,kind", STREAMED)
+@pytest.mark.parametrize("splits", [False, True], ids=["no-splits", "splits"])
+@pytest.mark.parametrize("gz", [False, True], ids=["csv", "gz"])
+def test_stream_score_matches_in_memory(tmp_path, metric, kind, splits, gz):
+    sub, gt = write_files(tmp_path, kind, splits, gz)
+    full = _score(sub, gt, metric)
+    assert "error" not in full
+    assert_same_result(stream_score(sub, gt, metric, chunk_rows=CHUNK_ROWS), full)
+
+def test_stream_score_reports_the_same_alignment(tmp_path):
+    # Duplicated and missing rows come back in the same alignment report
+    sub, gt = write_files(tmp_path, "regression", True, False)
+    frame = pd.read_csv(sub).iloc[5:]
+    pd.concat([frame, frame.iloc[:3]]).to_csv(sub, index=False)
+    full = _score(sub, gt, "rmse")
+    streamed = stream_score(sub, gt, "rmse", chunk_rows=CHUNK_ROWS)
+    assert_same_result(streamed, full)
+    assert streamed["alignment"] == full["alignment"]